@@ -0,0 +1,129 @@
+"""
+认证依赖高并发延迟基准测试
+
+对比两种 get_current_user 实现在异步路由上的延迟分布（用户信息均已缓存）：
+- sync： 旧实现，同步依赖 + 同步 SessionLocal，每个请求都要跳到 AnyIO 线程池
+         （依赖本身和 get_db 生成器各一次），线程池被占满后请求排队
+- async：新实现，异步依赖，由 JWT 声明（uid/fid/tz/epoch）直接构建当前用户，
+         不查库也不查缓存，全程在事件循环内
+
+通过 ASGITransport 直接驱动应用，不经过网络栈。
+
+运行方式：
+    python -m benchmarks.bench_auth_dependency [--requests 5000] [--concurrency 500]
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_auth_"), "bench.db"))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+from db.database import Base, SessionLocal, engine, get_db
+from models.user import User
+from routers.auth import get_current_user, oauth2_scheme, USER_CACHE_TTL
+from schemas.user import UserResponse
+from services.auth_service import get_user_by_username, issue_access_token
+from utils.cache import CacheKeys, _memory_cache
+from utils.jwt import verify_token
+
+
+def legacy_get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """旧版同步依赖（仅用于对比）"""
+    token_data = verify_token(token, Exception("无法验证凭据"))
+    cache_key = "legacy:" + CacheKeys.user_by_name_key(token_data.username)
+    cached_user = _memory_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+    user = get_user_by_username(db, username=token_data.username)
+    user_response = UserResponse.model_validate(user)
+    _memory_cache.set(cache_key, user_response, USER_CACHE_TTL)
+    return user_response
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_route(current_user: UserResponse = Depends(legacy_get_current_user)):
+        return {"id": current_user.id}
+
+    @app.get("/async")
+    async def async_route(current_user: UserResponse = Depends(get_current_user)):
+        return {"id": current_user.id}
+
+    return app
+
+
+def create_user() -> str:
+    import models  # noqa: F401  确保所有表已注册
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.username == "bench").first()
+        if user is None:
+            user = User(username="bench", email="bench@example.com", hashed_password="x")
+            db.add(user)
+            db.commit()
+        return issue_access_token(user)["access_token"]
+
+
+async def run(client: httpx.AsyncClient, path: str, token: str, total: int, concurrency: int) -> List[float]:
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+    # 预热：填充缓存
+    await one()
+    samples.clear()
+    await asyncio.gather(*[one() for _ in range(total)])
+    return sorted(samples)
+
+
+def report(name: str, samples: List[float], elapsed: float):
+    p50 = samples[len(samples) // 2]
+    p99 = samples[int(len(samples) * 0.99)]
+    print(f"{name:<8}{len(samples) / elapsed:>12.0f}{p50:>12.2f}{p99:>12.2f}{samples[-1]:>12.2f}")
+
+
+async def main_async(total: int, concurrency: int):
+    token = create_user()
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"请求数: {total}  并发: {concurrency}")
+        print(f"{'依赖':<8}{'req/s':>12}{'p50(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+        for name, path in (("sync", "/sync"), ("async", "/async")):
+            start = time.perf_counter()
+            samples = await run(client, path, token, total, concurrency)
+            report(name, samples, time.perf_counter() - start)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="认证依赖高并发延迟基准")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args.requests, args.concurrency))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+批量创建账单吞吐量基准测试
+
+对比两种批量写入方式（临时 SQLite 文件 + aiosqlite，均同步日汇总和项目计数）：
+- before：逐条 dict() 构建 ORM 对象 -> add_all -> commit -> 逐条 refresh（每行一次 SELECT）
+- after： create_bills_batch_async（TypeAdapter 整批转换 + 分批 INSERT ... RETURNING）
+
+运行方式：
+    python -m benchmarks.bench_batch_insert [--rows 1000 5000] [--rounds 3]
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+os.environ.setdefault("DEBUG", "true")
+# before 路径原样保留旧代码的 bill.dict()
+warnings.filterwarnings("ignore", message="The `dict` method is deprecated")
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from db.database import Base
+from models import Bill, BillDailyRollup, Project, User
+from schemas.bill import BillCreate
+from services.async_bill_service import create_bills_batch_async
+from utils.timezone_utils import ensure_utc
+
+
+def _payload(n: int, project_id: int) -> List[BillCreate]:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        BillCreate(
+            name=f"师傅{i % 20}", amount=100.0 + i, bill_type="expense", category="人工",
+            date=start + timedelta(hours=i), duration_hours=8.0, hourly_rate=12.5,
+            pay_method="现金", note="基准", project_id=project_id,
+        )
+        for i in range(n)
+    ]
+
+
+async def _before(db: AsyncSession, bills: List[BillCreate], user_id: int) -> int:
+    """旧写入路径：逐条构建 ORM 对象，提交后逐条 refresh"""
+    db_bills = []
+    for bill in bills:
+        bill_data = bill.dict()
+        bill_data['date'] = ensure_utc(bill_data['date'])
+        db_bills.append(Bill(**bill_data, user_id=user_id))
+    db.add_all(db_bills)
+    await db.commit()
+    for bill in db_bills:
+        await db.refresh(bill)
+    return len(db_bills)
+
+
+async def _after(db: AsyncSession, bills: List[BillCreate], user_id: int) -> int:
+    created = await create_bills_batch_async(db, bills, user_id, owned_project_ids={bills[0].project_id})
+    return len(created)
+
+
+async def _measure(sessionmaker, func, bills, user_id: int, rounds: int) -> List[float]:
+    """每轮写入后清空账单和汇总，返回每轮的 rows/sec"""
+    rates = []
+    for _ in range(rounds):
+        async with sessionmaker() as db:
+            start = time.perf_counter()
+            count = await func(db, bills, user_id)
+            rates.append(count / (time.perf_counter() - start))
+            await db.execute(delete(Bill))
+            await db.execute(delete(BillDailyRollup))
+            await db.commit()
+    return rates
+
+
+async def main_async(sizes: List[int], rounds: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_batch_"), "bench.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    sessionmaker = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async with sessionmaker() as db:
+        user = User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        await db.flush()
+        project = Project(name="基准项目", user_id=user.id)
+        db.add(project)
+        await db.commit()
+        user_id, project_id = user.id, project.id
+
+    print(f"{'行数':<8}{'路径':<8}{'rows/sec':>12}{'最慢轮':>12}")
+    for size in sizes:
+        bills = _payload(size, project_id)
+        for name, func in (("before", _before), ("after", _after)):
+            rates = await _measure(sessionmaker, func, bills, user_id, rounds)
+            print(f"{size:<8}{name:<8}{statistics.median(rates):>12.0f}{min(rates):>12.0f}")
+
+    await async_engine.dispose()
+    sync_engine.dispose()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量创建账单吞吐量基准")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000], help="每批账单数")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args.rows, args.rounds))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
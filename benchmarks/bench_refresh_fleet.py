@@ -0,0 +1,115 @@
+"""
+刷新令牌：设备群登录 CPU 开销模拟
+
+模拟 N 台设备连续在线 H 小时，访问令牌每 ACCESS_TOKEN_EXPIRE_MINUTES 过期一次：
+- before：没有刷新接口，每次过期都要 /auth/login（一次完整 bcrypt 校验）
+- after： 首次登录一次，之后每次过期调用 /auth/refresh（摘要索引查找 + 轮换）
+
+先通过 ASGITransport 实测单次 login / refresh 请求的 CPU 时间，
+再按设备群的调用次数折算总 CPU。bcrypt 在独立进程池执行，
+其 CPU 时间单独在本进程中按相同成本因子测量后计入 login。
+
+运行方式：
+    python -m benchmarks.bench_refresh_fleet [--devices 10000] [--hours 24] [--samples 20]
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_refresh_"), "bench.db"))
+
+import bcrypt
+import httpx
+from config import settings
+from db.database import Base, SessionLocal, engine
+from models.user import User
+from services.auth_service import get_password_hash
+from utils.rate_limit import rate_limiter
+
+PASSWORD = "Bench@123"
+
+
+def create_user():
+    import models  # noqa: F401  确保所有表已注册
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.query(User).filter(User.username == "bench").first() is None:
+            db.add(User(username="bench", email="bench@example.com", hashed_password=get_password_hash(PASSWORD)))
+            db.commit()
+
+
+def bcrypt_cpu_seconds(samples: int) -> float:
+    """单次 bcrypt 校验的 CPU 时间（与进程池中执行的 checkpw 相同）"""
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(settings.BCRYPT_ROUNDS))
+    start = time.process_time()
+    for _ in range(samples):
+        bcrypt.checkpw(PASSWORD.encode(), hashed)
+    return (time.process_time() - start) / samples
+
+
+async def request_cpu_seconds(client: httpx.AsyncClient, samples: int):
+    """单次 login / refresh 请求在本进程中的 CPU 时间（不含进程池中的 bcrypt）"""
+    login_cpu = refresh_cpu = 0.0
+    refresh_token = None
+    for _ in range(samples):
+        rate_limiter._requests.clear()
+        start = time.process_time()
+        response = await client.post("/api/v1/auth/login", json={"username": "bench", "password": PASSWORD})
+        login_cpu += time.process_time() - start
+        assert response.status_code == 200, response.text
+        refresh_token = response.json()["refresh_token"]
+
+    for _ in range(samples):
+        rate_limiter._requests.clear()
+        start = time.process_time()
+        response = await client.post("/api/v1/auth/refresh", json={"refresh_token": refresh_token})
+        refresh_cpu += time.process_time() - start
+        assert response.status_code == 200, response.text
+        refresh_token = response.json()["refresh_token"]
+    return login_cpu / samples, refresh_cpu / samples
+
+
+async def main_async(devices: int, hours: int, samples: int):
+    from main import app
+    create_user()
+    bcrypt_cpu = bcrypt_cpu_seconds(samples)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        login_overhead, refresh_cpu = await request_cpu_seconds(client, samples)
+    login_cpu = login_overhead + bcrypt_cpu
+
+    renewals = devices * hours * 60 // settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    before = renewals * login_cpu
+    after = devices * login_cpu + (renewals - devices) * refresh_cpu
+
+    print(f"bcrypt 成本因子: {settings.BCRYPT_ROUNDS}  访问令牌有效期: {settings.ACCESS_TOKEN_EXPIRE_MINUTES} 分钟")
+    print(f"单次 login CPU:   {login_cpu * 1000:8.2f} ms（其中 bcrypt {bcrypt_cpu * 1000:.2f} ms）")
+    print(f"单次 refresh CPU: {refresh_cpu * 1000:8.2f} ms")
+    print(f"设备 {devices} 台 × {hours} 小时，令牌续期 {renewals} 次")
+    print(f"{'方案':<8}{'login 次数':>12}{'refresh 次数':>14}{'CPU(核·秒)':>14}")
+    print(f"{'before':<8}{renewals:>12}{0:>14}{before:>14.0f}")
+    print(f"{'after':<8}{devices:>12}{renewals - devices:>14}{after:>14.0f}")
+    print(f"login CPU 降低 {(1 - devices * login_cpu / before) * 100:.1f}%，总 CPU 降低 {(1 - after / before) * 100:.1f}%")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="刷新令牌设备群 CPU 模拟")
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args.devices, args.hours, args.samples))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+统计缓存命中路径基准测试
+
+对比两种命中路径（均从 L1 内存缓存读取）：
+- before：缓存 JSON 字符串 -> json.loads -> 重建 pydantic 模型 ->
+          FastAPI 按 response_model 校验 -> ORJSONResponse 再次序列化
+- after： 缓存最终响应体 bytes -> 直接构建 Response
+
+运行方式：
+    python -m benchmarks.bench_stats_hit_path [--rows 50] [--iterations 20000]
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import List
+
+os.environ.setdefault("DEBUG", "true")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from schemas.bill import NameStatistics
+from utils.cache import _memory_cache, cache_get, cache_set, cache_get_bytes, cache_set_bytes, cached_json_response
+
+
+def _rows(n: int) -> List[NameStatistics]:
+    return [
+        NameStatistics(name=f"师傅{i}", total_hours=8.0 * i, total_amount=120.5 * i, bill_count=i)
+        for i in range(n)
+    ]
+
+
+async def _before(key: str, field) -> bytes:
+    """旧命中路径：反序列化、重建模型、response_model 校验、再次序列化"""
+    cached = await cache_get(key)
+    stats = [NameStatistics(**item) for item in json.loads(cached)]
+    content = await serialize_response(field=field, response_content=stats)
+    return ORJSONResponse(content=jsonable_encoder(content)).body
+
+
+async def _after(key: str) -> bytes:
+    """新命中路径：缓存即响应体"""
+    body = await cache_get_bytes(key)
+    return cached_json_response(body).body
+
+
+async def _measure(func, iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _report(name: str, samples: List[float]):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[int(len(samples) * 0.99)]
+    print(f"{name:<8}{statistics.mean(samples):>12.1f}{p50:>12.1f}{p99:>12.1f}")
+
+
+async def main_async(rows: int, iterations: int):
+    stats = _rows(rows)
+    field = create_response_field(name="bench", type_=List[NameStatistics])
+    _memory_cache.clear()
+    await cache_set("name:stats:1:g0:before", json.dumps([s.dict() for s in stats]))
+    await cache_set_bytes("name:stats:1:g0:after", ORJSONResponse(content=[s.dict() for s in stats]).body)
+
+    before = await _before("name:stats:1:g0:before", field)
+    after = await _after("name:stats:1:g0:after")
+    assert json.loads(before) == json.loads(after), "两种路径输出不一致"
+
+    print(f"行数: {rows}  次数: {iterations}  响应体: {len(after)} 字节")
+    print(f"{'路径':<8}{'平均(µs)':>12}{'p50(µs)':>12}{'p99(µs)':>12}")
+    _report("before", await _measure(lambda: _before("name:stats:1:g0:before", field), iterations))
+    _report("after", await _measure(lambda: _after("name:stats:1:g0:after"), iterations))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="统计缓存命中路径基准")
+    parser.add_argument("--rows", type=int, default=50, help="统计结果行数")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args.rows, args.iterations))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+内存 TTLCache 微基准测试
+
+对比旧实现（每次写入全量扫描过期项，O(n)）与时间轮实现（均摊 O(1)）
+在不同缓存规模下的 set/get 吞吐量。
+
+运行方式：
+    python -m benchmarks.bench_ttl_cache [--sizes 10000 100000 1000000]
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import os
+import time
+from collections import OrderedDict
+from threading import RLock
+
+os.environ.setdefault("DEBUG", "true")
+
+from utils.cache import TTLCache
+
+
+class LegacyTTLCache:
+    """旧版实现：set 时遍历整个 OrderedDict 清理过期项"""
+
+    def __init__(self, maxsize: int = 1000, default_ttl: int = 300):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._cache:
+                return None
+            value, expire_at = self._cache[key]
+            if time.time() > expire_at:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            expire_at = time.time() + (ttl or self.default_ttl)
+            self._cache[key] = (value, expire_at)
+            self._cache.move_to_end(key)
+            now = time.time()
+            expired_keys = [k for k, (_, exp) in self._cache.items() if now > exp]
+            for k in expired_keys:
+                del self._cache[k]
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def prefill(self, n: int):
+        """直接填充（避免预热本身就是 O(n²)）"""
+        expire_at = time.time() + self.default_ttl
+        for i in range(n):
+            self._cache[f"bill:stats:{i}"] = ("x" * 64, expire_at)
+
+
+def _prefill(cache, n: int):
+    if isinstance(cache, LegacyTTLCache):
+        cache.prefill(n)
+    else:
+        for i in range(n):
+            cache.set(f"bill:stats:{i}", "x" * 64)
+
+
+def bench(cache, size: int, ops: int) -> dict:
+    """在已满的缓存上执行 ops 次 set（触发淘汰）和 ops 次 get，返回每秒操作数"""
+    _prefill(cache, size)
+
+    start = time.perf_counter()
+    for i in range(ops):
+        # 混合 TTL，使时间轮各桶都有数据
+        cache.set(f"bill:stats:{size + i}", "x" * 64, ttl=60 + i % 240)
+    set_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.get(f"bill:stats:{size + i}")
+    get_elapsed = time.perf_counter() - start
+
+    return {
+        "set_ops": ops / set_elapsed if set_elapsed else float("inf"),
+        "get_ops": ops / get_elapsed if get_elapsed else float("inf"),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="TTLCache 吞吐量基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=100_000, help="新实现每个规模的操作次数")
+    parser.add_argument("--legacy-budget", type=int, default=20_000_000,
+                        help="旧实现每个规模允许扫描的总条目数（ops = budget / size）")
+    args = parser.parse_args(argv)
+
+    print(f"{'实现':<10}{'规模':>12}{'操作数':>10}{'set ops/s':>16}{'get ops/s':>16}")
+    for size in args.sizes:
+        rows = [
+            ("timewheel", TTLCache(maxsize=size, default_ttl=300), args.ops),
+            ("legacy", LegacyTTLCache(maxsize=size, default_ttl=300), max(10, args.legacy_budget // size)),
+        ]
+        for name, cache, ops in rows:
+            result = bench(cache, size, ops)
+            print(f"{name:<10}{size:>12,}{ops:>10,}{result['set_ops']:>16,.0f}{result['get_ops']:>16,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,17 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production-INSECURE" if os.getenv("DEBUG", "false").lower() == "true" else "")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("TOKEN_EXPIRE_MINUTES", "30"))
+    # 刷新令牌有效期（天），每次刷新轮换并重新计时
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+    
+    # ==================== 密码哈希配置 ====================
+    # bcrypt 成本因子；登录时发现旧哈希成本更低会自动升级
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    # 独立进程池大小（不占用 AnyIO 线程池）与排队上限，超出上限直接返回 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+    # 不存在的用户名的负缓存时间（秒），撞库请求无需查库
+    AUTH_NEGATIVE_CACHE_TTL: int = int(os.getenv("AUTH_NEGATIVE_CACHE_TTL", "60"))
     
     # ==================== 数据库配置 ====================
     DB_TYPE: str = os.getenv("DB_TYPE", "sqlite")
@@ -40,7 +51,7 @@ class Settings:
     DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
     
     # ==================== Redis 缓存配置 ====================
-    # Redis URL (可选，不配置时自动降级到内存缓存)
+    # Redis URL (可选，不配置时自动降级到内存缓存；令牌吊销此时回退为每个请求按主键查库比对 epoch)
     # 格式: redis://[[username]:[password]@][host][:port][/database]
     REDIS_URL: str = os.getenv("REDIS_URL", "")
     REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
@@ -50,6 +61,61 @@ class Settings:
     CACHE_TTL_STATS: int = int(os.getenv("CACHE_TTL_STATS", "300"))     # 统计数据缓存 5 分钟
     CACHE_TTL_TOKEN: int = int(os.getenv("CACHE_TTL_TOKEN", "300"))     # Token 验证缓存 5 分钟
     
+    # L1（进程内）缓存最长保留时间：跨 worker 失效广播丢失时的陈旧上限
+    CACHE_L1_TTL: int = int(os.getenv("CACHE_L1_TTL", "30"))
+    
+    # stale-while-revalidate 策略："keyspace=软TTL:硬TTL"，逗号分隔；留空则关闭
+    # 软 TTL 过后（或有写入后）先返回旧值并后台重算，硬 TTL 过后必须同步计算
+    CACHE_SWR_POLICIES: str = os.getenv(
+        "CACHE_SWR_POLICIES",
+        "bill:stats=30:300,category:stats=30:300,name:stats=30:300,family:stats=30:300",
+    )
+    
+    # Redis 中二进制缓存值（预序列化的响应体）的压缩："zstd"（需安装 zstandard）或留空
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zstd")
+    CACHE_COMPRESSION_MIN_BYTES: int = int(os.getenv("CACHE_COMPRESSION_MIN_BYTES", "1024"))
+    
+    # 速率限制：未配置 Redis 时进程内限流表的最大 key 数
+    RATE_LIMIT_MEMORY_MAXSIZE: int = int(os.getenv("RATE_LIMIT_MEMORY_MAXSIZE", "100000"))
+    
+    # 重接口（导出、统计、批量）准入控制：每个 worker 同时执行的重请求数（默认占连接池一半），
+    # 每个用户的并发数 / 排队数上限、排队最长等待（秒），以及每分钟的成本预算
+    HEAVY_MAX_CONCURRENT: int = int(os.getenv("HEAVY_MAX_CONCURRENT", str(max(1, int(os.getenv("DB_POOL_SIZE", "10")) // 2))))
+    HEAVY_PER_USER_CONCURRENT: int = int(os.getenv("HEAVY_PER_USER_CONCURRENT", "2"))
+    HEAVY_PER_USER_QUEUE: int = int(os.getenv("HEAVY_PER_USER_QUEUE", "4"))
+    HEAVY_QUEUE_TIMEOUT: float = float(os.getenv("HEAVY_QUEUE_TIMEOUT", "2.0"))
+    HEAVY_USER_COST_PER_MINUTE: int = int(os.getenv("HEAVY_USER_COST_PER_MINUTE", "120"))
+    
+    # 过载保护：连接池检出等待或事件循环延迟（平滑后）超过目标值时，低优先级接口直接返回 503
+    SHED_ENABLED: bool = os.getenv("SHED_ENABLED", "true").lower() == "true"
+    SHED_POOL_WAIT_TARGET_MS: float = float(os.getenv("SHED_POOL_WAIT_TARGET_MS", "50"))
+    SHED_LOOP_LAG_TARGET_MS: float = float(os.getenv("SHED_LOOP_LAG_TARGET_MS", "100"))
+    # 信号衰减时间常数（秒）：没有新样本时过载判定在此时间量级内自动解除
+    SHED_DECAY_SECONDS: float = float(os.getenv("SHED_DECAY_SECONDS", "1.0"))
+    SHED_LAG_INTERVAL: float = float(os.getenv("SHED_LAG_INTERVAL", "0.05"))
+    SHED_RETRY_AFTER: int = int(os.getenv("SHED_RETRY_AFTER", "2"))
+    # 低优先级路径前缀（统计、导出），逗号分隔；记账和认证不受影响
+    SHED_LOW_PRIORITY_PATHS: str = os.getenv(
+        "SHED_LOW_PRIORITY_PATHS",
+        "/api/v1/bills/statistics,/api/v1/bills/export,/api/v1/bills/import,/api/v1/family/statistics",
+    )
+    
+    # 批量创建账单时每批插入的行数（每批一条 INSERT ... RETURNING、一个事务）
+    BILL_BATCH_CHUNK_SIZE: int = int(os.getenv("BILL_BATCH_CHUNK_SIZE", "1000"))
+    
+    # 导入账单时每批写入的行数（每批一个事务；PostgreSQL 用 COPY）和响应中保留的错误行数上限
+    BILL_IMPORT_CHUNK_SIZE: int = int(os.getenv("BILL_IMPORT_CHUNK_SIZE", "5000"))
+    BILL_IMPORT_MAX_ERRORS: int = int(os.getenv("BILL_IMPORT_MAX_ERRORS", "100"))
+    # 一条 CSV 记录（含引号内换行）最多缓冲的字符数：引号未闭合时超过即报错并从下一行重新解析
+    BILL_IMPORT_MAX_RECORD_CHARS: int = int(os.getenv("BILL_IMPORT_MAX_RECORD_CHARS", "8192"))
+    
+    # 删除项目时每批存档、删除的账单数（每批一个事务）
+    PROJECT_DELETE_CHUNK_SIZE: int = int(os.getenv("PROJECT_DELETE_CHUNK_SIZE", "5000"))
+    
+    # 进程内存缓存容量（条目数 + 字节预算）
+    MEMORY_CACHE_MAXSIZE: int = int(os.getenv("MEMORY_CACHE_MAXSIZE", "2000"))
+    MEMORY_CACHE_MAX_BYTES: int = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # 32MB
+    
     # ==================== 日志配置 ====================
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = os.getenv("LOG_FILE", "")
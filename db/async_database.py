@@ -7,11 +7,13 @@
 - aiomysql: MySQL 异步驱动
 """
 import os
-from typing import AsyncGenerator
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable
 from urllib.parse import quote_plus
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
 from config import settings
+from utils.load_shedding import load_shedder
 import logging
 
 logger = logging.getLogger(__name__)
@@ -42,6 +44,17 @@ def get_async_database_url() -> str:
     return f"sqlite+aiosqlite:///{settings.SQLITE_PATH}"
 
 
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """上报每次连接检出的等待时长，供过载保护判断连接池是否饱和"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            load_shedder.record_pool_wait(time.perf_counter() - start)
+
+
 def create_async_db_engine():
     """
     创建 SQLAlchemy 异步引擎
@@ -55,7 +68,7 @@ def create_async_db_engine():
         # PostgreSQL/MySQL: 启用异步连接池
         return create_async_engine(
             url,
-            poolclass=AsyncAdaptedQueuePool,
+            poolclass=TimedAsyncQueuePool,
             pool_size=settings.DB_POOL_SIZE,
             max_overflow=settings.DB_MAX_OVERFLOW,
             pool_pre_ping=True,  # 连接前检查是否有效
@@ -98,6 +111,12 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def run_in_new_session(db: AsyncSession, compute: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+    """在与 db 同一引擎的新会话中执行 compute（后台刷新缓存时请求会话已关闭）"""
+    async with AsyncSession(bind=db.bind, expire_on_commit=False) as session:
+        return await compute(session)
+
+
 async def init_async_db():
     """初始化异步数据库（创建表）"""
     from db.database import Base
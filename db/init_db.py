@@ -6,6 +6,9 @@ from db.database import Base, engine
 from models.user import User
 from models.bill import Bill, BillHistory
 from models.project import Project
+from models.family import Family
+from models.rollup import BillDailyRollup
+from models.refresh_token import RefreshToken
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
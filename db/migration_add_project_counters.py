@@ -0,0 +1,74 @@
+"""
+数据库迁移脚本：为 projects 表添加账单计数列
+
+运行方式：
+    python -m db.migration_add_project_counters
+
+功能：
+    - 为 projects 表添加 bill_count、total_income、total_expense、last_bill_at 列
+    - 按现有账单回填计数（等同于 python -m services.project_service reconcile）
+    - 支持 SQLite、PostgreSQL、MySQL
+
+注意：
+    迁移完成后计数由账单写入在同一事务中维护；回填期间如有账单写入，
+    事后再执行一次 reconcile 即可
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from db.database import engine
+from config import settings
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    """检查列是否已存在"""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def run_migration():
+    """执行迁移"""
+    from services.project_service import reconcile_project_counters
+    
+    table_name = "projects"
+    int_type = "INT" if settings.DB_TYPE == "mysql" else "INTEGER"
+    float_type = "DOUBLE PRECISION" if settings.DB_TYPE == "postgresql" else "DOUBLE" if settings.DB_TYPE == "mysql" else "FLOAT"
+    datetime_type = "TIMESTAMP WITH TIME ZONE" if settings.DB_TYPE == "postgresql" else "DATETIME"
+    columns = {
+        "bill_count": f"{int_type} NOT NULL DEFAULT 0",
+        "total_income": f"{float_type} NOT NULL DEFAULT 0",
+        "total_expense": f"{float_type} NOT NULL DEFAULT 0",
+        "last_bill_at": f"{datetime_type} NULL",
+    }
+    
+    with engine.connect() as conn:
+        for column_name, column_def in columns.items():
+            if column_exists(table_name, column_name):
+                logger.info(f"列 '{column_name}' 已存在于表 '{table_name}' 中，跳过")
+                continue
+            sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_def}"
+            logger.info(f"执行迁移: {sql}")
+            conn.execute(text(sql))
+        conn.commit()
+    
+    with engine.begin() as conn:
+        fixed = reconcile_project_counters(conn)
+    logger.info(f"已回填 {len(fixed)} 个项目的计数")
+
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+        logger.info("迁移完成！")
+    except Exception as e:
+        logger.error(f"迁移失败: {e}")
+        sys.exit(1)
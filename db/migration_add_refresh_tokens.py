@@ -0,0 +1,46 @@
+"""
+数据库迁移脚本：创建 refresh_tokens 表
+
+运行方式：
+    python -m db.migration_add_refresh_tokens
+
+功能：
+    - 创建 refresh_tokens 表（刷新令牌摘要、轮换链、过期/使用/吊销时间）
+    - 表已存在时跳过
+    - 支持 SQLite、PostgreSQL、MySQL
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import inspect
+from db.database import engine, Base
+import models  # noqa: F401  确保外键引用的表已注册
+from models.refresh_token import RefreshToken
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_migration():
+    """执行迁移"""
+    table_name = RefreshToken.__tablename__
+
+    if inspect(engine).has_table(table_name):
+        logger.info(f"表 '{table_name}' 已存在，跳过迁移")
+        return
+
+    Base.metadata.create_all(bind=engine, tables=[RefreshToken.__table__])
+    logger.info(f"成功创建表 '{table_name}'")
+
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+        logger.info("迁移完成！")
+    except Exception as e:
+        logger.error(f"迁移失败: {e}")
+        sys.exit(1)
@@ -0,0 +1,67 @@
+"""
+数据库迁移脚本：为 bills 表添加 (user_id, date, id) 索引
+
+运行方式：
+    python -m db.migration_add_user_date_id_index
+
+功能：
+    - 创建 idx_user_date_id 索引，账单列表按 (date DESC, id DESC) 游标分页时直接按索引顺序读取
+    - 删除被它覆盖的旧索引 idx_user_date（(user_id, date) 是新索引的前缀）
+    - 已完成的步骤跳过，可重复执行
+    - 支持 SQLite、PostgreSQL、MySQL
+
+注意：
+    大表上建索引会锁表（PostgreSQL 可改为手动执行 CREATE INDEX CONCURRENTLY）
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import MetaData, Table, inspect
+from db.database import engine
+from models.bill import Bill
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "idx_user_date_id"
+OLD_INDEX_NAME = "idx_user_date"
+
+
+def index_exists(table_name: str, index_name: str) -> bool:
+    """检查索引是否已存在"""
+    inspector = inspect(engine)
+    return any(index['name'] == index_name for index in inspector.get_indexes(table_name))
+
+
+def run_migration():
+    """执行迁移"""
+    table_name = Bill.__tablename__
+    
+    if index_exists(table_name, INDEX_NAME):
+        logger.info(f"索引 '{INDEX_NAME}' 已存在于表 '{table_name}' 中，跳过创建")
+    else:
+        index = next(index for index in Bill.__table__.indexes if index.name == INDEX_NAME)
+        logger.info(f"创建索引: {INDEX_NAME} ON {table_name} (user_id, date, id)")
+        index.create(bind=engine)
+        logger.info(f"成功为表 '{table_name}' 添加索引 '{INDEX_NAME}'")
+    
+    # 新索引建好之后再删旧索引，期间按日期的查询始终有索引可用
+    if index_exists(table_name, OLD_INDEX_NAME):
+        logger.info(f"删除被 '{INDEX_NAME}' 覆盖的旧索引: {OLD_INDEX_NAME}")
+        # 旧索引已不在模型中，从数据库反射出来再删除
+        table = Table(table_name, MetaData(), autoload_with=engine)
+        next(index for index in table.indexes if index.name == OLD_INDEX_NAME).drop(bind=engine)
+        logger.info(f"成功删除表 '{table_name}' 的索引 '{OLD_INDEX_NAME}'")
+
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+        logger.info("迁移完成！")
+    except Exception as e:
+        logger.error(f"迁移失败: {e}")
+        sys.exit(1)
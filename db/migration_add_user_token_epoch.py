@@ -0,0 +1,62 @@
+"""
+数据库迁移脚本：为 users 表添加 token_epoch 字段
+
+运行方式：
+    python -m db.migration_add_user_token_epoch
+
+功能：
+    - 为 users 表添加 token_epoch 列（令牌代数，写入 JWT 的 epoch 声明）
+    - 已有用户初始化为 0
+    - 支持 SQLite、PostgreSQL、MySQL
+
+注意：
+    令牌新增了 uid/fid/epoch 声明，迁移后旧格式的令牌会被拒绝，用户需要重新登录一次
+"""
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text, inspect
+from db.database import engine
+from config import settings
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    """检查列是否已存在"""
+    inspector = inspect(engine)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def run_migration():
+    """执行迁移"""
+    table_name = "users"
+    column_name = "token_epoch"
+
+    if column_exists(table_name, column_name):
+        logger.info(f"列 '{column_name}' 已存在于表 '{table_name}' 中，跳过迁移")
+        return
+
+    column_type = "INT" if settings.DB_TYPE == "mysql" else "INTEGER"
+    sql = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type} NOT NULL DEFAULT 0"
+
+    with engine.connect() as conn:
+        logger.info(f"执行迁移: {sql}")
+        conn.execute(text(sql))
+        conn.commit()
+        logger.info(f"成功为表 '{table_name}' 添加列 '{column_name}'")
+
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+        logger.info("迁移完成！")
+    except Exception as e:
+        logger.error(f"迁移失败: {e}")
+        sys.exit(1)
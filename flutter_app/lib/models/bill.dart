@@ -144,6 +144,27 @@ class Bill {
   }
 }
 
+/// 游标分页结果
+class BillPage {
+  final List<Bill> items;
+  final bool hasMore;
+  final String? nextCursor;
+
+  BillPage({
+    required this.items,
+    required this.hasMore,
+    this.nextCursor,
+  });
+
+  factory BillPage.fromJson(Map<String, dynamic> json) {
+    return BillPage(
+      items: (json['items'] as List).map((item) => Bill.fromJson(item)).toList(),
+      hasMore: json['has_more'] as bool,
+      nextCursor: json['next_cursor'] as String?,
+    );
+  }
+}
+
 /// 账单历史记录模型
 class BillHistory {
   final int id;
@@ -24,7 +24,7 @@ class _BillListPageState extends State<BillListPage> {
   final List<Bill> _bills = [];
   bool _isLoading = true;
   bool _hasMore = true;
-  int _page = 0;
+  String? _nextCursor;
   final int _pageSize = 20;
   String? _error;
 
@@ -36,24 +36,24 @@ class _BillListPageState extends State<BillListPage> {
 
   Future<void> _loadBills({bool refresh = false}) async {
     if (refresh) {
-      _page = 0;
+      _nextCursor = null;
       _hasMore = true;
       _bills.clear();
       setState(() => _isLoading = true);
     }
 
     try {
-      final newBills = await apiService.getBills(
-        skip: _page * _pageSize,
+      final page = await apiService.getBillsPage(
+        cursor: _nextCursor,
         limit: _pageSize,
         projectId: widget.projectId,
         worker: widget.worker,
       );
 
       setState(() {
-        _bills.addAll(newBills);
-        _hasMore = newBills.length == _pageSize;
-        _page++;
+        _bills.addAll(page.items);
+        _hasMore = page.hasMore;
+        _nextCursor = page.nextCursor;
         _isLoading = false;
         _error = null;
       });
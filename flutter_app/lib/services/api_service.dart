@@ -329,6 +329,32 @@ class ApiService {
     return (data as List).map((json) => Bill.fromJson(json)).toList();
   }
 
+  /// 游标分页获取账单列表
+  ///
+  /// 首页不传 [cursor]，之后传入上一页返回的 nextCursor
+  Future<BillPage> getBillsPage({
+    String? cursor,
+    int limit = 50,
+    String? month,
+    String? billType,
+    String? worker,
+    String? category,
+    int? projectId,
+  }) async {
+    final queryParams = <String, String>{
+      'limit': limit.toString(),
+    };
+    if (cursor != null) queryParams['cursor'] = cursor;
+    if (month != null) queryParams['month'] = month;
+    if (billType != null) queryParams['bill_type'] = billType;
+    if (worker != null) queryParams['worker'] = worker;
+    if (category != null) queryParams['category'] = category;
+    if (projectId != null) queryParams['project_id'] = projectId.toString();
+
+    final data = await _get('/bills/page', queryParams: queryParams);
+    return BillPage.fromJson(data);
+  }
+
   /// 获取单个账单
   Future<Bill> getBill(int billId) async {
     final data = await _get('/bills/$billId');
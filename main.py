@@ -7,6 +7,7 @@ from db.database import warmup_connection_pool
 from db.init_db import create_tables
 from routers import auth, bills, projects, monitor, family
 from utils.exceptions import register_exception_handlers
+from utils.load_shedding import LoadSheddingMiddleware, start_load_monitor, stop_load_monitor
 from utils.logging_config import setup_logging
 from config import settings
 import logging
@@ -38,16 +39,27 @@ async def lifespan(app: FastAPI):
     
     # 3. 初始化缓存（预热 Redis 连接，如果配置了的话）
     try:
-        from utils.cache import get_redis_client
+        from utils.cache import get_redis_client, start_invalidation_listener
         await get_redis_client()
+        # 订阅跨 worker 的 L1 失效广播
+        await start_invalidation_listener()
     except Exception as e:
         logger.debug(f"缓存初始化: {e}")
     
+    # 4. 事件循环延迟采样（过载保护）
+    start_load_monitor()
+    
     yield
     
     # 关闭
     logger.info("应用关闭中...")
     
+    await stop_load_monitor()
+    
+    # 关闭密码哈希进程池
+    from utils.password_hasher import shutdown_password_pool
+    shutdown_password_pool()
+    
     # 关闭 Redis 连接
     try:
         from utils.cache import close_redis
@@ -77,6 +89,10 @@ app = FastAPI(
     lifespan=lifespan,  # 添加生命周期管理
 )
 
+# 过载保护：连接池检出等待或事件循环延迟超标时，统计、导出等低优先级请求直接返回 503
+# （先注册的在内层，503 响应同样经过 CORS 处理）
+app.add_middleware(LoadSheddingMiddleware)
+
 # 开启 Gzip 压缩 (最小 1KB 触发)，大幅降低移动端流量消耗，提升速度
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
@@ -88,7 +104,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization", "X-Request-ID"],
-    expose_headers=["X-Request-ID", "X-Process-Time"],
+    expose_headers=["X-Request-ID", "X-Process-Time", "X-Cache-Stale", "Age", "X-Access-Token",
+                    "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
     max_age=600,  # 预检请求缓存10分钟
 )
 
@@ -109,6 +126,10 @@ async def add_request_metadata(request: Request, call_next):
     process_time = time.time() - start_time
     response.headers["X-Request-ID"] = request_id
     response.headers["X-Process-Time"] = f"{process_time:.3f}s"
+    # 限流依赖的判定结果（对直接返回 Response 的接口同样生效）
+    rate_limit = getattr(request.state, "rate_limit", None)
+    if rate_limit is not None:
+        response.headers.update(rate_limit.headers())
     
     # 记录慢请求
     if process_time > 1.0:
@@ -3,5 +3,7 @@ from .user import User
 from .project import Project
 from .bill import Bill, BillHistory
 from .family import Family
+from .rollup import BillDailyRollup
+from .refresh_token import RefreshToken
 
-__all__ = ["User", "Project", "Bill", "BillHistory", "Family"]
+__all__ = ["User", "Project", "Bill", "BillHistory", "Family", "BillDailyRollup", "RefreshToken"]
@@ -9,8 +9,8 @@ class Bill(Base):
     
     # 复合索引优化常用查询
     __table_args__ = (
-        # 用户 + 日期查询（按月查询账单）- 覆盖索引
-        Index('idx_user_date', 'user_id', 'date'),
+        # 用户 + 日期 + ID（按月查询账单、账单列表按 (date, id) 倒序游标分页）
+        Index('idx_user_date_id', 'user_id', 'date', 'id'),
         # 用户 + 账单名称查询（名称统计）
         Index('idx_user_name', 'user_id', 'name'),
         # 用户 + 分类查询（分类统计）
@@ -23,6 +23,8 @@ class Bill(Base):
         Index('idx_user_date_type', 'user_id', 'date', 'bill_type'),
         # 用户 + 创建时间（按创建时间排序）
         Index('idx_user_created', 'user_id', 'created_at'),
+        # 项目 + 日期 + ID（项目账单游标分页、项目最新账单日期）
+        Index('idx_project_date_id', 'project_id', 'date', 'id'),
     )
 
     id = Column(Integer, primary_key=True, index=True)
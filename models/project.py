@@ -1,7 +1,15 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import timezone
+from typing import Dict, Iterable
+from sqlalchemy import (
+    Column, Integer, String, Float, DateTime, ForeignKey, Index,
+    bindparam, case, or_, select, update
+)
+from sqlalchemy.engine import Connection
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from db.database import Base
+from utils.constants import BillType
+from utils.timezone_utils import from_utc_to_local
 
 
 class Project(Base):
@@ -19,8 +27,114 @@ class Project(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # 账单计数（反范式，由账单写入在同一事务中维护，见 apply_project_counters）
+    bill_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_income = Column(Float, nullable=False, default=0, server_default="0")
+    total_expense = Column(Float, nullable=False, default=0, server_default="0")
+    last_bill_at = Column(DateTime(timezone=True), nullable=True)  # 最新账单日期
+    
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     user = relationship("User", back_populates="projects")
     
     # 项目下的账单
     bills = relationship("Bill", back_populates="project", cascade="all, delete-orphan")
+
+
+def _as_utc(dt):
+    """统一为带时区的 UTC 时间（数据库读出的可能是 naive UTC），便于比较"""
+    return from_utc_to_local(dt, timezone.utc)
+
+
+def apply_project_counters(connection: Connection, added: Iterable = (), removed: Iterable = ()) -> int:
+    """
+    将账单增删同步到项目计数列（在调用方的事务中执行）
+    
+    计数和金额按增量累加；删除了项目最新账单时，last_bill_at 从账单表重新取最大值
+    （执行时本次账单变更已写入，同一事务内可见）
+    
+    Args:
+        connection: 当前事务所在的连接
+        added: 新增（或修改后）的账单，需具备 project_id、bill_type、amount、date 属性
+        removed: 删除（或修改前）的账单
+    
+    Returns:
+        受影响的项目数
+    """
+    from models.bill import Bill
+    
+    # project_id -> [笔数, 收入, 支出, 新增账单最大日期, 删除账单最大日期]
+    deltas: Dict[int, list] = {}
+    for bills, sign in ((added, 1), (removed, -1)):
+        slot = 3 if sign > 0 else 4
+        for bill in bills:
+            if not bill.project_id:
+                continue
+            delta = deltas.setdefault(bill.project_id, [0, 0.0, 0.0, None, None])
+            delta[0] += sign
+            if bill.bill_type == BillType.INCOME.value:
+                delta[1] += sign * (bill.amount or 0)
+            elif bill.bill_type == BillType.EXPENSE.value:
+                delta[2] += sign * (bill.amount or 0)
+            date = _as_utc(bill.date)
+            if date is not None and (delta[slot] is None or date > delta[slot]):
+                delta[slot] = date
+    
+    # 修改时金额、日期均未变的账单增量为零，无需更新
+    changed = {
+        project_id: delta for project_id, delta in deltas.items()
+        if delta[0] or delta[1] or delta[2] or delta[3] != delta[4]
+    }
+    if not changed:
+        return 0
+    
+    table = Project.__table__
+    date_type = table.c.last_bill_at.type
+    added_max = bindparam("added_max", type_=date_type)
+    connection.execute(
+        update(table)
+        .where(table.c.id == bindparam("pid"))
+        .values(
+            bill_count=table.c.bill_count + bindparam("d_count"),
+            total_income=table.c.total_income + bindparam("d_income"),
+            total_expense=table.c.total_expense + bindparam("d_expense"),
+            # added_max 为 NULL 时比较结果为 NULL，保持原值
+            last_bill_at=case(
+                (or_(table.c.last_bill_at.is_(None), table.c.last_bill_at < added_max), added_max),
+                else_=table.c.last_bill_at,
+            ),
+            # 计数变化不算项目本身的修改，不触发 onupdate
+            updated_at=table.c.updated_at,
+        ),
+        [
+            {
+                "pid": project_id, "d_count": d[0], "d_income": d[1], "d_expense": d[2],
+                "added_max": d[3],
+            }
+            for project_id, d in changed.items()
+        ],
+    )
+    
+    # 只有删掉的账单不早于当前最新日期时才需要回查账单表
+    recompute = [
+        {"pid": project_id, "removed_max": d[4]}
+        for project_id, d in changed.items() if d[4] is not None
+    ]
+    if recompute:
+        latest = (
+            select(func.max(Bill.date))
+            .where(Bill.project_id == table.c.id)
+            .scalar_subquery()
+        )
+        connection.execute(
+            update(table)
+            .where(
+                table.c.id == bindparam("pid"),
+                or_(
+                    table.c.last_bill_at.is_(None),
+                    table.c.last_bill_at <= bindparam("removed_max", type_=date_type),
+                ),
+            )
+            .values(last_bill_at=latest, updated_at=table.c.updated_at),
+            recompute,
+        )
+    return len(changed)
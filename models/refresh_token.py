@@ -0,0 +1,26 @@
+"""
+刷新令牌模型
+
+访问令牌有效期较短（ACCESS_TOKEN_EXPIRE_MINUTES），客户端用刷新令牌换取新的访问令牌，
+无需再次提交密码（避免每次都做 bcrypt 校验）：
+- 只保存令牌的 SHA-256 摘要，刷新时按摘要做唯一索引查找
+- 每次刷新都轮换：旧令牌标记为已使用，签发同一链（chain_id）上的新令牌
+- 已使用的令牌再次出现视为泄露（重放），吊销整条链
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from db.database import Base
+
+
+class RefreshToken(Base):
+    """刷新令牌表"""
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256 十六进制摘要
+    chain_id = Column(String(32), nullable=False, index=True)  # 同一次登录轮换出的令牌共享
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True), nullable=True)      # 已轮换（再次使用即为重放）
+    revoked_at = Column(DateTime(timezone=True), nullable=True)   # 已吊销（登出或检测到重放）
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,215 @@
+"""
+账单日汇总表（统计预聚合）
+
+按 (用户, 项目, 本地日期, 类型, 分类, 名称) 维护金额、工时、笔数的累计值，
+统计接口读取汇总行而不是扫描原始账单。
+
+维护方式：
+- ORM 写入（新增/修改/删除账单）在 flush 时由 after_flush 事件自动同步，
+  与账单变更处于同一事务；项目计数列（models.project）随同一入口一起维护
+- 绕过 ORM 工作单元的批量语句（Core insert/delete）需显式调用 apply_bill_changes
+- 汇总与原始数据不一致时，用 `python -m services.rollup_service rebuild` 重建
+"""
+from types import SimpleNamespace
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import (
+    Column, Integer, String, Float, Date, Index, UniqueConstraint,
+    event, select, delete
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, attributes
+from db.database import Base
+from models.project import apply_project_counters
+from utils.timezone_utils import from_utc_to_local, get_user_timezone
+
+
+# 账单未关联项目（旧数据）时使用的项目ID占位值，唯一约束中 NULL 互不相等
+NO_PROJECT_ID = 0
+
+# 参与汇总的账单字段
+ROLLUP_SOURCE_FIELDS = ("user_id", "project_id", "date", "bill_type", "category", "name", "amount", "duration_hours")
+
+
+class BillDailyRollup(Base):
+    """账单日汇总表"""
+    __tablename__ = "bill_daily_rollups"
+
+    __table_args__ = (
+        UniqueConstraint(
+            'user_id', 'project_id', 'local_date', 'bill_type', 'category', 'name',
+            name='uq_rollup_key'
+        ),
+        # 用户 + 日期范围（统计查询主路径）
+        Index('idx_rollup_user_date', 'user_id', 'local_date'),
+        # 项目删除时按项目清理
+        Index('idx_rollup_project', 'project_id'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False)
+    project_id = Column(Integer, nullable=False, default=NO_PROJECT_ID)
+    local_date = Column(Date, nullable=False)  # 按用户时区划分的自然日
+    bill_type = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    name = Column(String(200), nullable=False, default="")
+
+    total_amount = Column(Float, nullable=False, default=0)
+    total_hours = Column(Float, nullable=False, default=0)
+    bill_count = Column(Integer, nullable=False, default=0)
+
+
+RollupKey = Tuple[int, int, object, str, str, str]
+
+
+def _rollup_key(bill, tz) -> RollupKey:
+    """计算账单所属的汇总行 key"""
+    return (
+        bill.user_id,
+        bill.project_id or NO_PROJECT_ID,
+        from_utc_to_local(bill.date, tz).date(),
+        bill.bill_type,
+        bill.category,
+        bill.name or "",
+    )
+
+
+def load_user_timezones(connection: Connection, user_ids: Iterable[int]) -> Dict[int, object]:
+    """批量读取用户时区"""
+    from models.user import User
+
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    rows = connection.execute(
+        select(User.id, User.tz_offset_minutes).where(User.id.in_(user_ids))
+    ).all()
+    offsets = {row.id: row.tz_offset_minutes for row in rows}
+    return {uid: get_user_timezone(offsets.get(uid)) for uid in user_ids}
+
+
+def _upsert_statement(connection: Connection):
+    """按数据库方言构建 “存在则累加” 的 upsert 语句"""
+    table = BillDailyRollup.__table__
+    dialect = connection.dialect.name
+    key_columns = ['user_id', 'project_id', 'local_date', 'bill_type', 'category', 'name']
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(
+            total_amount=table.c.total_amount + stmt.inserted.total_amount,
+            total_hours=table.c.total_hours + stmt.inserted.total_hours,
+            bill_count=table.c.bill_count + stmt.inserted.bill_count,
+        )
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+            "total_hours": table.c.total_hours + stmt.excluded.total_hours,
+            "bill_count": table.c.bill_count + stmt.excluded.bill_count,
+        },
+    )
+
+
+def apply_bill_changes(
+    connection: Connection,
+    added: Iterable = (),
+    removed: Iterable = (),
+    timezones: Optional[Dict[int, object]] = None,
+) -> int:
+    """
+    将账单增删同步到日汇总表和项目计数列（在调用方的事务中执行）
+
+    Args:
+        connection: 当前事务所在的连接
+        added: 新增（或修改后）的账单，需具备 ROLLUP_SOURCE_FIELDS 属性
+        removed: 删除（或修改前）的账单
+        timezones: 预先加载的 {user_id: tzinfo}，缺失的用户会自动查询
+
+    Returns:
+        受影响的汇总行数
+    """
+    added, removed = list(added), list(removed)
+    if not added and not removed:
+        return 0
+    apply_project_counters(connection, added=added, removed=removed)
+
+    user_ids = {b.user_id for b in added} | {b.user_id for b in removed}
+    timezones = dict(timezones or {})
+    missing = user_ids - timezones.keys()
+    if missing:
+        timezones.update(load_user_timezones(connection, missing))
+
+    # 合并同一 key 的增量：[金额, 工时, 笔数]
+    deltas: Dict[RollupKey, list] = {}
+    for bills, sign in ((added, 1), (removed, -1)):
+        for bill in bills:
+            delta = deltas.setdefault(_rollup_key(bill, timezones[bill.user_id]), [0.0, 0.0, 0])
+            delta[0] += sign * (bill.amount or 0)
+            delta[1] += sign * (bill.duration_hours or 0)
+            delta[2] += sign
+
+    params = [
+        {
+            "user_id": key[0], "project_id": key[1], "local_date": key[2],
+            "bill_type": key[3], "category": key[4], "name": key[5],
+            "total_amount": amount, "total_hours": hours, "bill_count": count,
+        }
+        for key, (amount, hours, count) in deltas.items()
+        if count or amount or hours
+    ]
+    if not params:
+        return 0
+
+    connection.execute(_upsert_statement(connection), params)
+    # 清理已无账单的汇总行
+    connection.execute(
+        delete(BillDailyRollup).where(
+            BillDailyRollup.user_id.in_(user_ids),
+            BillDailyRollup.bill_count <= 0,
+        )
+    )
+    return len(params)
+
+
+def _previous_state(bill) -> Optional[SimpleNamespace]:
+    """获取已修改账单在本次 flush 前的汇总字段快照，未影响汇总时返回 None"""
+    old_values = {}
+    changed = False
+    for field in ROLLUP_SOURCE_FIELDS:
+        history = attributes.get_history(bill, field, passive=attributes.PASSIVE_NO_INITIALIZE)
+        if history.deleted:
+            old_values[field] = history.deleted[0]
+            changed = True
+        else:
+            old_values[field] = getattr(bill, field)
+    return SimpleNamespace(**old_values) if changed else None
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_rollups_after_flush(session: Session, flush_context):
+    """ORM flush 后同步账单变更到日汇总表（同一事务）"""
+    from models.bill import Bill
+
+    added, removed = [], []
+    for obj in session.new:
+        if isinstance(obj, Bill):
+            added.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Bill):
+            removed.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Bill) and obj not in session.deleted:
+            previous = _previous_state(obj)
+            if previous is not None:
+                removed.append(previous)
+                added.append(obj)
+
+    if added or removed:
+        apply_bill_changes(session.connection(), added=added, removed=removed)
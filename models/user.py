@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, event, inspect
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, Session
 from db.database import Base
 
 
@@ -11,6 +11,10 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
+    # 用户时区（UTC 偏移分钟数），为空时使用全局 TZ_OFFSET_HOURS；决定按日/按月统计的分界
+    tz_offset_minutes = Column(Integer, nullable=True)
+    # 令牌代数：写入 JWT 的 epoch 声明，递增后之前签发的令牌全部失效
+    token_epoch = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -21,4 +25,53 @@ class User(Base):
     # 关系
     bills = relationship("Bill", back_populates="user")
     projects = relationship("Project", back_populates="user")
-    family = relationship("Family", back_populates="members", foreign_keys=[family_id])
\ No newline at end of file
+    family = relationship("Family", back_populates="members", foreign_keys=[family_id])
+
+
+# 写入 JWT 声明的字段（fid、tz），变化后已签发的令牌携带的是旧值，需要吊销
+_CLAIM_FIELDS = ("family_id", "tz_offset_minutes")
+
+# session.info 中待提交的吊销：{user_id: 新 epoch}
+_PENDING_REVOCATIONS = "token_revocations"
+# session.info 中成员发生变化的家庭ID（提交后使家庭统计缓存失效）
+_PENDING_FAMILY_CHANGES = "family_changes"
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_token_epoch_before_flush(session: Session, flush_context, instances):
+    """声明字段变化时递增令牌代数（同一事务），提交后再吊销旧令牌"""
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        epoch_changed = attrs.token_epoch.history.has_changes()
+        if not epoch_changed and any(attrs[name].history.has_changes() for name in _CLAIM_FIELDS):
+            obj.token_epoch = (obj.token_epoch or 0) + 1
+            epoch_changed = True
+        if epoch_changed:
+            session.info.setdefault(_PENDING_REVOCATIONS, {})[obj.id] = obj.token_epoch
+        
+        family_history = attrs.family_id.history
+        if family_history.has_changes():
+            changed = session.info.setdefault(_PENDING_FAMILY_CHANGES, set())
+            changed.update(fid for fid in (*family_history.added, *family_history.deleted) if fid)
+
+
+@event.listens_for(Session, "after_commit")
+def _revoke_tokens_after_commit(session: Session):
+    """事务提交后发布吊销、使成员变化的家庭统计缓存失效（回滚的变更不生效）"""
+    revocations = session.info.pop(_PENDING_REVOCATIONS, None)
+    if revocations:
+        from utils.jwt import revoke_token_epochs
+        revoke_token_epochs(revocations)
+    
+    family_ids = session.info.pop(_PENDING_FAMILY_CHANGES, None)
+    if family_ids:
+        from utils.cache import invalidate_family_cache, run_in_background
+        run_in_background(invalidate_family_cache(family_ids))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_revocations_after_rollback(session: Session, previous_transaction):
+    session.info.pop(_PENDING_REVOCATIONS, None)
+    session.info.pop(_PENDING_FAMILY_CHANGES, None)
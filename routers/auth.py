@@ -1,30 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from db.database import get_db
-from schemas.user import UserCreate, UserLogin, UserResponse, Token
-from services.auth_service import create_user, login_user, get_user_by_username
-from utils.jwt import verify_token
-from utils.rate_limit import check_rate_limit
-from utils.cache import CacheKeys, _memory_cache
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.async_database import get_async_db
+from models.user import User
+from schemas.user import (
+    UserCreate, UserLogin, UserResponse, UserTimezoneUpdate, Token, TokenRefresh, CurrentUser, PrincipalContext
+)
+from services.auth_service import (
+    create_user_async, login_user_async, get_user_by_username_async, update_user_timezone_async,
+    issue_access_token, logout_all_async, refresh_access_token_async, get_principal_context_async,
+    get_token_epoch_async
+)
+from utils.jwt import verify_token, is_token_revoked, revocation_is_shared
+from utils.rate_limit import RateLimit
+from utils.admission import admit_heavy_request, heavy_admission
+from utils.cache import CacheKeys, cache_delete, cache_get_or_compute
 from fastapi.security import OAuth2PasswordBearer
 
-# 注：认证路由保持同步设计
-# 原因：1) 认证是安全关键路径，稳定性优先 2) 访问频率低，无需异步优化 3) 密码哈希是CPU密集操作而非I/O
+# 注：认证路由全部异步，不经过 AnyIO 线程池和同步连接池
+# 密码哈希是CPU密集操作，在独立进程池中执行（见 utils.password_hasher），繁忙时返回 503
 router = APIRouter(prefix="/auth", tags=["认证"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-# 用户缓存TTL（秒）- 5分钟
+# 用户资料缓存TTL（秒）- 5分钟，仅用于 GET /auth/me
 USER_CACHE_TTL = 300
 
+# 声明变化（时区、家庭）后重新签发的令牌通过该响应头返回，客户端替换本地令牌即可
+REISSUED_TOKEN_HEADER = "X-Access-Token"
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+
+def _dump_user(user: UserResponse) -> str:
+    """用户信息 -> 缓存值（JSON，可跨 worker 共享）"""
+    return user.model_dump_json()
+
+
+def set_reissued_token(response: Response, user: User):
+    """声明字段变化后旧令牌已被吊销，为当前用户重新签发令牌"""
+    response.headers[REISSUED_TOKEN_HEADER] = issue_access_token(user)["access_token"]
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> CurrentUser:
     """
-    获取当前登录用户（带缓存优化）
+    获取当前登录用户
     
-    优化策略：
-    1. 先验证 Token（CPU操作，无IO）
-    2. 根据用户名从缓存获取用户信息
-    3. 缓存未命中时才查询数据库
+    由已验证的 JWT 声明（uid、fid、tz、epoch）构建：
+    1. 验证 Token（CPU操作，结果有短期缓存）
+    2. 对照进程内的吊销集合检查 epoch（登出全部设备、家庭或时区变化后旧令牌失效）
+    3. 未配置 Redis 时吊销集合无法在 worker 之间共享、重启后也会丢失，
+       此时再按主键查询用户当前的 token_epoch 比对（配置 Redis 时不查库）
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,38 +57,74 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # 1. 验证 Token
     token_data = verify_token(token, credentials_exception)
-    username = token_data.username
-    
-    # 2. 尝试从缓存获取用户
-    cache_key = CacheKeys.user_by_name_key(username)
-    cached_user = _memory_cache.get(cache_key)
-    if cached_user is not None:
-        return cached_user
-    
-    # 3. 缓存未命中，查询数据库
-    user = get_user_by_username(db, username=username)
-    if user is None:
+    if is_token_revoked(token_data.user_id, token_data.epoch):
         raise credentials_exception
+    if not revocation_is_shared():
+        current_epoch = await get_token_epoch_async(db, token_data.user_id)
+        if current_epoch is None or token_data.epoch < current_epoch:
+            raise credentials_exception
     
-    # 4. 缓存用户信息（存储 UserResponse 格式）
-    user_response = UserResponse(
-        id=user.id,
-        username=user.username,
-        email=user.email,
-        created_at=user.created_at
+    return CurrentUser(
+        id=token_data.user_id,
+        username=token_data.username,
+        family_id=token_data.family_id,
+        tz_offset_minutes=token_data.tz_offset_minutes,
+        token_epoch=token_data.epoch,
     )
-    _memory_cache.set(cache_key, user_response, USER_CACHE_TTL)
+
+
+async def get_principal(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> PrincipalContext:
+    """
+    获取当前用户的主体上下文（家庭成员、拥有的项目），命中缓存时不查库
     
-    return user_response
+    Usage:
+        async def endpoint(principal: PrincipalContext = Depends(get_principal)):
+            if not principal.owns_project(project_id): ...
+    """
+    return await get_principal_context_async(db, current_user)
 
 
-@router.post("/register", response_model=UserResponse, summary="用户注册")
-def register(
+def user_rate_limit(max_requests: int, window_seconds: int, name: str):
+    """
+    按当前用户限流的依赖（未认证请求先由 get_current_user 拒绝）
+    
+    Usage:
+        @router.post("/batch", dependencies=[Depends(user_rate_limit(10, 60, "bills:batch"))])
+    """
+    limiter = RateLimit(max_requests, window_seconds, name)
+    
+    async def dependency(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+        await limiter.hit(request, f"user:{current_user.id}")
+    
+    return dependency
+
+
+def heavy_route(name: str, cost: int):
+    """
+    重接口（导出、统计、批量）准入控制依赖：按用户扣成本预算并公平排队，执行完毕后归还名额
+    
+    Usage:
+        @router.get("/export", dependencies=[Depends(heavy_route("bills:export", 8))])
+    """
+    async def dependency(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+        await admit_heavy_request(request, current_user.id, name, cost)
+        try:
+            yield
+        finally:
+            heavy_admission.release(current_user.id)
+    
+    return dependency
+
+
+@router.post("/register", response_model=UserResponse, summary="用户注册",
+             dependencies=[Depends(RateLimit(5, 60, "register"))])
+async def register(
     user: UserCreate, 
-    request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     注册新用户
@@ -72,16 +133,14 @@ def register(
     - **email**: 有效的电子邮箱
     - **password**: 密码（至少6个字符）
     """
-    # 速率限制：每IP每分钟最多5次注册尝试
-    check_rate_limit(request, "register", max_requests=5, window_seconds=60)
-    return create_user(db=db, user=user)
+    return await create_user_async(db=db, user=user)
 
 
-@router.post("/login", response_model=Token, summary="用户登录")
-def login(
+@router.post("/login", response_model=Token, summary="用户登录",
+             dependencies=[Depends(RateLimit(10, 60, "login"))])
+async def login(
     user: UserLogin, 
-    request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     用户登录获取 JWT Token
@@ -89,14 +148,88 @@ def login(
     - **username**: 用户名
     - **password**: 密码
     
-    返回 access_token，在后续请求中通过 Authorization: Bearer {token} 使用
+    返回 access_token，在后续请求中通过 Authorization: Bearer {token} 使用；
+    access_token 过期后用 refresh_token 调用 /auth/refresh 换取新令牌，无需再次登录
+    """
+    return await login_user_async(db=db, user=user)
+
+
+@router.post("/refresh", response_model=Token, summary="刷新访问令牌",
+             dependencies=[Depends(RateLimit(30, 60, "refresh"))])
+async def refresh(
+    data: TokenRefresh,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    用刷新令牌换取新的访问令牌（无需密码）
+    
+    刷新令牌每次使用后轮换，请保存响应中新的 refresh_token；
+    重复使用已轮换的刷新令牌会被视为泄露，该登录链上的令牌全部失效
     """
-    # 速率限制：每IP每分钟最多10次登录尝试
-    check_rate_limit(request, "login", max_requests=10, window_seconds=60)
-    return login_user(db=db, user=user)
+    return await refresh_access_token_async(db, data.refresh_token)
 
 
 @router.get("/me", response_model=UserResponse, summary="获取当前用户")
-def read_users_me(current_user: UserResponse = Depends(get_current_user)):
-    """获取当前登录用户的信息"""
-    return current_user
\ No newline at end of file
+async def read_users_me(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """获取当前登录用户的完整资料（带缓存）"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无法验证凭据",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    # 缓存未命中时查询数据库（用户不存在时抛出异常，不写入缓存）
+    async def load_user() -> UserResponse:
+        user = await get_user_by_username_async(db, current_user.username)
+        if user is None:
+            raise credentials_exception
+        return UserResponse(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            created_at=user.created_at,
+            tz_offset_minutes=user.tz_offset_minutes
+        )
+    
+    return await cache_get_or_compute(
+        CacheKeys.user_by_name_key(current_user.username),
+        load_user,
+        ttl=USER_CACHE_TTL,
+        serialize=_dump_user,
+        deserialize=UserResponse.model_validate_json,
+    )
+
+
+@router.put("/me/timezone", response_model=UserResponse, summary="设置时区")
+async def update_my_timezone(
+    data: UserTimezoneUpdate,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    设置当前用户的时区（UTC 偏移分钟数）
+    
+    按日、按月的筛选和统计都以该时区的自然日划分。
+    时区写在令牌声明中，修改后旧令牌失效，新令牌在 X-Access-Token 响应头中返回
+    """
+    user = await update_user_timezone_async(db, current_user.id, data.tz_offset_minutes)
+    # 用户信息缓存中带有时区，需要在所有 worker 中失效
+    await cache_delete(CacheKeys.user_by_name_key(user.username))
+    set_reissued_token(response, user)
+    return user
+
+
+@router.post("/logout-all", summary="登出全部设备")
+async def logout_all(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    使当前用户之前签发的所有访问令牌和刷新令牌失效（包括本次请求使用的令牌）
+    """
+    await logout_all_async(db, current_user.id)
+    return {"message": "已登出全部设备"}
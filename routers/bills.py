@@ -1,22 +1,25 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from db.async_database import get_async_db
 from schemas.bill import (
     BillCreate, BillResponse, BillUpdate, BillStatistics, 
-    CategoryStatistics, NameStatistics,
-    BillHistoryResponse, BillBatchCreate, BillBatchDelete, BatchOperationResponse
+    CategoryStatistics, NameStatistics, PaginatedBillResponse,
+    BillHistoryResponse, BillBatchCreate, BillBatchDelete, BatchOperationResponse,
+    BillImportResponse
 )
 from services.async_bill_service import (
-    create_bill_async, get_bills_by_user_async, get_bill_by_id_async, 
+    create_bill_async, get_bills_by_user_async, get_bills_page_async, get_bill_by_id_async, 
     update_bill_async, delete_bill_async, get_monthly_statistics_async, 
     get_category_statistics_async, get_name_statistics_async, 
     get_bill_history_async, create_bills_batch_async, delete_bills_batch_async,
     export_bills_to_csv_async, restore_bill_version_async
 )
-from routers.auth import get_current_user
-from schemas.user import UserResponse
+from services.bill_import_service import import_bills_async
+from routers.auth import get_current_user, get_principal, heavy_route
+from schemas.user import CurrentUser, PrincipalContext
+from utils.cache import track_cache_freshness, cached_json_response
 import io
 
 router = APIRouter(prefix="/bills", tags=["账单"])
@@ -26,12 +29,16 @@ router = APIRouter(prefix="/bills", tags=["账单"])
 async def create_bill_endpoint(
     bill: BillCreate, 
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user),
+    principal: PrincipalContext = Depends(get_principal)
 ):
     """
     创建新账单记录 (异步)
     """
-    return await create_bill_async(db=db, bill=bill, user_id=current_user.id)
+    return await create_bill_async(
+        db=db, bill=bill, user_id=current_user.id, family_id=current_user.family_id,
+        owned_project_ids=principal.project_ids
+    )
 
 
 @router.get("/", response_model=List[BillResponse], summary="获取账单列表")
@@ -44,7 +51,7 @@ async def get_bills(
     category: Optional[str] = Query(None, description="按分类筛选"),
     project_id: Optional[int] = Query(None, description="按项目ID筛选"),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """获取当前用户的账单列表 (异步)"""
     return await get_bills_by_user_async(
@@ -56,20 +63,56 @@ async def get_bills(
         bill_type=bill_type,
         worker=worker,
         category=category,
-        project_id=project_id
+        project_id=project_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
     )
 
 
-@router.get("/export", summary="导出账单CSV")
+@router.get("/page", response_model=PaginatedBillResponse, summary="游标分页获取账单列表")
+async def get_bills_page(
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，首页不传"),
+    limit: int = Query(50, ge=1, le=500, description="每页记录数，最大500"),
+    month: Optional[str] = Query(None, description="格式: YYYY-MM"),
+    bill_type: Optional[str] = Query(None, description="income 或 expense"),
+    worker: Optional[str] = Query(None, description="按工人姓名筛选"),
+    category: Optional[str] = Query(None, description="按分类筛选"),
+    project_id: Optional[int] = Query(None, description="按项目ID筛选"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    游标分页获取账单列表 (异步)
+    
+    按日期倒序，翻页时把上一页的 next_cursor 作为 cursor 传入；
+    next_cursor 为空表示没有更多数据。深分页与首页耗时相同。
+    """
+    return await get_bills_page_async(
+        db=db,
+        user_id=current_user.id,
+        cursor=cursor,
+        limit=limit,
+        month=month,
+        bill_type=bill_type,
+        worker=worker,
+        category=category,
+        project_id=project_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
+    )
+
+
+@router.get("/export", summary="导出账单CSV", dependencies=[Depends(heavy_route("bills:export", 8))])
 async def export_bills(
     month: Optional[str] = Query(None, description="格式: YYYY-MM，可选"),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     导出账单为 CSV 文件下载 (异步接口).
     """
-    csv_content = await export_bills_to_csv_async(db=db, user_id=current_user.id, month=month)
+    csv_content = await export_bills_to_csv_async(
+        db=db, user_id=current_user.id, month=month,
+        tz_offset_minutes=current_user.tz_offset_minutes
+    )
     
     # 添加 BOM 以支持 Excel 正确识别中文
     csv_bytes = ('\ufeff' + csv_content).encode('utf-8')
@@ -83,7 +126,39 @@ async def export_bills(
     )
 
 
-@router.get("/statistics/monthly", response_model=BillStatistics, summary="统计查询")
+@router.post("/import", response_model=BillImportResponse, summary="导入账单（CSV/NDJSON）",
+             dependencies=[Depends(heavy_route("bills:import", 8))])
+async def import_bills(
+    request: Request,
+    format: Optional[str] = Query(
+        None, description="csv 或 ndjson；不传时按 Content-Type 判断（application/x-ndjson 为 ndjson，否则 csv）"
+    ),
+    project_id: Optional[int] = Query(None, description="CSV 必填：导入到的项目；NDJSON 行未指定项目时的默认项目"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    principal: PrincipalContext = Depends(get_principal)
+):
+    """
+    流式导入账单 (异步)
+    
+    请求体直接上传文件内容：CSV 与导出接口的列相同（可带表头和 BOM），
+    NDJSON 每行一个与创建账单相同字段的 JSON 对象。边读边校验、按批写入，
+    校验失败的行跳过并在 errors 中返回行号和原因
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type else "csv"
+    return await import_bills_async(
+        db=db, chunks=request.stream(), fmt=format.lower(), user_id=current_user.id,
+        owned_project_ids=principal.project_ids, project_id=project_id,
+        family_id=current_user.family_id
+    )
+
+
+@router.get(
+    "/statistics/monthly", response_model=BillStatistics, summary="统计查询",
+    dependencies=[Depends(heavy_route("bills:statistics", 2)), Depends(track_cache_freshness)]
+)
 async def get_monthly_stats(
     month: Optional[str] = Query(None, description="格式: YYYY-MM，单月查询"),
     date: Optional[str] = Query(None, description="格式: YYYY-MM-DD，单日查询"),
@@ -93,30 +168,43 @@ async def get_monthly_stats(
     end_month: Optional[str] = Query(None, description="格式: YYYY-MM，范围结束月份"),
     project_id: Optional[int] = Query(None, description="按项目ID筛选"),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """获取统计数据，支持单日、单月、日期范围、月份范围查询 (异步+缓存)"""
-    return await get_monthly_statistics_async(
+    body = await get_monthly_statistics_async(
         db=db, user_id=current_user.id, 
         month=month, date=date,
         start_date=start_date, end_date=end_date,
         start_month=start_month, end_month=end_month,
-        project_id=project_id
+        project_id=project_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
     )
+    # 缓存中已是最终响应体，直接返回（跳过 response_model 校验和再次序列化）
+    return cached_json_response(body)
 
 
-@router.get("/statistics/category", response_model=List[CategoryStatistics], summary="分类统计")
+@router.get(
+    "/statistics/category", response_model=List[CategoryStatistics], summary="分类统计",
+    dependencies=[Depends(heavy_route("bills:statistics", 2)), Depends(track_cache_freshness)]
+)
 async def get_category_stats(
     month: Optional[str] = Query(None, description="格式: YYYY-MM，可选"),
     project_id: Optional[int] = Query(None, description="按项目ID筛选"),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """获取分类统计 (异步+缓存)"""
-    return await get_category_statistics_async(db=db, user_id=current_user.id, month=month, project_id=project_id)
+    body = await get_category_statistics_async(
+        db=db, user_id=current_user.id, month=month, project_id=project_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
+    )
+    return cached_json_response(body)
 
 
-@router.get("/statistics/name", response_model=List[NameStatistics], summary="名称统计")
+@router.get(
+    "/statistics/name", response_model=List[NameStatistics], summary="名称统计",
+    dependencies=[Depends(heavy_route("bills:statistics", 3)), Depends(track_cache_freshness)]
+)
 async def get_name_stats(
     month: Optional[str] = Query(None, description="格式: YYYY-MM，单月查询"),
     date: Optional[str] = Query(None, description="格式: YYYY-MM-DD，单日查询"),
@@ -126,23 +214,61 @@ async def get_name_stats(
     end_month: Optional[str] = Query(None, description="格式: YYYY-MM，范围结束月份"),
     project_id: Optional[int] = Query(None, description="按项目ID筛选"),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """按账单名称/人员统计汇总 (异步+缓存)"""
-    return await get_name_statistics_async(
+    body = await get_name_statistics_async(
         db=db, user_id=current_user.id, 
         month=month, date=date,
         start_date=start_date, end_date=end_date,
         start_month=start_month, end_month=end_month,
-        project_id=project_id
+        project_id=project_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
+    )
+    return cached_json_response(body)
+
+
+@router.post("/batch", response_model=BatchOperationResponse, summary="批量创建账单",
+             dependencies=[Depends(heavy_route("bills:batch", 4))])
+async def create_bills_batch_endpoint(
+    request: BillBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user),
+    principal: PrincipalContext = Depends(get_principal)
+):
+    """
+    批量创建账单 (异步)
+    
+    超过 BILL_BATCH_CHUNK_SIZE 条时分批提交：项目归属等校验失败时整批不写入，
+    但写入过程中某一批失败（返回 5xx）时，之前的批次已经保存，重试前请先查询确认
+    """
+    bills = await create_bills_batch_async(
+        db=db, bills=request.bills, user_id=current_user.id, family_id=current_user.family_id,
+        owned_project_ids=principal.project_ids
+    )
+    return BatchOperationResponse(message="批量创建成功", count=len(bills))
+
+
+# 注意：/batch 必须注册在 /{bill_id} 之前，否则 DELETE /batch 会被当作 bill_id 匹配
+@router.delete("/batch", response_model=BatchOperationResponse, summary="批量删除账单",
+               dependencies=[Depends(heavy_route("bills:batch", 4))])
+async def delete_bills_batch_endpoint(
+    request: BillBatchDelete,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """批量删除账单 (异步)"""
+    result = await delete_bills_batch_async(
+        db=db, bill_ids=request.bill_ids, user_id=current_user.id, family_id=current_user.family_id
     )
+    return BatchOperationResponse(message=result["message"], count=result["deleted_count"])
 
 
 @router.get("/{bill_id}", response_model=BillResponse, summary="获取单个账单")
 async def get_bill(
     bill_id: int,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """根据账单ID获取详情 (异步)"""
     return await get_bill_by_id_async(db=db, bill_id=bill_id, user_id=current_user.id)
@@ -153,49 +279,33 @@ async def update_bill_endpoint(
     bill_id: int,
     bill: BillUpdate,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user),
+    principal: PrincipalContext = Depends(get_principal)
 ):
     """更新指定账单 (异步)"""
-    return await update_bill_async(db=db, bill_id=bill_id, bill=bill, user_id=current_user.id)
+    return await update_bill_async(
+        db=db, bill_id=bill_id, bill=bill, user_id=current_user.id, family_id=current_user.family_id,
+        owned_project_ids=principal.project_ids
+    )
 
 
 @router.delete("/{bill_id}", summary="删除账单")
 async def delete_bill_endpoint(
     bill_id: int,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """删除指定账单 (异步)"""
-    return await delete_bill_async(db=db, bill_id=bill_id, user_id=current_user.id)
-
-
-@router.post("/batch", response_model=BatchOperationResponse, summary="批量创建账单")
-async def create_bills_batch_endpoint(
-    request: BillBatchCreate,
-    db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
-):
-    """批量创建账单 (异步)"""
-    bills = await create_bills_batch_async(db=db, bills=request.bills, user_id=current_user.id)
-    return BatchOperationResponse(message="批量创建成功", count=len(bills))
-
-
-@router.delete("/batch", response_model=BatchOperationResponse, summary="批量删除账单")
-async def delete_bills_batch_endpoint(
-    request: BillBatchDelete,
-    db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
-):
-    """批量删除账单 (异步)"""
-    result = await delete_bills_batch_async(db=db, bill_ids=request.bill_ids, user_id=current_user.id)
-    return BatchOperationResponse(message=result["message"], count=result["deleted_count"])
+    return await delete_bill_async(
+        db=db, bill_id=bill_id, user_id=current_user.id, family_id=current_user.family_id
+    )
 
 
 @router.get("/{bill_id}/history", response_model=List[BillHistoryResponse], summary="查看账单修改历史")
 async def get_bill_history_endpoint(
     bill_id: int,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """查看某个账单的所有历史版本 (异步)"""
     return await get_bill_history_async(db=db, bill_id=bill_id, user_id=current_user.id)
@@ -204,10 +314,19 @@ async def get_bill_history_endpoint(
 @router.post("/history/{history_id}/restore", response_model=BillResponse, summary="回滚到历史版本")
 async def restore_version_endpoint(
     history_id: int,
+    project_id: Optional[int] = Query(
+        None, description="账单已删除时恢复到的项目，默认原项目；原项目已删除时必填"
+    ),
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user),
+    principal: PrincipalContext = Depends(get_principal)
 ):
     """
     回滚到指定的历史版本 (异步接口).
+    
+    账单已删除时按历史版本重新创建；所属项目已被删除时用 project_id 指定恢复到的项目
     """
-    return await restore_bill_version_async(db=db, history_id=history_id, user_id=current_user.id)
\ No newline at end of file
+    return await restore_bill_version_async(
+        db=db, history_id=history_id, user_id=current_user.id, family_id=current_user.family_id,
+        owned_project_ids=principal.project_ids, target_project_id=project_id
+    )
\ No newline at end of file
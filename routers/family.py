@@ -7,30 +7,35 @@
 - 查看家庭账单
 - 家庭统计
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from db.database import get_db
+from db.async_database import get_async_db
 from schemas.family import (
     FamilyCreate, FamilyJoin, FamilyResponse, FamilyDetailResponse,
-    FamilyMemberResponse, FamilyBillResponse, FamilyStatisticsResponse
+    FamilyMemberResponse, FamilyBillResponse, FamilyStatisticsResponse, PaginatedFamilyBillResponse
 )
 from services.family_service import (
     create_family, get_user_family, join_family, leave_family,
-    dissolve_family, get_family_members, get_family_bills,
-    get_family_statistics, refresh_invite_code
+    dissolve_family, get_family_members, get_family_bills, get_family_bills_page_async,
+    get_family_statistics_async, refresh_invite_code
 )
-from routers.auth import get_current_user
-from schemas.user import UserResponse
+from routers.auth import get_current_user, get_principal, set_reissued_token, heavy_route
+from models.user import User
+from schemas.user import CurrentUser, PrincipalContext
+from utils.cache import track_cache_freshness, cached_json_response
 
 router = APIRouter(prefix="/family", tags=["家庭组"])
 
 
 @router.post("/", response_model=FamilyResponse, summary="创建家庭组")
 def create_family_endpoint(
+    response: Response,
     family: FamilyCreate,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     创建新的家庭组
@@ -38,8 +43,10 @@ def create_family_endpoint(
     - 创建者自动成为家庭成员
     - 生成6位邀请码供其他成员加入
     - 每个用户只能属于一个家庭组
+    - 家庭写在令牌声明中，新令牌在 X-Access-Token 响应头中返回
     """
     result = create_family(db=db, family=family, user_id=current_user.id)
+    set_reissued_token(response, db.get(User, current_user.id))
     return FamilyResponse(
         id=result.id,
         name=result.name,
@@ -53,18 +60,18 @@ def create_family_endpoint(
 @router.get("/", response_model=Optional[FamilyDetailResponse], summary="获取我的家庭")
 def get_my_family(
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    principal: PrincipalContext = Depends(get_principal)
 ):
     """
     获取当前用户所在的家庭组信息
     
     如果用户未加入任何家庭，返回 null
     """
-    family = get_user_family(db=db, user_id=current_user.id)
+    family = get_user_family(db=db, principal=principal)
     if not family:
         return None
     
-    members = get_family_members(db=db, user_id=current_user.id)
+    members = get_family_members(db=db, family_id=family.id, creator_id=family.created_by)
     return FamilyDetailResponse(
         id=family.id,
         name=family.name,
@@ -77,18 +84,21 @@ def get_my_family(
 
 @router.post("/join", response_model=FamilyResponse, summary="加入家庭组")
 def join_family_endpoint(
+    response: Response,
     data: FamilyJoin,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     通过邀请码加入家庭组
     
     - 邀请码不区分大小写
     - 用户只能加入一个家庭组
+    - 家庭写在令牌声明中，新令牌在 X-Access-Token 响应头中返回
     """
     family = join_family(db=db, invite_code=data.invite_code, user_id=current_user.id)
-    member_count = len(get_family_members(db=db, user_id=current_user.id))
+    set_reissued_token(response, db.get(User, current_user.id))
+    member_count = len(get_family_members(db=db, family_id=family.id, creator_id=family.created_by))
     return FamilyResponse(
         id=family.id,
         name=family.name,
@@ -101,8 +111,9 @@ def join_family_endpoint(
 
 @router.post("/leave", summary="退出家庭组")
 def leave_family_endpoint(
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     退出当前家庭组
@@ -110,32 +121,39 @@ def leave_family_endpoint(
     - 普通成员可以直接退出
     - 创建者如果是最后一人，会同时解散家庭
     - 创建者如果还有其他成员，需要先转让或解散
+    - 家庭写在令牌声明中，新令牌在 X-Access-Token 响应头中返回
     """
-    return leave_family(db=db, user_id=current_user.id)
+    result = leave_family(db=db, user_id=current_user.id)
+    set_reissued_token(response, db.get(User, current_user.id))
+    return result
 
 
 @router.post("/dissolve", summary="解散家庭组")
 def dissolve_family_endpoint(
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     解散家庭组（仅创建者可操作）
     
-    所有成员将被移出家庭，家庭组被删除
+    所有成员将被移出家庭，家庭组被删除。
+    所有成员的旧令牌失效；当前用户的新令牌在 X-Access-Token 响应头中返回
     """
-    return dissolve_family(db=db, user_id=current_user.id)
+    result = dissolve_family(db=db, user_id=current_user.id)
+    set_reissued_token(response, db.get(User, current_user.id))
+    return result
 
 
 @router.get("/members", response_model=List[FamilyMemberResponse], summary="获取家庭成员")
 def get_members(
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    principal: PrincipalContext = Depends(get_principal)
 ):
     """
     获取家庭组的所有成员列表
     """
-    return get_family_members(db=db, user_id=current_user.id)
+    return get_family_members(db=db, family_id=principal.family_id, creator_id=principal.family_creator_id)
 
 
 @router.get("/bills", response_model=List[FamilyBillResponse], summary="获取家庭账单")
@@ -145,7 +163,8 @@ def get_bills(
     month: Optional[str] = Query(None, description="月份筛选 (YYYY-MM)"),
     member_id: Optional[int] = Query(None, description="指定成员ID筛选"),
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user),
+    principal: PrincipalContext = Depends(get_principal)
 ):
     """
     获取家庭组所有成员的账单
@@ -153,36 +172,72 @@ def get_bills(
     - 可按月份筛选
     - 可按成员筛选
     - 每条账单显示所属成员的用户名
+    
+    偏移分页，深分页开销随页码增长；新客户端请使用 /family/bills/page
     """
     return get_family_bills(
         db=db, 
-        user_id=current_user.id, 
+        principal=principal, 
         skip=skip, 
         limit=limit,
         month=month,
-        member_id=member_id
+        member_id=member_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
     )
 
 
-@router.get("/statistics", response_model=FamilyStatisticsResponse, summary="家庭统计")
-def get_statistics(
+@router.get("/bills/page", response_model=PaginatedFamilyBillResponse, summary="游标分页获取家庭账单")
+async def get_bills_page(
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，首页不传"),
+    limit: int = Query(50, ge=1, le=500, description="每页记录数，最大500"),
     month: Optional[str] = Query(None, description="月份筛选 (YYYY-MM)"),
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    member_id: Optional[int] = Query(None, description="指定成员ID筛选"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
-    获取家庭组的统计数据
+    游标分页获取家庭组所有成员的账单 (异步)
+    
+    按日期倒序，翻页时把上一页的 next_cursor 作为 cursor 传入；
+    next_cursor 为空表示没有更多数据。深分页与首页耗时相同。
+    """
+    return await get_family_bills_page_async(
+        db=db,
+        family_id=current_user.family_id,
+        cursor=cursor,
+        limit=limit,
+        month=month,
+        member_id=member_id,
+        tz_offset_minutes=current_user.tz_offset_minutes
+    )
+
+
+@router.get(
+    "/statistics", response_model=FamilyStatisticsResponse, summary="家庭统计",
+    dependencies=[Depends(heavy_route("family:statistics", 4)), Depends(track_cache_freshness)]
+)
+async def get_statistics(
+    month: Optional[str] = Query(None, description="月份筛选 (YYYY-MM)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    获取家庭组的统计数据 (异步+缓存)
     
     - 总收入/支出/结余
     - 每个成员的统计明细
     """
-    return get_family_statistics(db=db, user_id=current_user.id, month=month)
+    body = await get_family_statistics_async(
+        db=db, family_id=current_user.family_id, month=month,
+        tz_offset_minutes=current_user.tz_offset_minutes
+    )
+    return cached_json_response(body)
 
 
 @router.post("/refresh-code", summary="刷新邀请码")
 def refresh_code(
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     刷新家庭组邀请码（仅创建者可操作）
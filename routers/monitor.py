@@ -7,14 +7,14 @@
 - 缓存状态端点
 """
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from datetime import datetime
 from typing import Optional
-from db.database import get_db
+from db.async_database import get_async_db
 from config import settings
 from routers.auth import get_current_user
-from schemas.user import UserResponse
+from schemas.user import CurrentUser
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +23,7 @@ router = APIRouter(prefix="/monitor", tags=["系统监控"])
 
 
 @router.get("/health", summary="健康检查")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     健康检查接口
     
@@ -35,7 +35,7 @@ async def health_check(db: Session = Depends(get_db)):
     db_latency = None
     try:
         start = datetime.utcnow()
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         db_latency = (datetime.utcnow() - start).total_seconds() * 1000
     except Exception as e:
         db_status = f"error: {str(e)}"
@@ -83,7 +83,7 @@ async def health_check(db: Session = Depends(get_db)):
 
 @router.get("/stats", summary="性能统计")
 async def get_performance_stats(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     获取系统性能统计（需要认证）
@@ -92,7 +92,9 @@ async def get_performance_stats(
     """
     try:
         from utils.performance import monitor
+        from utils.load_shedding import load_shedder
         stats = monitor.get_stats()
+        stats["load_shedding"].update(load_shedder.snapshot())
         return {
             "success": True,
             "data": stats,
@@ -107,20 +109,23 @@ async def get_performance_stats(
 
 @router.get("/cache", summary="缓存状态")
 async def get_cache_status(
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     获取缓存状态（需要认证）
     """
     from utils.cache import _redis_available, _memory_cache
     
-    memory_cache_size = len(_memory_cache._cache)
+    memory_cache_size = len(_memory_cache)
     
     result = {
         "redis_enabled": settings.REDIS_URL != "",
         "redis_available": _redis_available or False,
         "memory_cache_size": memory_cache_size,
         "memory_cache_maxsize": _memory_cache.maxsize,
+        "memory_cache_bytes": _memory_cache.current_bytes,
+        "memory_cache_max_bytes": _memory_cache.max_bytes,
+        "memory_cache_keyspaces": _memory_cache.keyspace_sizes(),
     }
     
     if _redis_available:
@@ -142,13 +147,13 @@ async def get_cache_status(
 @router.post("/cache/clear", summary="清空缓存")
 async def clear_cache(
     pattern: Optional[str] = None,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """
     清空缓存（需要认证）
     
     - 不传 pattern：清空所有缓存
-    - 传 pattern：按模式清空（仅 Redis 支持）
+    - 传 pattern：按模式清空
     """
     from utils.cache import cache_delete_pattern, _memory_cache
     
@@ -3,74 +3,129 @@
 
 处理项目相关的HTTP请求
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from db.database import get_db
+from db.async_database import get_async_db
 from schemas.project import ProjectCreate, ProjectResponse, ProjectUpdate, ProjectWithBills
+from schemas.bill import PaginatedBillResponse
 from services.project_service import (
     create_project as create_project_service,
-    get_projects as get_projects_service,
-    get_project_with_bills,
+    get_projects_async,
+    get_project_detail_async,
+    get_project_bills_page_async,
     update_project as update_project_service,
-    delete_project as delete_project_service
+    delete_project_async
+)
+from routers.auth import get_current_user, get_principal, heavy_route
+from schemas.user import CurrentUser, PrincipalContext
+from utils.exceptions import NotFoundException
+from utils.cache import (
+    invalidate_user_cache, invalidate_principal_cache, invalidate_project_cache, cached_json_response
 )
-from routers.auth import get_current_user
-from schemas.user import UserResponse
 
 router = APIRouter(prefix="/projects", tags=["项目"])
 
 
 @router.post("/", response_model=ProjectResponse, summary="创建项目")
-def create_project(
+async def create_project(
     project: ProjectCreate,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """创建新项目用于分组管理账单"""
-    return create_project_service(db=db, project=project, user_id=current_user.id)
+    result = await run_in_threadpool(
+        create_project_service, db=db, project=project, user_id=current_user.id
+    )
+    # 新项目加入主体上下文的项目集合和项目列表
+    await invalidate_principal_cache(current_user.id)
+    await invalidate_project_cache(current_user.id)
+    return result
 
 
 @router.get("/", response_model=List[ProjectResponse], summary="获取项目列表")
-def get_projects(
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+async def get_projects(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    """获取当前用户的所有项目"""
-    return get_projects_service(db=db, user_id=current_user.id)
+    """获取当前用户的所有项目（含账单数量、收支合计，带缓存）"""
+    body = await get_projects_async(db=db, user_id=current_user.id)
+    return cached_json_response(body)
 
 
 @router.get("/{project_id}", response_model=ProjectWithBills, summary="获取项目详情")
-def get_project(
+async def get_project(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    limit: int = Query(50, ge=1, le=500, description="第一页账单数，最大500"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    获取项目详情 (异步)
+    
+    返回账单数量、收支合计等汇总和第一页账单；has_more 为真时，
+    用 next_cursor 请求 /projects/{project_id}/bills 获取后续页
+    """
+    return await get_project_detail_async(
+        db=db, project_id=project_id, user_id=current_user.id, limit=limit
+    )
+
+
+@router.get("/{project_id}/bills", response_model=PaginatedBillResponse, summary="游标分页获取项目账单")
+async def get_project_bills(
+    project_id: int,
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，首页不传"),
+    limit: int = Query(50, ge=1, le=500, description="每页记录数，最大500"),
+    db: AsyncSession = Depends(get_async_db),
+    principal: PrincipalContext = Depends(get_principal)
 ):
-    """获取项目详情，包含该项目下的所有账单"""
-    return get_project_with_bills(db=db, project_id=project_id, user_id=current_user.id)
+    """
+    游标分页获取项目下的账单 (异步)
+    
+    按日期倒序，翻页时把上一页的 next_cursor 作为 cursor 传入；
+    next_cursor 为空表示没有更多数据。项目归属取自主体上下文，不额外查库
+    """
+    if not principal.owns_project(project_id):
+        raise NotFoundException("项目", project_id)
+    return await get_project_bills_page_async(db=db, project_id=project_id, cursor=cursor, limit=limit)
 
 
 @router.put("/{project_id}", response_model=ProjectResponse, summary="更新项目")
-def update_project(
+async def update_project(
     project_id: int,
     project: ProjectUpdate,
     db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """更新项目信息（重命名等）"""
-    return update_project_service(
+    result = await run_in_threadpool(
+        update_project_service,
         db=db, 
         project_id=project_id, 
         project=project, 
         user_id=current_user.id
     )
+    await invalidate_project_cache(current_user.id)
+    return result
 
 
-@router.delete("/{project_id}", summary="删除项目")
-def delete_project(
+@router.delete("/{project_id}", summary="删除项目", dependencies=[Depends(heavy_route("projects:delete", 8))])
+async def delete_project(
     project_id: int,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    """删除项目（项目下的账单会被一并删除）"""
-    return delete_project_service(db=db, project_id=project_id, user_id=current_user.id)
+    """
+    删除项目（项目下的账单存档到历史记录后一并删除）
+    
+    原项目不再存在，存档的账单需通过 POST /bills/history/{history_id}/restore?project_id=...
+    恢复到其他项目
+    """
+    result = await delete_project_async(db=db, project_id=project_id, user_id=current_user.id)
+    # 项目账单被级联删除，统计缓存（含家庭统计）和项目列表随之失效，项目移出主体上下文
+    await invalidate_user_cache(current_user.id, current_user.family_id)
+    await invalidate_principal_cache(current_user.id)
+    return result
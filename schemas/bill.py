@@ -1,7 +1,7 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 from datetime import datetime
 from typing import Optional
-from utils.constants import BillType, FieldLimits, TimeConstants
+from utils.constants import BatchLimits, BillType, FieldLimits, TimeConstants
 
 
 class BillBase(BaseModel):
@@ -53,6 +53,10 @@ class BillCreate(BillBase):
     pass
 
 
+# 批量创建时整批校验 / 转为字典（一次调用在 pydantic-core 中完成，不逐条构建模型）
+bill_create_list_adapter = TypeAdapter(list[BillCreate])
+
+
 class BillUpdate(BaseModel):
     """更新账单请求模型（所有字段可选）"""
     name: Optional[str] = Field(None, min_length=1, max_length=FieldLimits.BILL_NAME_MAX, description="账单名称")
@@ -118,6 +122,8 @@ class BillListItem(BaseModel):
     bill_type: str
     category: str
     date: datetime
+    note: Optional[str] = None
+    duration_hours: Optional[float] = None
     project_id: Optional[int] = None
     
     model_config = {"from_attributes": True}
@@ -125,15 +131,14 @@ class BillListItem(BaseModel):
 
 class PaginatedBillResponse(BaseModel):
     """
-    分页账单响应
+    分页账单响应（游标分页）
     
-    包含分页信息和数据列表
+    包含数据列表和下一页游标，next_cursor 为空表示已到最后一页
     """
     items: list[BillListItem]
-    total: int
-    page: int
     page_size: int
     has_more: bool
+    next_cursor: Optional[str] = Field(None, description="下一页游标，传给 cursor 参数")
 
 
 class BillHistoryResponse(BaseModel):
@@ -182,8 +187,8 @@ class BillBatchCreate(BaseModel):
     bills: list[BillCreate] = Field(
         ..., 
         min_length=1, 
-        max_length=1000, 
-        description="账单列表，最多1000条"
+        max_length=BatchLimits.CREATE_MAX, 
+        description=f"账单列表，最多{BatchLimits.CREATE_MAX}条"
     )
 
 
@@ -192,12 +197,25 @@ class BillBatchDelete(BaseModel):
     bill_ids: list[int] = Field(
         ..., 
         min_length=1, 
-        max_length=100, 
-        description="账单ID列表，最多100个"
+        max_length=BatchLimits.DELETE_MAX, 
+        description=f"账单ID列表，最多{BatchLimits.DELETE_MAX}个"
     )
 
 
 class BatchOperationResponse(BaseModel):
     """批量操作响应模型"""
     message: str
-    count: int = Field(description="成功操作的记录数")
\ No newline at end of file
+    count: int = Field(description="成功操作的记录数")
+
+
+class BillImportError(BaseModel):
+    """导入失败的行"""
+    line: int = Field(description="所在行号（从 1 开始，含表头）")
+    message: str
+
+
+class BillImportResponse(BaseModel):
+    """账单导入响应模型"""
+    imported: int = Field(description="成功导入的记录数")
+    failed: int = Field(description="校验失败被跳过的记录数")
+    errors: list[BillImportError] = Field(description="失败明细（最多保留 BILL_IMPORT_MAX_ERRORS 条）")
@@ -76,6 +76,14 @@ class FamilyBillResponse(BaseModel):
         from_attributes = True
 
 
+class PaginatedFamilyBillResponse(BaseModel):
+    """家庭账单分页响应（游标分页），next_cursor 为空表示已到最后一页"""
+    items: List[FamilyBillResponse]
+    page_size: int
+    has_more: bool
+    next_cursor: Optional[str] = Field(None, description="下一页游标，传给 cursor 参数")
+
+
 class FamilyStatisticsResponse(BaseModel):
     """家庭统计响应"""
     total_income: float = 0
@@ -1,11 +1,9 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List, TYPE_CHECKING, Any
+from typing import Optional, List
+from schemas.bill import BillListItem
 from utils.constants import FieldLimits
 
-if TYPE_CHECKING:
-    from schemas.bill import BillResponse
-
 
 class ProjectBase(BaseModel):
     """项目基础模型"""
@@ -40,12 +38,22 @@ class ProjectResponse(ProjectBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     bill_count: int = 0  # 项目下的账单数量
+    total_income: float = 0  # 收入合计
+    total_expense: float = 0  # 支出合计
+    last_bill_at: Optional[datetime] = None  # 最新账单日期
     
     model_config = {"from_attributes": True}
 
 
 class ProjectWithBills(ProjectResponse):
-    """包含账单的项目响应"""
-    bills: List[Any] = []  # 使用 Any 避免循环导入
+    """
+    项目详情响应：汇总（计数列）+ 第一页账单
+    
+    bills 只包含第一页，has_more 为真时用 next_cursor 请求 /projects/{id}/bills 获取后续页
+    """
+    bills: List[BillListItem] = []
+    page_size: int = 0
+    has_more: bool = False
+    next_cursor: Optional[str] = Field(None, description="下一页游标，传给 /projects/{id}/bills 的 cursor 参数")
     
     model_config = {"from_attributes": True}
@@ -1,8 +1,9 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import FrozenSet, Optional
 import re
 from utils.constants import FieldLimits
+from utils.timezone_utils import MIN_TZ_OFFSET_MINUTES, MAX_TZ_OFFSET_MINUTES
 
 
 class UserBase(BaseModel):
@@ -26,6 +27,12 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     """用户注册请求模型"""
     password: str = Field(..., min_length=6, description="密码（至少6个字符）")
+    tz_offset_minutes: Optional[int] = Field(
+        None,
+        ge=MIN_TZ_OFFSET_MINUTES,
+        le=MAX_TZ_OFFSET_MINUTES,
+        description="时区（UTC 偏移分钟数，如东八区为 480），不传则使用服务器默认时区"
+    )
     
     @field_validator('password')
     @classmethod
@@ -66,16 +73,76 @@ class UserResponse(UserBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    tz_offset_minutes: Optional[int] = None
     
     model_config = {"from_attributes": True}
 
 
+class UserTimezoneUpdate(BaseModel):
+    """更新用户时区请求模型"""
+    tz_offset_minutes: int = Field(
+        ...,
+        ge=MIN_TZ_OFFSET_MINUTES,
+        le=MAX_TZ_OFFSET_MINUTES,
+        description="UTC 偏移分钟数，如东八区为 480"
+    )
+
+
 class Token(BaseModel):
     """JWT Token 响应模型"""
     access_token: str = Field(..., description="访问令牌")
     token_type: str = Field(default="bearer", description="令牌类型")
+    refresh_token: Optional[str] = Field(default=None, description="刷新令牌（每次刷新后轮换）")
+
+
+class TokenRefresh(BaseModel):
+    """刷新访问令牌请求模型"""
+    refresh_token: str = Field(..., min_length=1, description="刷新令牌")
 
 
 class TokenData(BaseModel):
     """Token 解析后的数据"""
-    username: Optional[str] = None
\ No newline at end of file
+    username: Optional[str] = None
+    user_id: Optional[int] = None
+    family_id: Optional[int] = None
+    tz_offset_minutes: Optional[int] = None
+    epoch: int = 0
+
+
+class CurrentUser(BaseModel):
+    """
+    当前请求的用户身份（完全由已验证的 JWT 声明构建，不查库）
+    
+    需要完整用户资料（邮箱、注册时间等）时使用 GET /auth/me
+    """
+    id: int
+    username: str
+    family_id: Optional[int] = None
+    tz_offset_minutes: Optional[int] = None
+    token_epoch: int = 0
+
+
+class PrincipalContext(BaseModel):
+    """
+    请求主体上下文：家庭成员关系和拥有的项目
+    
+    每个用户加载一次并按代数缓存（见 routers.auth.get_principal），
+    项目归属校验、家庭成员判断都是内存中的集合操作
+    """
+    user_id: int
+    family_id: Optional[int] = None
+    family_creator_id: Optional[int] = None
+    member_ids: FrozenSet[int] = frozenset()
+    project_ids: FrozenSet[int] = frozenset()
+    
+    @property
+    def is_creator(self) -> bool:
+        """是否为所在家庭的创建者"""
+        return self.family_id is not None and self.family_creator_id == self.user_id
+    
+    def owns_project(self, project_id: int) -> bool:
+        return project_id in self.project_ids
+    
+    def is_member(self, user_id: int) -> bool:
+        """是否为同一家庭的成员（含自己）"""
+        return user_id in self.member_ids
@@ -8,28 +8,63 @@
 - 统计数据缓存
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, extract, select, delete
+from sqlalchemy import func, select, insert
 from models.bill import Bill, BillHistory
-from schemas.bill import BillCreate, BillUpdate, BillStatistics, CategoryStatistics, NameStatistics
-from datetime import datetime, timedelta
-from typing import List, Optional
+from models.rollup import BillDailyRollup, apply_bill_changes, load_user_timezones
+from schemas.bill import (
+    BillCreate, BillUpdate, BillStatistics, CategoryStatistics, NameStatistics, bill_create_list_adapter
+)
+from typing import AbstractSet, List, Optional, Set
 from utils.exceptions import NotFoundException, AppException
-from utils.constants import BillType, OperationType, Pagination
+from utils.constants import BatchLimits, BillType, OperationType, Pagination
+from config import settings
+from db.async_database import run_in_new_session
+from services.bill_archive import archive_and_delete_bills
 from utils.cache import (
-    cache_get, cache_set, CacheKeys, invalidate_user_cache
+    CacheKeys, invalidate_user_cache, cache_get_or_compute_scoped
+)
+from utils.timezone_utils import (
+    ensure_utc, get_user_timezone, resolve_local_period, local_dates_to_utc_range
 )
-from utils.timezone_utils import ensure_utc
-import json
+from utils.pagination import encode_cursor, keyset_before
 import re
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-async def create_bill_async(db: AsyncSession, bill: BillCreate, user_id: int) -> Bill:
-    """异步创建新账单"""
-    from models.project import Project
+async def _owned_project_ids(
+    db: AsyncSession,
+    user_id: int,
+    project_ids: Set[int],
+    owned_project_ids: Optional[AbstractSet[int]] = None
+) -> Set[int]:
+    """
+    筛选出属于当前用户的项目ID
     
+    传入主体上下文中的 owned_project_ids 时是内存中的集合运算，否则查库
+    """
+    if owned_project_ids is not None:
+        return project_ids & owned_project_ids
+    from models.project import Project
+    result = await db.execute(
+        select(Project.id).where(
+            Project.id.in_(project_ids),
+            Project.user_id == user_id
+        )
+    )
+    return set(result.scalars().all())
+
+
+async def create_bill_async(
+    db: AsyncSession,
+    bill: BillCreate,
+    user_id: int,
+    family_id: Optional[int] = None,
+    owned_project_ids: Optional[AbstractSet[int]] = None
+) -> Bill:
+    """异步创建新账单"""
     bill_data = bill.dict()
     if 'date' in bill_data:
         bill_data['date'] = ensure_utc(bill_data['date'])
@@ -42,13 +77,7 @@ async def create_bill_async(db: AsyncSession, bill: BillCreate, user_id: int) ->
             error_code="PROJECT_ID_REQUIRED"
         )
     
-    project = await db.execute(
-        select(Project).where(
-            Project.id == project_id,
-            Project.user_id == user_id
-        )
-    )
-    if not project.scalar_one_or_none():
+    if not await _owned_project_ids(db, user_id, {project_id}, owned_project_ids):
         raise NotFoundException("项目", project_id)
     
     db_bill = Bill(**bill_data, user_id=user_id)
@@ -57,7 +86,7 @@ async def create_bill_async(db: AsyncSession, bill: BillCreate, user_id: int) ->
     await db.refresh(db_bill)
     
     # 清除用户统计缓存
-    await invalidate_user_cache(user_id)
+    await invalidate_user_cache(user_id, family_id)
     
     return db_bill
 
@@ -65,89 +94,161 @@ async def create_bill_async(db: AsyncSession, bill: BillCreate, user_id: int) ->
 async def create_bills_batch_async(
     db: AsyncSession, 
     bills: List[BillCreate], 
-    user_id: int
+    user_id: int,
+    family_id: Optional[int] = None,
+    owned_project_ids: Optional[AbstractSet[int]] = None,
+    chunk_size: Optional[int] = None
 ) -> List[Bill]:
     """
     批量创建账单（优化性能）
     
-    一次性插入多条账单，比逐条插入效率高很多
-    """
-    from models.project import Project
+    - 整批一次转为字典（TypeAdapter），不逐条构建 ORM 对象
+    - 每批一条 `INSERT ... RETURNING`（asyncpg / aiosqlite 走 insertmanyvalues），
+      返回的账单已包含 id、created_at，提交后无需逐条 refresh
+    - 超过 chunk_size 时分批，每批一个事务；项目归属在写入前整体校验
     
+    注意：分批提交不是整体原子的。某一批写入失败时，之前的批次已经提交并保留
+    （缓存照常失效），异常继续抛出；调用方收到错误时可能已有部分账单写入
+    """
     if not bills:
         return []
     
-    if len(bills) > 1000:
+    if len(bills) > BatchLimits.CREATE_MAX:
         raise AppException(
-            message="批量插入最多支持 1000 条记录",
+            message=f"批量插入最多支持 {BatchLimits.CREATE_MAX} 条记录",
             error_code="BATCH_SIZE_EXCEEDED"
         )
     
-    # 收集所有项目ID并验证是否为空
-    project_ids = set()
-    for bill in bills:
-        if not bill.project_id:
-            raise AppException(
-                message="项目ID是必填字段",
-                error_code="PROJECT_ID_REQUIRED"
-            )
-        project_ids.add(bill.project_id)
+    rows = bill_create_list_adapter.dump_python(bills)
     
-    # 批量查询用户的项目
-    result = await db.execute(
-        select(Project.id).where(
-            Project.id.in_(project_ids),
-            Project.user_id == user_id
+    # 收集所有项目ID并验证是否为空
+    project_ids = {row["project_id"] for row in rows}
+    if not all(project_ids):
+        raise AppException(
+            message="项目ID是必填字段",
+            error_code="PROJECT_ID_REQUIRED"
         )
-    )
-    valid_project_ids = {row[0] for row in result.fetchall()}
+    
+    # 校验项目归属
+    valid_project_ids = await _owned_project_ids(db, user_id, project_ids, owned_project_ids)
     
     # 检查是否有无效的项目ID
     invalid_ids = project_ids - valid_project_ids
     if invalid_ids:
         raise NotFoundException("项目", list(invalid_ids)[0])
     
-    db_bills = []
-    for bill in bills:
-        bill_data = bill.dict()
-        if 'date' in bill_data:
-            bill_data['date'] = ensure_utc(bill_data['date'])
-        db_bills.append(Bill(**bill_data, user_id=user_id))
-    
-    # 批量添加
-    db.add_all(db_bills)
-    await db.commit()
-    
-    # 刷新获取 ID
-    for bill in db_bills:
-        await db.refresh(bill)
-    
-    # 清除用户统计缓存
-    await invalidate_user_cache(user_id)
+    for row in rows:
+        row["date"] = ensure_utc(row["date"])
+        row["user_id"] = user_id
+    
+    chunk_size = chunk_size or settings.BILL_BATCH_CHUNK_SIZE
+    connection = await db.connection()
+    timezones = await connection.run_sync(load_user_timezones, [user_id])
+    
+    created: List[Bill] = []
+    try:
+        for start in range(0, len(rows), chunk_size):
+            result = await db.scalars(insert(Bill).returning(Bill), rows[start:start + chunk_size])
+            chunk = result.all()
+            # 批量语句不经过 ORM flush，需显式同步日汇总和项目计数
+            connection = await db.connection()
+            await connection.run_sync(apply_bill_changes, added=chunk, timezones=timezones)
+            await db.commit()
+            created.extend(chunk)
+    except Exception:
+        if created:
+            logger.error(f"批量创建中途失败，已提交 {len(created)}/{len(rows)} 条账单，用户: {user_id}")
+        raise
+    finally:
+        # 已提交的批次同样需要清除用户统计缓存（中途失败时也一样）
+        if created:
+            await invalidate_user_cache(user_id, family_id)
+    
+    logger.info(f"批量创建 {len(created)} 条账单，用户: {user_id}")
+    return created
+
+
+def _period_key(
+    month: Optional[str] = None,
+    date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None
+) -> str:
+    """确定统计查询范围标识（用于缓存 key 和响应中的 month 字段）"""
+    if start_date and end_date:
+        return f"{start_date}~{end_date}"
+    if start_month and end_month:
+        return f"{start_month}~{end_month}"
+    if date:
+        return date
+    if month:
+        return month
+    return "all"
+
+
+def _date_range_filters(
+    tz_offset_minutes: Optional[int] = None,
+    month: Optional[str] = None,
+    date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None
+) -> list:
+    """
+    构建按用户本地时区计算的日期范围条件
     
-    logger.info(f"批量创建 {len(db_bills)} 条账单，用户: {user_id}")
-    return db_bills
+    转换为 UTC 半开区间 `date >= start AND date < end`，
+    不对 Bill.date 做函数运算，可以走 idx_user_date_id / idx_user_date_type 范围扫描。
+    """
+    period = resolve_local_period(
+        month=month, day=date,
+        start_date=start_date, end_date=end_date,
+        start_month=start_month, end_month=end_month
+    )
+    if period is None:
+        return []
+    start, end = local_dates_to_utc_range(*period, tz=get_user_timezone(tz_offset_minutes))
+    return [Bill.date >= start, Bill.date < end]
 
 
-async def get_bills_by_user_async(
-    db: AsyncSession, 
-    user_id: int, 
-    skip: int = 0, 
-    limit: int = 100,
+def _rollup_filters(
+    user_id: int,
+    project_id: Optional[int] = None,
     month: Optional[str] = None,
-    bill_type: Optional[str] = None,
-    worker: Optional[str] = None,
-    category: Optional[str] = None,
-    project_id: Optional[int] = None
-) -> List[Bill]:
-    """异步获取用户账单列表，支持多条件筛选（包括项目筛选）"""
-    # 输入验证
-    if skip < 0 or limit < Pagination.MIN_LIMIT or limit > Pagination.MAX_LIMIT:
-        raise AppException(
-            message="无效的分页参数",
-            error_code="INVALID_PAGINATION"
-        )
+    date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None
+) -> list:
+    """
+    构建日汇总表查询条件
     
+    汇总行的 local_date 已按用户时区划分，日期范围直接比较即可
+    """
+    filters = [BillDailyRollup.user_id == user_id]
+    period = resolve_local_period(
+        month=month, day=date,
+        start_date=start_date, end_date=end_date,
+        start_month=start_month, end_month=end_month
+    )
+    if period is not None:
+        start, end = period
+        filters.append(BillDailyRollup.local_date >= start)
+        filters.append(BillDailyRollup.local_date < end)
+    if project_id:
+        filters.append(BillDailyRollup.project_id == project_id)
+    return filters
+
+
+def _validate_bill_filters(
+    month: Optional[str] = None,
+    bill_type: Optional[str] = None
+) -> None:
+    """校验账单列表筛选参数"""
     if month and not re.match(r'^\d{4}-\d{2}$', month):
         raise AppException(
             message="月份格式必须为 YYYY-MM",
@@ -159,37 +260,135 @@ async def get_bills_by_user_async(
             message=f"账单类型只能是 {' 或 '.join(BillType.values())}",
             error_code="INVALID_BILL_TYPE"
         )
-    
-    # 构建查询
-    query = select(Bill).where(Bill.user_id == user_id)
+
+
+def _build_bill_filters(
+    user_id: int,
+    month: Optional[str] = None,
+    bill_type: Optional[str] = None,
+    worker: Optional[str] = None,
+    category: Optional[str] = None,
+    project_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> list:
+    """构建账单列表查询条件（列表查询和游标分页共用）"""
+    filters = [Bill.user_id == user_id]
     
     if month:
-        year, month_num = map(int, month.split('-'))
-        query = query.where(
-            extract('year', Bill.date) == year,
-            extract('month', Bill.date) == month_num
-        )
+        filters.extend(_date_range_filters(tz_offset_minutes, month=month))
     
     if bill_type:
-        query = query.where(Bill.bill_type == bill_type)
+        filters.append(Bill.bill_type == bill_type)
     
     if worker:
         worker_safe = worker.strip()
-        query = query.where(Bill.name.ilike(f"%{worker_safe}%"))
+        filters.append(Bill.name.ilike(f"%{worker_safe}%"))
     
     if category:
         category_safe = category.strip()
-        query = query.where(Bill.category.ilike(f"%{category_safe}%"))
+        filters.append(Bill.category.ilike(f"%{category_safe}%"))
     
     if project_id:
-        query = query.where(Bill.project_id == project_id)
+        filters.append(Bill.project_id == project_id)
     
+    return filters
+
+
+async def get_bills_by_user_async(
+    db: AsyncSession, 
+    user_id: int, 
+    skip: int = 0, 
+    limit: int = 100,
+    month: Optional[str] = None,
+    bill_type: Optional[str] = None,
+    worker: Optional[str] = None,
+    category: Optional[str] = None,
+    project_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> List[Bill]:
+    """异步获取用户账单列表，支持多条件筛选（包括项目筛选）"""
+    # 输入验证
+    if skip < 0 or limit < Pagination.MIN_LIMIT or limit > Pagination.MAX_LIMIT:
+        raise AppException(
+            message="无效的分页参数",
+            error_code="INVALID_PAGINATION"
+        )
+    
+    _validate_bill_filters(month=month, bill_type=bill_type)
+    
+    # 构建查询
+    filters = _build_bill_filters(
+        user_id, month=month, bill_type=bill_type,
+        worker=worker, category=category, project_id=project_id,
+        tz_offset_minutes=tz_offset_minutes
+    )
+    query = select(Bill).where(*filters)
     query = query.order_by(Bill.date.desc()).offset(skip).limit(limit)
     
     result = await db.execute(query)
     return result.scalars().all()
 
 
+async def get_bills_page_async(
+    db: AsyncSession,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Pagination.DEFAULT_LIMIT,
+    month: Optional[str] = None,
+    bill_type: Optional[str] = None,
+    worker: Optional[str] = None,
+    category: Optional[str] = None,
+    project_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> dict:
+    """
+    游标分页获取账单列表
+    
+    按 (date DESC, id DESC) 排序，通过 (date, id) 游标直接定位到
+    idx_user_date_id 索引位置，每页开销与页码无关。
+    
+    Returns:
+        {"items", "page_size", "has_more", "next_cursor"}，可直接构造 PaginatedBillResponse
+    """
+    if limit < Pagination.MIN_LIMIT or limit > Pagination.MAX_LIMIT:
+        raise AppException(
+            message="无效的分页参数",
+            error_code="INVALID_PAGINATION"
+        )
+    
+    _validate_bill_filters(month=month, bill_type=bill_type)
+    
+    filters = _build_bill_filters(
+        user_id, month=month, bill_type=bill_type,
+        worker=worker, category=category, project_id=project_id,
+        tz_offset_minutes=tz_offset_minutes
+    )
+    seek = keyset_before(Bill.date, Bill.id, cursor)
+    if seek is not None:
+        filters.append(seek)
+    
+    # 多取一条用于判断是否还有下一页
+    query = (
+        select(Bill)
+        .where(*filters)
+        .order_by(Bill.date.desc(), Bill.id.desc())
+        .limit(limit + 1)
+    )
+    result = await db.execute(query)
+    bills = result.scalars().all()
+    
+    has_more = len(bills) > limit
+    items = bills[:limit]
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if has_more else None
+    
+    return {
+        "items": items,
+        "page_size": limit,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }
+
+
 async def get_bill_by_id_async(db: AsyncSession, bill_id: int, user_id: int) -> Bill:
     """异步根据ID获取单个账单"""
     query = select(Bill).where(Bill.id == bill_id, Bill.user_id == user_id)
@@ -205,23 +404,17 @@ async def update_bill_async(
     db: AsyncSession, 
     bill_id: int, 
     bill: BillUpdate, 
-    user_id: int
+    user_id: int,
+    family_id: Optional[int] = None,
+    owned_project_ids: Optional[AbstractSet[int]] = None
 ) -> Bill:
     """异步更新账单（并在更新前自动存档旧版本）"""
-    from models.project import Project
-    
     db_bill = await get_bill_by_id_async(db, bill_id, user_id)
     
     # 验证项目ID（如果提供）是否属于当前用户
     update_data = bill.dict(exclude_unset=True)
     if 'project_id' in update_data and update_data['project_id'] is not None:
-        project = await db.execute(
-            select(Project).where(
-                Project.id == update_data['project_id'],
-                Project.user_id == user_id
-            )
-        )
-        if not project.scalar_one_or_none():
+        if not await _owned_project_ids(db, user_id, {update_data['project_id']}, owned_project_ids):
             raise NotFoundException("项目", update_data['project_id'])
     
     # 1. 创建历史快照
@@ -252,12 +445,14 @@ async def update_bill_async(
     await db.refresh(db_bill)
     
     # 清除用户统计缓存
-    await invalidate_user_cache(user_id)
+    await invalidate_user_cache(user_id, family_id)
     
     return db_bill
 
 
-async def delete_bill_async(db: AsyncSession, bill_id: int, user_id: int) -> dict:
+async def delete_bill_async(
+    db: AsyncSession, bill_id: int, user_id: int, family_id: Optional[int] = None
+) -> dict:
     """异步删除账单（并在删除前自动存档）"""
     db_bill = await get_bill_by_id_async(db, bill_id, user_id)
     
@@ -284,70 +479,47 @@ async def delete_bill_async(db: AsyncSession, bill_id: int, user_id: int) -> dic
     await db.commit()
     
     # 清除用户统计缓存
-    await invalidate_user_cache(user_id)
+    await invalidate_user_cache(user_id, family_id)
     
     return {"message": "账单删除成功"}
 
 
+# 删除存档写入历史记录的列：bill_id、operation_type 之后的列与账单表同名
 async def delete_bills_batch_async(
     db: AsyncSession, 
     bill_ids: List[int], 
-    user_id: int
+    user_id: int,
+    family_id: Optional[int] = None
 ) -> dict:
     """
-    批量删除账单
+    批量删除账单（删除前存档到历史记录）
     
-    先创建历史记录，再批量删除
+    不把账单加载进会话，也不逐条构建历史对象：一个事务内集合存档、删除
+    （见 services.bill_archive.archive_and_delete_bills），按返回的行同步日汇总和项目计数
     """
     if not bill_ids:
         return {"message": "无账单需要删除", "deleted_count": 0}
     
-    if len(bill_ids) > 100:
+    if len(bill_ids) > BatchLimits.DELETE_MAX:
         raise AppException(
-            message="批量删除最多支持 100 条记录",
+            message=f"批量删除最多支持 {BatchLimits.DELETE_MAX} 条记录",
             error_code="BATCH_SIZE_EXCEEDED"
         )
     
-    # 查询要删除的账单
-    query = select(Bill).where(Bill.id.in_(bill_ids), Bill.user_id == user_id)
-    result = await db.execute(query)
-    bills = result.scalars().all()
-    
-    if not bills:
+    rows = await archive_and_delete_bills(db, Bill.id.in_(set(bill_ids)), Bill.user_id == user_id)
+    if not rows:
         raise NotFoundException("账单", bill_ids)
     
-    # 创建历史快照
-    for bill in bills:
-        history = BillHistory(
-            bill_id=bill.id,
-            operation_type=OperationType.DELETE.value,
-            amount=bill.amount,
-            bill_type=bill.bill_type,
-            category=bill.category,
-            date=bill.date,
-            note=bill.note,
-            name=bill.name,
-            duration_hours=bill.duration_hours,
-            hourly_rate=bill.hourly_rate,
-            pay_method=bill.pay_method,
-            user_id=bill.user_id,
-            project_id=bill.project_id
-        )
-        db.add(history)
-    
-    # 批量删除
-    delete_query = delete(Bill).where(
-        Bill.id.in_([b.id for b in bills]),
-        Bill.user_id == user_id
-    )
-    await db.execute(delete_query)
+    # Core 语句不经过 ORM flush，需显式同步日汇总和项目计数
+    connection = await db.connection()
+    await connection.run_sync(apply_bill_changes, removed=rows)
     await db.commit()
     
     # 清除用户统计缓存
-    await invalidate_user_cache(user_id)
+    await invalidate_user_cache(user_id, family_id)
     
-    logger.info(f"批量删除 {len(bills)} 条账单，用户: {user_id}")
-    return {"message": "账单批量删除成功", "deleted_count": len(bills)}
+    logger.info(f"批量删除 {len(rows)} 条账单，用户: {user_id}")
+    return {"message": "账单批量删除成功", "deleted_count": len(rows)}
 
 
 async def get_monthly_statistics_async(
@@ -359,164 +531,119 @@ async def get_monthly_statistics_async(
     end_date: Optional[str] = None,
     start_month: Optional[str] = None,
     end_month: Optional[str] = None,
-    project_id: Optional[int] = None
-) -> BillStatistics:
+    project_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> bytes:
     """
     异步获取收支统计（带缓存）
     支持：单日、单月、日期范围、月份范围查询
+    日期按用户本地时区划分
     
     缓存时间：5 分钟
+    
+    Returns:
+        BillStatistics 的 JSON 响应体（缓存保存的就是最终字节，命中时无需再序列化）
     """
     # 确定查询范围标识
-    if start_date and end_date:
-        period_key = f"{start_date}~{end_date}"
-    elif start_month and end_month:
-        period_key = f"{start_month}~{end_month}"
-    elif date:
-        period_key = date
-    elif month:
-        period_key = month
-    else:
-        period_key = "all"
-    
-    # 检查缓存
-    base_key = CacheKeys.bill_stats_key(user_id, period_key)
-    cache_key = f"{base_key}:{project_id}" if project_id else base_key
-    
-    cached = await cache_get(cache_key)
-    if cached:
-        try:
-            data = json.loads(cached)
-            return BillStatistics(**data)
-        except (json.JSONDecodeError, TypeError):
-            pass
-    
-    # 基础查询条件
-    base_filters = [Bill.user_id == user_id]
-    
-    if start_date and end_date:
-        # 日期范围查询
-        start = datetime.strptime(start_date, '%Y-%m-%d').date()
-        end = datetime.strptime(end_date, '%Y-%m-%d').date()
-        base_filters.append(func.date(Bill.date) >= start)
-        base_filters.append(func.date(Bill.date) <= end)
-    elif start_month and end_month:
-        # 月份范围查询
-        start_year, start_mon = map(int, start_month.split('-'))
-        end_year, end_mon = map(int, end_month.split('-'))
-        start = datetime(start_year, start_mon, 1).date()
-        # 计算结束月份的最后一天
-        if end_mon == 12:
-            end = datetime(end_year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            end = datetime(end_year, end_mon + 1, 1).date() - timedelta(days=1)
-        base_filters.append(func.date(Bill.date) >= start)
-        base_filters.append(func.date(Bill.date) <= end)
-    elif date:
-        # 单日查询
-        query_date = datetime.strptime(date, '%Y-%m-%d').date()
-        base_filters.append(func.date(Bill.date) == query_date)
-    elif month:
-        # 单月查询
-        year, month_num = map(int, month.split('-'))
-        base_filters.append(extract('year', Bill.date) == year)
-        base_filters.append(extract('month', Bill.date) == month_num)
-    
-    if project_id:
-        base_filters.append(Bill.project_id == project_id)
-    
-    # 收入统计
-    income_query = select(func.coalesce(func.sum(Bill.amount), 0)).where(
-        *base_filters,
-        Bill.bill_type == BillType.INCOME.value
+    period_key = _period_key(
+        month=month, date=date,
+        start_date=start_date, end_date=end_date,
+        start_month=start_month, end_month=end_month
     )
-    income_result = await db.execute(income_query)
-    income = income_result.scalar()
     
-    # 支出统计
-    expense_query = select(func.coalesce(func.sum(Bill.amount), 0)).where(
-        *base_filters,
-        Bill.bill_type == BillType.EXPENSE.value
-    )
-    expense_result = await db.execute(expense_query)
-    expense = expense_result.scalar()
-    
-    stats = BillStatistics(
-        month=period_key,
-        total_income=float(income),
-        total_expense=float(expense),
-        net_amount=float(income - expense)
+    # 缓存 key（时区不同则统计结果不同，纳入 key）
+    def cache_key(gen: Optional[int]) -> str:
+        base_key = CacheKeys.bill_stats_key(user_id, f"{period_key}@{tz_offset_minutes}", gen)
+        return f"{base_key}:{project_id}" if project_id else base_key
+    
+    async def compute(session: AsyncSession) -> bytes:
+        # 从日汇总表读取（按类型分组，一次查询得到收入和支出）
+        query = select(
+            BillDailyRollup.bill_type,
+            func.sum(BillDailyRollup.total_amount).label('total_amount')
+        ).where(
+            *_rollup_filters(
+                user_id, project_id=project_id,
+                month=month, date=date,
+                start_date=start_date, end_date=end_date,
+                start_month=start_month, end_month=end_month
+            )
+        ).group_by(BillDailyRollup.bill_type)
+        result = await session.execute(query)
+        totals = {r.bill_type: float(r.total_amount or 0) for r in result.all()}
+        income = totals.get(BillType.INCOME.value, 0.0)
+        expense = totals.get(BillType.EXPENSE.value, 0.0)
+        
+        stats = BillStatistics(
+            month=period_key,
+            total_income=float(income),
+            total_expense=float(expense),
+            net_amount=float(income - expense)
+        )
+        return orjson.dumps(stats.dict())
+    
+    # 未命中时合并并发请求，只执行一次聚合（缓存 5 分钟）；
+    # 启用 stale-while-revalidate 时写入后先返回旧值，后台用新会话重算
+    return await cache_get_or_compute_scoped(
+        CacheKeys.SCOPE_USER, user_id, cache_key,
+        compute=lambda: compute(db),
+        refresh=lambda: run_in_new_session(db, compute),
+        ttl=300,
     )
-    
-    # 写入缓存（5分钟）
-    await cache_set(cache_key, json.dumps(stats.dict()), ttl=300)
-    
-    return stats
 
 
 async def get_category_statistics_async(
     db: AsyncSession, 
     user_id: int, 
     month: Optional[str] = None,
-    project_id: Optional[int] = None
-) -> List[CategoryStatistics]:
+    project_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> bytes:
     """
     异步获取分类统计（带缓存）
     
     缓存时间：5 分钟
-    """
-    # 检查缓存
-    base_key = CacheKeys.category_stats_key(user_id, month)
-    cache_key = f"{base_key}:{project_id}" if project_id else base_key
-    
-    cached = await cache_get(cache_key)
-    if cached:
-        try:
-            data = json.loads(cached)
-            return [CategoryStatistics(**item) for item in data]
-        except (json.JSONDecodeError, TypeError):
-            pass
-    
-    query = select(
-        Bill.category,
-        func.sum(Bill.amount).label('total_amount')
-    ).where(Bill.user_id == user_id)
     
-    if month:
-        year, month_num = map(int, month.split('-'))
-        query = query.where(
-            extract('year', Bill.date) == year,
-            extract('month', Bill.date) == month_num
-        )
-    
-    if project_id:
-        query = query.where(Bill.project_id == project_id)
-    
-    query = query.group_by(Bill.category)
-    result = await db.execute(query)
-    results = result.all()
-    
-    total_amount = sum(float(r.total_amount) for r in results)
-    
-    category_stats = []
-    for r in results:
-        percentage = (float(r.total_amount) / total_amount * 100) if total_amount > 0 else 0
-        category_stats.append(CategoryStatistics(
-            category=r.category,
-            amount=float(r.total_amount),
-            percentage=round(percentage, 2)
-        ))
-    
-    sorted_stats = sorted(category_stats, key=lambda x: x.amount, reverse=True)
-    
-    # 写入缓存（5分钟）
-    await cache_set(
-        cache_key, 
-        json.dumps([s.dict() for s in sorted_stats]),
-        ttl=300
+    Returns:
+        List[CategoryStatistics] 的 JSON 响应体
+    """
+    # 缓存 key（用户代数变化即账单有变更）
+    def cache_key(gen: Optional[int]) -> str:
+        base_key = CacheKeys.category_stats_key(user_id, f"{month or 'all'}@{tz_offset_minutes}", gen)
+        return f"{base_key}:{project_id}" if project_id else base_key
+    
+    async def compute(session: AsyncSession) -> bytes:
+        query = select(
+            BillDailyRollup.category,
+            func.sum(BillDailyRollup.total_amount).label('total_amount')
+        ).where(
+            *_rollup_filters(user_id, project_id=project_id, month=month)
+        ).group_by(BillDailyRollup.category)
+        result = await session.execute(query)
+        results = result.all()
+        
+        total_amount = sum(float(r.total_amount) for r in results)
+        
+        category_stats = []
+        for r in results:
+            percentage = (float(r.total_amount) / total_amount * 100) if total_amount > 0 else 0
+            category_stats.append(CategoryStatistics(
+                category=r.category,
+                amount=float(r.total_amount),
+                percentage=round(percentage, 2)
+            ))
+        
+        sorted_stats = sorted(category_stats, key=lambda x: x.amount, reverse=True)
+        return orjson.dumps([s.dict() for s in sorted_stats])
+    
+    # 未命中时合并并发请求，只执行一次聚合（缓存 5 分钟）；
+    # 启用 stale-while-revalidate 时写入后先返回旧值，后台用新会话重算
+    return await cache_get_or_compute_scoped(
+        CacheKeys.SCOPE_USER, user_id, cache_key,
+        compute=lambda: compute(db),
+        refresh=lambda: run_in_new_session(db, compute),
+        ttl=300,
     )
-    
-    return sorted_stats
 
 
 async def get_name_statistics_async(
@@ -528,104 +655,69 @@ async def get_name_statistics_async(
     end_date: Optional[str] = None,
     start_month: Optional[str] = None,
     end_month: Optional[str] = None,
-    project_id: Optional[int] = None
-) -> List[NameStatistics]:
+    project_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> bytes:
     """
     异步获取名称统计（带缓存）
     支持：单日、单月、日期范围、月份范围查询
+    日期按用户本地时区划分
     
     缓存时间：5 分钟
+    
+    Returns:
+        List[NameStatistics] 的 JSON 响应体
     """
     # 确定查询范围标识
-    if start_date and end_date:
-        period_key = f"{start_date}~{end_date}"
-    elif start_month and end_month:
-        period_key = f"{start_month}~{end_month}"
-    elif date:
-        period_key = date
-    elif month:
-        period_key = month
-    else:
-        period_key = "all"
-    
-    # 检查缓存
-    base_key = CacheKeys.name_stats_key(user_id, period_key)
-    cache_key = f"{base_key}:{project_id}" if project_id else base_key
-    
-    cached = await cache_get(cache_key)
-    if cached:
-        try:
-            data = json.loads(cached)
-            return [NameStatistics(**item) for item in data]
-        except (json.JSONDecodeError, TypeError):
-            pass
-    
-    query = select(
-        Bill.name,
-        func.sum(Bill.duration_hours).label('total_hours'),
-        func.sum(Bill.amount).label('total_amount'),
-        func.count(Bill.id).label('bill_count')
-    ).where(
-        Bill.user_id == user_id,
-        Bill.name.isnot(None),
-        Bill.name != ''
+    period_key = _period_key(
+        month=month, date=date,
+        start_date=start_date, end_date=end_date,
+        start_month=start_month, end_month=end_month
     )
     
-    if start_date and end_date:
-        # 日期范围查询
-        start = datetime.strptime(start_date, '%Y-%m-%d').date()
-        end = datetime.strptime(end_date, '%Y-%m-%d').date()
-        query = query.where(func.date(Bill.date) >= start)
-        query = query.where(func.date(Bill.date) <= end)
-    elif start_month and end_month:
-        # 月份范围查询
-        start_year, start_mon = map(int, start_month.split('-'))
-        end_year, end_mon = map(int, end_month.split('-'))
-        start = datetime(start_year, start_mon, 1).date()
-        if end_mon == 12:
-            end = datetime(end_year + 1, 1, 1).date() - timedelta(days=1)
-        else:
-            end = datetime(end_year, end_mon + 1, 1).date() - timedelta(days=1)
-        query = query.where(func.date(Bill.date) >= start)
-        query = query.where(func.date(Bill.date) <= end)
-    elif date:
-        # 单日查询
-        query_date = datetime.strptime(date, '%Y-%m-%d').date()
-        query = query.where(func.date(Bill.date) == query_date)
-    elif month:
-        # 单月查询
-        year, month_num = map(int, month.split('-'))
-        query = query.where(
-            extract('year', Bill.date) == year,
-            extract('month', Bill.date) == month_num
-        )
-    
-    if project_id:
-        query = query.where(Bill.project_id == project_id)
-    
-    query = query.group_by(Bill.name)
-    result = await db.execute(query)
-    results = result.all()
-    
-    name_stats = []
-    for r in results:
-        name_stats.append(NameStatistics(
-            name=r.name,
-            total_hours=float(r.total_hours or 0),
-            total_amount=float(r.total_amount or 0),
-            bill_count=r.bill_count
-        ))
-    
-    sorted_stats = sorted(name_stats, key=lambda x: x.total_amount, reverse=True)
-    
-    # 写入缓存（5分钟）
-    await cache_set(
-        cache_key,
-        json.dumps([s.dict() for s in sorted_stats]),
-        ttl=300
+    # 缓存 key（用户代数变化即账单有变更）
+    def cache_key(gen: Optional[int]) -> str:
+        base_key = CacheKeys.name_stats_key(user_id, f"{period_key}@{tz_offset_minutes}", gen)
+        return f"{base_key}:{project_id}" if project_id else base_key
+    
+    async def compute(session: AsyncSession) -> bytes:
+        query = select(
+            BillDailyRollup.name,
+            func.sum(BillDailyRollup.total_hours).label('total_hours'),
+            func.sum(BillDailyRollup.total_amount).label('total_amount'),
+            func.sum(BillDailyRollup.bill_count).label('bill_count')
+        ).where(
+            BillDailyRollup.name != '',
+            *_rollup_filters(
+                user_id, project_id=project_id,
+                month=month, date=date,
+                start_date=start_date, end_date=end_date,
+                start_month=start_month, end_month=end_month
+            )
+        ).group_by(BillDailyRollup.name)
+        result = await session.execute(query)
+        results = result.all()
+        
+        name_stats = []
+        for r in results:
+            name_stats.append(NameStatistics(
+                name=r.name,
+                total_hours=float(r.total_hours or 0),
+                total_amount=float(r.total_amount or 0),
+                bill_count=int(r.bill_count or 0)
+            ))
+        
+        sorted_stats = sorted(name_stats, key=lambda x: x.total_amount, reverse=True)
+        return orjson.dumps([s.dict() for s in sorted_stats])
+    
+    # 未命中时合并并发请求，只执行一次聚合（缓存 5 分钟）；
+    # 启用 stale-while-revalidate 时写入后先返回旧值，后台用新会话重算
+    return await cache_get_or_compute_scoped(
+        CacheKeys.SCOPE_USER, user_id, cache_key,
+        compute=lambda: compute(db),
+        refresh=lambda: run_in_new_session(db, compute),
+        ttl=300,
     )
-    
-    return sorted_stats
 
 
 async def get_bill_history_async(
@@ -646,15 +738,21 @@ async def get_bill_history_async(
 async def export_bills_to_csv_async(
     db: AsyncSession, 
     user_id: int, 
-    month: Optional[str] = None
+    month: Optional[str] = None,
+    tz_offset_minutes: Optional[int] = None
 ) -> str:
     """异步导出账单为 CSV 格式字符串"""
     import csv
     import io
     
-    bills = await get_bills_by_user_async(
-        db, user_id, skip=0, limit=10000, month=month
-    )
+    _validate_bill_filters(month=month)
+    
+    # 导出上限 10000 条，不受列表接口分页上限约束
+    query = select(Bill).where(
+        *_build_bill_filters(user_id, month=month, tz_offset_minutes=tz_offset_minutes)
+    ).order_by(Bill.date.desc()).limit(10000)
+    result = await db.execute(query)
+    bills = result.scalars().all()
     
     output = io.StringIO()
     writer = csv.writer(output)
@@ -682,9 +780,17 @@ async def export_bills_to_csv_async(
 async def restore_bill_version_async(
     db: AsyncSession, 
     history_id: int, 
-    user_id: int
+    user_id: int,
+    family_id: Optional[int] = None,
+    owned_project_ids: Optional[AbstractSet[int]] = None,
+    target_project_id: Optional[int] = None
 ) -> Bill:
-    """异步回滚到指定历史版本"""
+    """
+    异步回滚到指定历史版本
+    
+    账单仍存在时覆盖更新；账单已删除时按历史版本重新创建，默认恢复到原项目。
+    原项目已删除（或旧历史记录没有项目信息）时需通过 target_project_id 指定恢复到的项目
+    """
     # 查询历史记录
     history_query = select(BillHistory).where(
         BillHistory.id == history_id,
@@ -703,18 +809,29 @@ async def restore_bill_version_async(
     
     if not bill:
         # 账单已删除，尝试恢复
-        if not history.project_id:
-            # 旧历史记录没有 project_id，无法恢复
+        if target_project_id is not None:
+            if not await _owned_project_ids(db, user_id, {target_project_id}, owned_project_ids):
+                raise NotFoundException("项目", target_project_id)
+            project_id = target_project_id
+        elif not history.project_id:
+            # 旧历史记录没有 project_id，无法恢复到原项目
             raise AppException(
-                message="账单已被删除，且历史记录缺少项目信息，无法自动恢复。请手动创建新账单。",
+                message="账单已被删除，且历史记录缺少项目信息，请指定 project_id 恢复到其他项目。",
                 error_code="BILL_DELETED_CANNOT_RESTORE"
             )
+        elif not await _owned_project_ids(db, user_id, {history.project_id}, owned_project_ids):
+            # 原项目已随项目删除一并删除
+            raise AppException(
+                message="账单所属项目已被删除，请指定 project_id 恢复到其他项目。",
+                error_code="BILL_PROJECT_DELETED"
+            )
+        else:
+            project_id = history.project_id
         
-        # 有 project_id，可以恢复
         note_text = history.note or ""
         new_bill = Bill(
             user_id=user_id,
-            project_id=history.project_id,
+            project_id=project_id,
             name=history.name or "恢复的账单",
             amount=history.amount,
             bill_type=history.bill_type,
@@ -730,7 +847,7 @@ async def restore_bill_version_async(
         await db.refresh(new_bill)
         
         # 清除缓存
-        await invalidate_user_cache(user_id)
+        await invalidate_user_cache(user_id, family_id)
         
         return new_bill
     
@@ -746,4 +863,4 @@ async def restore_bill_version_async(
         hourly_rate=history.hourly_rate,
         pay_method=history.pay_method
     )
-    return await update_bill_async(db, bill.id, update_data, user_id)
+    return await update_bill_async(db, bill.id, update_data, user_id, family_id, owned_project_ids)
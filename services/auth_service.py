@@ -1,13 +1,28 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User
-from schemas.user import UserCreate, UserLogin
-from utils.exceptions import AppException, UnauthorizedException, ConflictException
+from models.refresh_token import RefreshToken
+from schemas.user import UserCreate, UserLogin, CurrentUser, PrincipalContext
+from utils.exceptions import AppException, UnauthorizedException, ConflictException, ServiceUnavailableException
 import bcrypt
 import re
-from datetime import timedelta
+import logging
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
 from utils.jwt import create_access_token
+from utils.cache import (
+    CacheKeys, cache_get, cache_set, cache_delete, cache_get_or_compute, get_generation
+)
+from utils.password_hasher import hash_password, check_password, needs_rehash
+from utils.performance import monitor
+from services.rollup_service import rebuild_rollups
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 
 def validate_password_strength(password: str) -> tuple[bool, str]:
     """
@@ -27,7 +42,7 @@ def validate_password_strength(password: str) -> tuple[bool, str]:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
+    """验证密码（同步，供脚本和测试使用；请求路径使用 utils.password_hasher）"""
     return bcrypt.checkpw(
         plain_password.encode('utf-8'), 
         hashed_password.encode('utf-8')
@@ -35,10 +50,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
+    """生成密码哈希（同步，供脚本和测试使用；请求路径使用 utils.password_hasher）"""
     return bcrypt.hashpw(
         password.encode('utf-8'), 
-        bcrypt.gensalt()
+        bcrypt.gensalt(settings.BCRYPT_ROUNDS)
     ).decode('utf-8')
 
 
@@ -47,11 +62,29 @@ def get_user_by_username(db: Session, username: str) -> User | None:
     return db.query(User).filter(User.username == username).first()
 
 
+async def get_token_epoch_async(db: AsyncSession, user_id: int) -> int | None:
+    """查询用户当前的 token_epoch（主键查询；用户不存在返回 None）"""
+    result = await db.execute(select(User.token_epoch).where(User.id == user_id))
+    return result.scalar_one_or_none()
+
+
+async def get_user_by_username_async(db: AsyncSession, username: str) -> User | None:
+    """异步根据用户名查询用户"""
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalar_one_or_none()
+
+
 def get_user_by_email(db: Session, email: str) -> User | None:
     """根据邮箱查询用户"""
     return db.query(User).filter(User.email == email).first()
 
 
+async def get_user_by_email_async(db: AsyncSession, email: str) -> User | None:
+    """异步根据邮箱查询用户"""
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalar_one_or_none()
+
+
 def create_user(db: Session, user: UserCreate) -> User:
     """
     创建新用户
@@ -87,51 +120,316 @@ def create_user(db: Session, user: UserCreate) -> User:
     db_user = User(
         username=user.username,
         email=user.email,
-        hashed_password=hashed_password
+        hashed_password=hashed_password,
+        tz_offset_minutes=user.tz_offset_minutes
     )
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, user: UserLogin) -> User | bool:
+
+async def create_user_async(db: AsyncSession, user: UserCreate) -> User:
+    """
+    异步创建新用户（密码哈希在独立进程池中执行）
+    
+    Args:
+        db: 异步数据库会话
+        user: 用户创建数据
+    
+    Returns:
+        创建的用户对象
+    
+    Raises:
+        AppException: 密码强度不足
+        ConflictException: 用户名或邮箱已存在
+        ServiceUnavailableException: 密码哈希进程池繁忙
+    """
+    is_valid, error_msg = validate_password_strength(user.password)
+    if not is_valid:
+        raise AppException(
+            message=error_msg,
+            error_code="WEAK_PASSWORD"
+        )
+    
+    if await get_user_by_username_async(db, user.username):
+        raise ConflictException("用户名已存在")
+    if await get_user_by_email_async(db, user.email):
+        raise ConflictException("邮箱已存在")
+    
+    db_user = User(
+        username=user.username,
+        email=user.email,
+        hashed_password=await hash_password(user.password),
+        tz_offset_minutes=user.tz_offset_minutes
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    # 该用户名可能在注册前被负缓存
+    await cache_delete(CacheKeys.user_missing_key(user.username))
+    return db_user
+
+async def update_user_timezone_async(db: AsyncSession, user_id: int, tz_offset_minutes: int) -> User:
+    """
+    异步更新用户时区
+    
+    Args:
+        db: 异步数据库会话
+        user_id: 用户ID
+        tz_offset_minutes: UTC 偏移分钟数
+    
+    Returns:
+        更新后的用户对象
+    """
+    db_user = await db.get(User, user_id)
+    if not db_user:
+        raise UnauthorizedException("用户不存在")
+    if db_user.tz_offset_minutes != tz_offset_minutes:
+        db_user.tz_offset_minutes = tz_offset_minutes
+        await db.flush()
+        # 日汇总按本地日期划分，时区变化后需在同一事务中重建该用户的汇总
+        # （复用同步实现，run_sync 在事件循环内执行，不占用线程池）
+        await db.run_sync(lambda session: rebuild_rollups(session.connection(), user_id))
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def authenticate_user_async(db: AsyncSession, user: UserLogin) -> User | bool:
     """
     验证用户凭据
     
+    - 不存在的用户名写入负缓存，重复尝试（撞库）不再查库
+    - 密码校验在独立进程池中执行
+    - 校验通过且哈希成本因子低于 BCRYPT_ROUNDS 时顺带升级哈希
+    
     Args:
-        db: 数据库会话
+        db: 异步数据库会话
         user: 登录信息
         
     Returns:
         验证成功返回用户对象，否则返回 False
+    
+    Raises:
+        ServiceUnavailableException: 密码哈希进程池繁忙
     """
-    db_user = get_user_by_username(db, username=user.username)
+    missing_key = CacheKeys.user_missing_key(user.username)
+    if await cache_get(missing_key) is not None:
+        monitor.record_password_hash("negative_hit")
+        return False
+    
+    db_user = await get_user_by_username_async(db, user.username)
     if not db_user:
+        await cache_set(missing_key, "1", ttl=settings.AUTH_NEGATIVE_CACHE_TTL)
         return False
-    if not verify_password(user.password, db_user.hashed_password):
+    if not await check_password(user.password, db_user.hashed_password):
         return False
+    
+    if needs_rehash(db_user.hashed_password):
+        try:
+            db_user.hashed_password = await hash_password(user.password)
+            await db.commit()
+            monitor.record_password_hash("rehash")
+        except ServiceUnavailableException:
+            # 繁忙时跳过升级，下次登录再处理
+            logger.info(f"密码哈希进程池繁忙，跳过成本因子升级: user_id={db_user.id}")
     return db_user
 
 
-def login_user(db: Session, user: UserLogin) -> dict:
+async def login_user_async(db: AsyncSession, user: UserLogin) -> dict:
     """
     用户登录
     
     Args:
-        db: 数据库会话
+        db: 异步数据库会话
         user: 登录信息
-        
+    
     Returns:
-        包含 access_token 和 token_type 的字典
-        
+        包含 access_token、refresh_token 和 token_type 的字典
+    
     Raises:
         UnauthorizedException: 用户名或密码错误
+        ServiceUnavailableException: 密码哈希进程池繁忙
     """
-    db_user = authenticate_user(db, user)
+    db_user = await authenticate_user_async(db, user)
     if not db_user:
         raise UnauthorizedException("用户名或密码错误")
+    token = issue_access_token(db_user)
+    # 顺带清理该用户已过期的刷新令牌
+    await db.execute(delete(RefreshToken).where(
+        RefreshToken.user_id == db_user.id,
+        RefreshToken.expires_at < datetime.now(timezone.utc)
+    ))
+    token["refresh_token"] = await _issue_refresh_token(db, db_user.id, uuid.uuid4().hex)
+    await db.commit()
+    return token
+
+
+async def get_principal_context_async(db: AsyncSession, current_user: CurrentUser) -> PrincipalContext:
+    """
+    获取请求主体上下文（带缓存）
+    
+    家庭ID取自令牌声明；缓存 key 内嵌用户的项目代数和家庭的成员代数，
+    创建/删除项目、家庭成员变化时失效。未命中时两条查询：拥有的项目、家庭成员
+    """
+    from models.family import Family
+    from models.project import Project
+    
+    family_id = current_user.family_id
+    gen = await get_generation(CacheKeys.SCOPE_PRINCIPAL, current_user.id)
+    membership_gen = await get_generation(CacheKeys.SCOPE_MEMBERSHIP, family_id) if family_id else 0
+    
+    async def compute() -> PrincipalContext:
+        result = await db.execute(select(Project.id).where(Project.user_id == current_user.id))
+        project_ids = frozenset(result.scalars().all())
+        
+        creator_id, member_ids = None, frozenset()
+        if family_id:
+            result = await db.execute(
+                select(User.id, Family.created_by)
+                .join(Family, Family.id == User.family_id)
+                .where(User.family_id == family_id)
+            )
+            rows = result.all()
+            member_ids = frozenset(row.id for row in rows)
+            creator_id = rows[0].created_by if rows else None
+        
+        return PrincipalContext(
+            user_id=current_user.id,
+            family_id=family_id,
+            family_creator_id=creator_id,
+            member_ids=member_ids,
+            project_ids=project_ids,
+        )
+    
+    return await cache_get_or_compute(
+        CacheKeys.principal_key(current_user.id, family_id, gen, membership_gen),
+        compute,
+        ttl=settings.CACHE_TTL_USER,
+        serialize=PrincipalContext.model_dump_json,
+        deserialize=PrincipalContext.model_validate_json,
+    )
+
+
+def issue_access_token(user: User) -> dict:
+    """
+    为用户签发访问令牌
+    
+    令牌携带 uid、fid（家庭）、tz（时区）和 epoch（令牌代数）声明，
+    get_current_user 直接由声明构建当前用户，不再查库
+    
+    Returns:
+        包含 access_token 和 token_type 的字典
+    """
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": db_user.username}, expires_delta=access_token_expires
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "fid": user.family_id,
+            "tz": user.tz_offset_minutes,
+            "epoch": user.token_epoch or 0,
+        },
+        expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+
+async def logout_all_async(db: AsyncSession, user_id: int) -> None:
+    """
+    登出全部设备：递增令牌代数并吊销全部刷新令牌，提交后该用户之前签发的令牌全部失效
+    
+    Raises:
+        UnauthorizedException: 用户不存在
+    """
+    db_user = await db.get(User, user_id)
+    if not db_user:
+        raise UnauthorizedException("用户不存在")
+    db_user.token_epoch = (db_user.token_epoch or 0) + 1
+    await _revoke_refresh_tokens(db, RefreshToken.user_id == user_id)
+    await db.commit()
+
+
+# ==================== 刷新令牌 ====================
+
+def _hash_refresh_token(token: str) -> str:
+    """刷新令牌是高熵随机串，SHA-256 即可（无需 bcrypt），摘要可直接走唯一索引"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+async def _issue_refresh_token(db: AsyncSession, user_id: int, chain_id: str) -> str:
+    """签发刷新令牌（加入调用方事务，由调用方提交），只保存摘要"""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_refresh_token(token),
+        chain_id=chain_id,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+async def _revoke_refresh_tokens(db: AsyncSession, *criteria) -> None:
+    """吊销满足条件且尚未吊销的刷新令牌"""
+    await db.execute(
+        update(RefreshToken)
+        .where(*criteria, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite 读回的时间不带时区，按 UTC 处理"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def refresh_access_token_async(db: AsyncSession, refresh_token: str) -> dict:
+    """
+    用刷新令牌换取新的访问令牌和刷新令牌（轮换）
+    
+    - 按摘要唯一索引查找，不做密码校验
+    - 旧令牌以条件 UPDATE 标记为已使用，并发刷新时只有一个请求成功
+    - 已使用的令牌再次出现视为重放：吊销整条链，并递增用户令牌代数使已签发的访问令牌失效
+    
+    Args:
+        db: 异步数据库会话
+        refresh_token: 客户端持有的刷新令牌
+    
+    Returns:
+        包含 access_token、refresh_token 和 token_type 的字典
+    
+    Raises:
+        UnauthorizedException: 令牌无效、过期、已吊销或被重放
+    """
+    invalid = UnauthorizedException("刷新令牌无效或已过期")
+    result = await db.execute(
+        select(RefreshToken).where(RefreshToken.token_hash == _hash_refresh_token(refresh_token))
     )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    stored = result.scalar_one_or_none()
+    now = datetime.now(timezone.utc)
+    if stored is None or stored.revoked_at is not None or _as_utc(stored.expires_at) <= now:
+        raise invalid
+    
+    claimed = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == stored.id, RefreshToken.used_at.is_(None))
+        .values(used_at=now)
+    )
+    if claimed.rowcount != 1:
+        # 重放：令牌已被轮换过，说明旧令牌可能已泄露
+        logger.warning(f"检测到刷新令牌重放，吊销令牌链: user_id={stored.user_id}")
+        await _revoke_refresh_tokens(db, RefreshToken.chain_id == stored.chain_id)
+        db_user = await db.get(User, stored.user_id)
+        if db_user is not None:
+            db_user.token_epoch = (db_user.token_epoch or 0) + 1
+        await db.commit()
+        raise invalid
+    
+    db_user = await db.get(User, stored.user_id)
+    if db_user is None:
+        raise invalid
+    token = issue_access_token(db_user)
+    token["refresh_token"] = await _issue_refresh_token(db, db_user.id, stored.chain_id)
+    await db.commit()
+    return token
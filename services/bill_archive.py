@@ -0,0 +1,73 @@
+"""
+账单集合存档删除
+
+批量删除账单、删除项目时共用：满足条件的账单先存档为 DELETE 历史记录再删除，
+全部是集合语句，不把账单加载进会话；返回实际删除行的汇总字段，供调用方在同一事务内
+同步日汇总和项目计数
+"""
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.bill import Bill, BillHistory
+from models.rollup import ROLLUP_SOURCE_FIELDS
+from utils.constants import OperationType
+
+
+_HISTORY_COLUMNS = [
+    "bill_id", "operation_type", "name", "amount", "bill_type", "category", "date",
+    "note", "duration_hours", "hourly_rate", "pay_method", "user_id", "project_id",
+]
+
+
+def _archive_bills(source, bill_id, *where):
+    """
+    构建 `INSERT INTO bill_histories ... SELECT ... FROM source` 存档语句
+    
+    Args:
+        source: 提供账单列的表或 CTE 列集合（Bill 的列，或 DELETE ... RETURNING 的 CTE.c）
+        bill_id: source 中的账单ID列
+        where: 选取要存档账单的条件
+    """
+    return insert(BillHistory).from_select(
+        _HISTORY_COLUMNS,
+        select(bill_id, literal(OperationType.DELETE.value), *[
+            getattr(source, column) for column in _HISTORY_COLUMNS[2:]
+        ]).where(*where)
+    )
+
+
+async def archive_and_delete_bills(db: AsyncSession, *where) -> list:
+    """
+    把满足条件的账单存档为 DELETE 历史记录后删除（集合操作，不加载进会话）
+    
+    - PostgreSQL：一条 `WITH deleted AS (DELETE ... RETURNING ...) INSERT INTO bill_histories SELECT ... FROM deleted`
+    - 支持 DELETE ... RETURNING 的其他数据库（SQLite）：INSERT ... SELECT 存档后 DELETE ... RETURNING
+      （SQLite 写事务独占，两条语句之间不会有其他写入）
+    - 其他：先 SELECT ... FOR UPDATE 锁定并取汇总字段，再 INSERT ... SELECT 存档和 DELETE
+    
+    Returns:
+        实际删除的账单的汇总字段（ROLLUP_SOURCE_FIELDS），调用方据此同步日汇总和项目计数
+    """
+    source_columns = [getattr(Bill, field) for field in ROLLUP_SOURCE_FIELDS]
+    connection = await db.connection()
+    
+    if connection.dialect.name == "postgresql":
+        deleted = delete(Bill).where(*where).returning(
+            Bill.id, *[getattr(Bill, column) for column in _HISTORY_COLUMNS[2:]]
+        ).cte("deleted_bills")
+        result = await db.execute(
+            _archive_bills(deleted.c, deleted.c.id)
+            .returning(*[getattr(BillHistory, field) for field in ROLLUP_SOURCE_FIELDS])
+            .add_cte(deleted)
+        )
+        return result.all()
+    
+    if connection.dialect.delete_returning:
+        await db.execute(_archive_bills(Bill, Bill.id, *where))
+        result = await db.execute(delete(Bill).where(*where).returning(*source_columns))
+        return result.all()
+    
+    result = await db.execute(select(*source_columns).where(*where).with_for_update())
+    rows = result.all()
+    await db.execute(_archive_bills(Bill, Bill.id, *where))
+    await db.execute(delete(Bill).where(*where))
+    return rows
@@ -0,0 +1,325 @@
+"""
+账单批量导入服务
+
+流式导入 CSV（与导出接口相同的列）或 NDJSON（每行一个账单 JSON）：
+- 边读请求体边解析、逐行校验，内存中只保留当前一批待写入的行，与文件大小无关
+- 校验失败的行跳过并记录行号和原因，其余行照常写入；无效的 UTF-8 字节、
+  引号未闭合的 CSV 记录同样按行报错，不中断导入
+- 每批一个事务：PostgreSQL（asyncpg）用 COPY，其他数据库用 executemany；
+  同一事务内同步日汇总和项目计数
+"""
+import codecs
+import csv
+import logging
+import re
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import AbstractSet, AsyncIterator, List, Optional, Tuple
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models.bill import Bill
+from models.rollup import apply_bill_changes, load_user_timezones
+from schemas.bill import BillCreate
+from utils.cache import invalidate_user_cache
+from utils.constants import BillType
+from utils.exceptions import AppException
+from utils.timezone_utils import ensure_utc
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# 与 export_bills_to_csv_async 的表头一致
+CSV_COLUMNS = ['日期时间', '名称', '类型', '分类', '金额', '时长(小时)', '时薪(元/小时)', '支付方式', '备注']
+_CSV_FIELDS = ['date', 'name', 'bill_type', 'category', 'amount', 'duration_hours', 'hourly_rate', 'pay_method', 'note']
+_CSV_BILL_TYPES = {'收入': BillType.INCOME.value, '支出': BillType.EXPENSE.value}
+
+# 写入的账单列（COPY 和 executemany 共用）
+_INSERT_COLUMNS = [
+    'user_id', 'project_id', 'name', 'amount', 'bill_type', 'category', 'date',
+    'note', 'duration_hours', 'hourly_rate', 'pay_method',
+]
+
+_bill_adapter = TypeAdapter(BillCreate)
+
+# surrogateescape 把无效的 UTF-8 字节解码为 U+DC80-U+DCFF 的孤立代理项，
+# 合法的 UTF-8 文本中不会出现这些字符，据此定位包含无效字节的行
+_INVALID_BYTES = re.compile("[\udc80-\udcff]")
+_INVALID_BYTES_MESSAGE = "包含无效的 UTF-8 字节"
+
+
+def _error_message(exc: Exception) -> str:
+    """校验异常转为简短的错误说明"""
+    if isinstance(exc, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in error['loc']) or '行'}: {error['msg']}"
+            for error in exc.errors()
+        )
+    return str(exc)
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """
+    把请求体字节流切分为文本行（增量 UTF-8 解码，去掉开头的 BOM；
+    无效字节不抛异常，按 surrogateescape 保留，由调用方按行报错）
+    
+    只按 \n 切分（\r\n 归一为 \n）：str.splitlines 还会在 U+2028、\x0c 等字符处切开，
+    NDJSON 的字符串里可以合法地包含这些字符；跨块的 \r\n 也不会被拆成两行
+    
+    Yields:
+        (行号, 行内容)，行内容以 \n 结尾（最后一行可能没有）
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="surrogateescape")
+    pending = ""
+    line_no = 0
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        end = pending.find("\n")
+        while end != -1:
+            line_no += 1
+            line = pending[start:end]
+            yield line_no, (line[:-1] if line.endswith("\r") else line) + "\n"
+            start = end + 1
+            end = pending.find("\n", start)
+        # 没有换行符的剩余部分留到下一块再处理
+        pending = pending[start:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield line_no + 1, pending[:-1] if pending.endswith("\r") else pending
+
+
+class _CsvRecordBuffer:
+    """
+    按 CSV 记录分组：引号内的换行属于同一条记录（已读入的引号数为奇数时记录未结束）
+    
+    缓冲的记录超过 BILL_IMPORT_MAX_RECORD_CHARS 仍未闭合，或请求体结束时仍未闭合，
+    视为起始行引号未闭合：该行报错，其余缓冲行从头重新解析。缓冲区大小因此有上限，
+    一个多余的引号不会吞掉之后的全部数据
+    """
+    
+    def __init__(self):
+        self._lines: List[Tuple[int, str]] = []
+        self._quotes = 0
+        self._chars = 0
+    
+    def feed(self, line_no: int, line: str) -> List[Tuple[int, object]]:
+        """
+        加入一行，返回已完整的记录
+        
+        Returns:
+            [(起始行号, 字段列表或解析异常)]
+        """
+        output: List[Tuple[int, object]] = []
+        pending = [(line_no, line)]
+        while pending:
+            item = pending.pop(0)
+            self._lines.append(item)
+            self._quotes += item[1].count('"')
+            self._chars += len(item[1])
+            if self._quotes % 2 == 0:
+                start = self._lines[0][0]
+                output.extend((start, record) for record in csv.reader(line for _, line in self._lines))
+                self._reset()
+            elif self._chars > settings.BILL_IMPORT_MAX_RECORD_CHARS:
+                pending[:0] = self._drop_unterminated(output)
+        return output
+    
+    def close(self) -> List[Tuple[int, object]]:
+        """请求体结束：仍未闭合的记录报错，其余缓冲行重新解析"""
+        output: List[Tuple[int, object]] = []
+        while self._lines:
+            for line_no, line in self._drop_unterminated(output):
+                output.extend(self.feed(line_no, line))
+        return output
+    
+    def _drop_unterminated(self, output: List[Tuple[int, object]]) -> List[Tuple[int, str]]:
+        """起始行报错并清空缓冲，返回需要重新解析的后续行"""
+        (start, _), *rest = self._lines
+        output.append((start, ValueError("引号未闭合")))
+        self._reset()
+        return rest
+    
+    def _reset(self):
+        self._lines, self._quotes, self._chars = [], 0, 0
+
+
+def _csv_row_to_bill(record: List[str], project_id: Optional[int]) -> dict:
+    """CSV 记录转为账单字段（日期时间按 UTC 解析，与导出一致）"""
+    if len(record) != len(CSV_COLUMNS):
+        raise ValueError(f"应有 {len(CSV_COLUMNS)} 列，实际 {len(record)} 列")
+    values = dict(zip(_CSV_FIELDS, (cell.strip() for cell in record)))
+    if not values['date']:
+        raise ValueError("日期时间不能为空")
+    date = datetime.fromisoformat(values['date'])
+    values['date'] = date.replace(tzinfo=timezone.utc) if date.tzinfo is None else date
+    values['bill_type'] = _CSV_BILL_TYPES.get(values['bill_type'], values['bill_type'])
+    for field in ('duration_hours', 'hourly_rate', 'pay_method', 'note'):
+        values[field] = values[field] or None
+    values['project_id'] = project_id
+    return values
+
+
+async def _iter_rows(
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    project_id: Optional[int]
+) -> AsyncIterator[Tuple[int, object]]:
+    """
+    解析为未校验的账单字段
+    
+    Yields:
+        (行号, 字段字典或解析异常)
+    """
+    lines = _iter_lines(chunks)
+    if fmt == "ndjson":
+        async for line_no, line in lines:
+            if not line.strip():
+                continue
+            try:
+                if _INVALID_BYTES.search(line):
+                    raise ValueError(_INVALID_BYTES_MESSAGE)
+                row = orjson.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("每行必须是一个 JSON 对象")
+                if row.get('project_id') is None:
+                    row['project_id'] = project_id
+                yield line_no, row
+            except (orjson.JSONDecodeError, ValueError) as e:
+                yield line_no, e
+        return
+    
+    records = _CsvRecordBuffer()
+    first = True
+    
+    async def parsed():
+        async for line_no, line in lines:
+            for item in records.feed(line_no, line):
+                yield item
+        for item in records.close():
+            yield item
+    
+    async for line_no, record in parsed():
+        if isinstance(record, Exception):
+            first = False
+            yield line_no, record
+            continue
+        # 跳过表头和空行
+        if first and record and record[0].strip() == CSV_COLUMNS[0]:
+            first = False
+            continue
+        first = False
+        if not any(cell.strip() for cell in record):
+            continue
+        try:
+            if any(_INVALID_BYTES.search(cell) for cell in record):
+                raise ValueError(_INVALID_BYTES_MESSAGE)
+            yield line_no, _csv_row_to_bill(record, project_id)
+        except ValueError as e:
+            yield line_no, e
+
+
+async def _write_chunk(db: AsyncSession, rows: List[dict], timezones: dict) -> None:
+    """写入一批账单并同步日汇总和项目计数，一个事务"""
+    # 先同步汇总和计数（只有新增，不依赖账单表中的新行），同时开启本批事务，
+    # COPY 在同一连接的同一事务中执行
+    connection = await db.connection()
+    await connection.run_sync(
+        apply_bill_changes, added=[SimpleNamespace(**row) for row in rows], timezones=timezones
+    )
+    
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            Bill.__tablename__,
+            records=[tuple(row[column] for column in _INSERT_COLUMNS) for row in rows],
+            columns=_INSERT_COLUMNS,
+        )
+    else:
+        await db.execute(insert(Bill), rows)
+    await db.commit()
+
+
+async def import_bills_async(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    user_id: int,
+    owned_project_ids: AbstractSet[int],
+    project_id: Optional[int] = None,
+    family_id: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> dict:
+    """
+    流式导入账单
+    
+    Args:
+        db: 异步数据库会话
+        chunks: 请求体字节流（如 request.stream()）
+        fmt: "csv" 或 "ndjson"
+        user_id: 用户ID
+        owned_project_ids: 用户拥有的项目ID（主体上下文）
+        project_id: CSV 行写入的项目；NDJSON 行未指定 project_id 时的默认项目
+        family_id: 用户所在家庭（失效家庭统计缓存）
+        chunk_size: 每批写入行数，默认 settings.BILL_IMPORT_CHUNK_SIZE
+    
+    Returns:
+        {"imported", "failed", "errors"}，errors 最多保留 settings.BILL_IMPORT_MAX_ERRORS 条
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise AppException(
+            message=f"导入格式只能是 {' 或 '.join(IMPORT_FORMATS)}",
+            error_code="INVALID_IMPORT_FORMAT"
+        )
+    if fmt == "csv" and project_id is None:
+        raise AppException(
+            message="CSV 导入必须指定 project_id",
+            error_code="PROJECT_ID_REQUIRED"
+        )
+    
+    chunk_size = chunk_size or settings.BILL_IMPORT_CHUNK_SIZE
+    connection = await db.connection()
+    timezones = await connection.run_sync(load_user_timezones, [user_id])
+    
+    imported = failed = 0
+    errors: List[dict] = []
+    batch: List[dict] = []
+    
+    try:
+        async for line_no, row in _iter_rows(chunks, fmt, project_id):
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                bill = _bill_adapter.validate_python(row)
+                if bill.project_id not in owned_project_ids:
+                    raise ValueError(f"项目不存在: {bill.project_id}")
+            except (ValidationError, ValueError) as e:
+                failed += 1
+                if len(errors) < settings.BILL_IMPORT_MAX_ERRORS:
+                    errors.append({"line": line_no, "message": _error_message(e)})
+                continue
+            
+            values = {column: getattr(bill, column, None) for column in _INSERT_COLUMNS}
+            values['user_id'] = user_id
+            values['date'] = ensure_utc(bill.date)
+            batch.append(values)
+            if len(batch) >= chunk_size:
+                await _write_chunk(db, batch, timezones)
+                imported += len(batch)
+                batch = []
+        
+        if batch:
+            await _write_chunk(db, batch, timezones)
+            imported += len(batch)
+    finally:
+        # 已提交的批次同样需要失效缓存
+        if imported:
+            await invalidate_user_cache(user_id, family_id)
+    
+    logger.info(f"导入账单 {imported} 条，失败 {failed} 条，用户: {user_id}")
+    return {"imported": imported, "failed": failed, "errors": errors}
@@ -7,6 +7,8 @@
 - 获取家庭成员及账单
 - 家庭统计
 """
+from sqlalchemy import func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -14,7 +16,23 @@ from models.family import Family, generate_invite_code
 from models.user import User
 from models.bill import Bill
 from schemas.family import FamilyCreate, FamilyMemberResponse, FamilyBillResponse
+from schemas.user import PrincipalContext
 from utils.exceptions import NotFoundException, ConflictException, AppException
+from utils.constants import BillType, Pagination
+from utils.cache import CacheKeys, cache_get_or_compute_scoped
+from db.async_database import run_in_new_session
+from utils.timezone_utils import get_user_timezone, resolve_local_period, local_dates_to_utc_range
+from utils.pagination import encode_cursor, keyset_before
+import orjson
+
+
+def _month_filters(month: str, tz_offset_minutes: Optional[int] = None) -> list:
+    """构建月份筛选条件：本地月份转换为 UTC 半开区间"""
+    start, end = local_dates_to_utc_range(
+        *resolve_local_period(month=month),
+        tz=get_user_timezone(tz_offset_minutes)
+    )
+    return [Bill.date >= start, Bill.date < end]
 
 
 def create_family(db: Session, family: FamilyCreate, user_id: int) -> Family:
@@ -61,18 +79,17 @@ def create_family(db: Session, family: FamilyCreate, user_id: int) -> Family:
     return db_family
 
 
-def get_user_family(db: Session, user_id: int) -> Optional[Family]:
+def get_user_family(db: Session, principal: PrincipalContext) -> Optional[Family]:
     """
-    获取用户所在的家庭组
+    获取用户所在的家庭组（家庭ID取自主体上下文，无需先查用户）
     
     Returns:
         家庭组对象，未加入则返回 None
     """
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.family_id:
+    if not principal.family_id:
         return None
     
-    return db.query(Family).filter(Family.id == user.family_id).first()
+    return db.get(Family, principal.family_id)
 
 
 def join_family(db: Session, invite_code: str, user_id: int) -> Family:
@@ -170,11 +187,10 @@ def dissolve_family(db: Session, user_id: int) -> dict:
     if family.created_by != user_id:
         raise AppException(message="只有创建者可以解散家庭", error_code="NOT_CREATOR")
     
-    # 移除所有成员
-    db.query(User).filter(User.family_id == family.id).update({
-        User.family_id: None,
-        User.family_joined_at: None
-    })
+    # 移除所有成员（逐个修改而非批量 UPDATE，使成员的令牌代数随之递增）
+    for member in db.query(User).filter(User.family_id == family.id).all():
+        member.family_id = None
+        member.family_joined_at = None
     
     # 删除家庭
     db.delete(family)
@@ -183,24 +199,29 @@ def dissolve_family(db: Session, user_id: int) -> dict:
     return {"message": "家庭组已解散"}
 
 
-def get_family_members(db: Session, user_id: int) -> List[FamilyMemberResponse]:
+def get_family_members(
+    db: Session,
+    family_id: Optional[int],
+    creator_id: Optional[int]
+) -> List[FamilyMemberResponse]:
     """
     获取家庭成员列表
-    """
-    user = db.query(User).filter(User.id == user_id).first()
     
-    if not user.family_id:
+    Args:
+        family_id: 家庭ID（为空时返回空列表）
+        creator_id: 家庭创建者ID，用于标记 is_creator
+    """
+    if not family_id:
         return []
     
-    family = db.query(Family).filter(Family.id == user.family_id).first()
-    members = db.query(User).filter(User.family_id == user.family_id).all()
+    members = db.query(User).filter(User.family_id == family_id).all()
     
     return [
         FamilyMemberResponse(
             id=m.id,
             username=m.username,
             joined_at=m.family_joined_at,
-            is_creator=(m.id == family.created_by)
+            is_creator=(m.id == creator_id)
         )
         for m in members
     ]
@@ -208,52 +229,42 @@ def get_family_members(db: Session, user_id: int) -> List[FamilyMemberResponse]:
 
 def get_family_bills(
     db: Session, 
-    user_id: int, 
+    principal: PrincipalContext, 
     skip: int = 0, 
     limit: int = 100,
     month: Optional[str] = None,
-    member_id: Optional[int] = None
+    member_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
 ) -> List[FamilyBillResponse]:
     """
     获取家庭所有成员的账单
     
     Args:
         db: 数据库会话
-        user_id: 当前用户ID
+        principal: 当前用户的主体上下文（家庭成员ID）
         skip: 分页偏移
         limit: 分页大小
         month: 月份筛选 (YYYY-MM)
         member_id: 指定成员ID筛选
+        tz_offset_minutes: 当前用户时区，决定月份边界
         
     Returns:
         家庭账单列表
     """
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user.family_id:
+    if not principal.family_id:
         raise AppException(message="您当前不在任何家庭组中", error_code="NOT_IN_FAMILY")
     
-    # 获取家庭所有成员ID
-    member_ids = db.query(User.id).filter(User.family_id == user.family_id).all()
-    member_ids = [m[0] for m in member_ids]
+    # 成员筛选（非本家庭成员时忽略）
+    member_ids = [member_id] if member_id and principal.is_member(member_id) else list(principal.member_ids)
     
     # 构建查询
     query = db.query(Bill, User.username).join(
         User, Bill.user_id == User.id
     ).filter(Bill.user_id.in_(member_ids))
     
-    # 月份筛选
+    # 月份筛选（按当前用户时区划分月份，范围条件可走 idx_user_date_id）
     if month:
-        from sqlalchemy import extract
-        year, month_num = map(int, month.split('-'))
-        query = query.filter(
-            extract('year', Bill.date) == year,
-            extract('month', Bill.date) == month_num
-        )
-    
-    # 成员筛选
-    if member_id and member_id in member_ids:
-        query = query.filter(Bill.user_id == member_id)
+        query = query.filter(*_month_filters(month, tz_offset_minutes))
     
     # 排序和分页
     results = query.order_by(Bill.date.desc()).offset(skip).limit(limit).all()
@@ -275,67 +286,162 @@ def get_family_bills(
     ]
 
 
-def get_family_statistics(
-    db: Session, 
-    user_id: int, 
-    month: Optional[str] = None
+async def get_family_bills_page_async(
+    db: AsyncSession,
+    family_id: Optional[int],
+    cursor: Optional[str] = None,
+    limit: int = Pagination.DEFAULT_LIMIT,
+    month: Optional[str] = None,
+    member_id: Optional[int] = None,
+    tz_offset_minutes: Optional[int] = None
 ) -> dict:
     """
-    获取家庭统计数据
+    游标分页获取家庭所有成员的账单（异步）
+    
+    成员关系和账单在同一条语句中解析，按 (date DESC, id DESC) 排序，
+    通过 (date, id) 游标定位到每个成员的 idx_user_date_id 索引位置：
+    - PostgreSQL：LATERAL 子查询，每个成员最多取 limit + 1 条再归并，开销与页码无关
+    - 其他数据库：成员账单 JOIN 用户后统一排序
     
     Returns:
-        包含总收入、总支出、各成员统计的字典
+        {"items", "page_size", "has_more", "next_cursor"}，可直接构造 PaginatedFamilyBillResponse
     """
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user.family_id:
+    if not family_id:
         raise AppException(message="您当前不在任何家庭组中", error_code="NOT_IN_FAMILY")
+    if limit < Pagination.MIN_LIMIT or limit > Pagination.MAX_LIMIT:
+        raise AppException(message="无效的分页参数", error_code="INVALID_PAGINATION")
     
-    # 获取家庭所有成员
-    members = db.query(User).filter(User.family_id == user.family_id).all()
-    member_ids = [m.id for m in members]
-    
-    # 构建基础查询
-    query = db.query(Bill).filter(Bill.user_id.in_(member_ids))
-    
-    # 月份筛选
+    bill_filters = []
+    # 月份筛选（按当前用户时区划分月份，范围条件可走 idx_user_date_id）
     if month:
-        from sqlalchemy import extract
-        year, month_num = map(int, month.split('-'))
-        query = query.filter(
-            extract('year', Bill.date) == year,
-            extract('month', Bill.date) == month_num
+        bill_filters.extend(_month_filters(month, tz_offset_minutes))
+    seek = keyset_before(Bill.date, Bill.id, cursor)
+    if seek is not None:
+        bill_filters.append(seek)
+    
+    member_filters = [User.family_id == family_id]
+    # 成员筛选（非本家庭成员时结果为空）
+    if member_id:
+        member_filters.append(User.id == member_id)
+    
+    bill_columns = (
+        Bill.id, Bill.name, Bill.amount, Bill.bill_type, Bill.category,
+        Bill.date, Bill.note, Bill.project_id, Bill.user_id
+    )
+    # 多取一条用于判断是否还有下一页
+    if db.bind.dialect.name == "postgresql":
+        members = select(User.id, User.username).where(*member_filters).subquery("members")
+        member_bills = (
+            select(*bill_columns)
+            .where(Bill.user_id == members.c.id, *bill_filters)
+            .order_by(Bill.date.desc(), Bill.id.desc())
+            .limit(limit + 1)
+            .lateral("member_bills")
+        )
+        query = (
+            select(member_bills, members.c.username)
+            .select_from(members.join(member_bills, true()))
+            .order_by(member_bills.c.date.desc(), member_bills.c.id.desc())
+            .limit(limit + 1)
         )
+    else:
+        query = (
+            select(*bill_columns, User.username)
+            .join(User, User.id == Bill.user_id)
+            .where(*member_filters, *bill_filters)
+            .order_by(Bill.date.desc(), Bill.id.desc())
+            .limit(limit + 1)
+        )
+    rows = (await db.execute(query)).all()
     
-    bills = query.all()
-    
-    # 计算总统计
-    total_income = sum(b.amount for b in bills if b.bill_type == 'income')
-    total_expense = sum(b.amount for b in bills if b.bill_type == 'expense')
-    
-    # 计算每个成员的统计
-    member_stats = []
-    for member in members:
-        member_bills = [b for b in bills if b.user_id == member.id]
-        income = sum(b.amount for b in member_bills if b.bill_type == 'income')
-        expense = sum(b.amount for b in member_bills if b.bill_type == 'expense')
-        member_stats.append({
-            "user_id": member.id,
-            "username": member.username,
-            "income": income,
-            "expense": expense,
-            "balance": income - expense,
-            "bill_count": len(member_bills)
-        })
+    has_more = len(rows) > limit
+    items = [FamilyBillResponse.model_validate(row._mapping) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if has_more else None
     
     return {
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "balance": total_income - total_expense,
-        "member_stats": member_stats
+        "items": items,
+        "page_size": limit,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
     }
 
 
+async def get_family_statistics_async(
+    db: AsyncSession,
+    family_id: Optional[int],
+    month: Optional[str] = None,
+    tz_offset_minutes: Optional[int] = None
+) -> bytes:
+    """
+    获取家庭统计数据（异步+缓存）
+    
+    一条 GROUP BY user_id, bill_type 聚合语句算出各成员的收支，再关联成员用户名；
+    缓存 key 内嵌家庭代数，成员记账或成员变化时失效
+    
+    Returns:
+        FamilyStatisticsResponse 的 JSON 响应体
+    """
+    if not family_id:
+        raise AppException(message="您当前不在任何家庭组中", error_code="NOT_IN_FAMILY")
+    
+    # 月份按当前用户时区划分，时区不同的成员看到的统计也不同
+    def cache_key(gen: Optional[int]) -> str:
+        return CacheKeys.family_stats_key(family_id, f"{month or 'all'}@{tz_offset_minutes}", gen)
+    
+    async def compute(session: AsyncSession) -> bytes:
+        member_ids = select(User.id).where(User.family_id == family_id)
+        filters = [Bill.user_id.in_(member_ids)]
+        # 月份筛选（范围条件可走 idx_user_date_id）
+        if month:
+            filters.extend(_month_filters(month, tz_offset_minutes))
+        totals = select(
+            Bill.user_id,
+            Bill.bill_type,
+            func.sum(Bill.amount).label("amount"),
+            func.count(Bill.id).label("bill_count")
+        ).where(*filters).group_by(Bill.user_id, Bill.bill_type).subquery()
+        
+        # 没有账单的成员同样列出
+        query = select(
+            User.id, User.username, totals.c.bill_type, totals.c.amount, totals.c.bill_count
+        ).outerjoin(
+            totals, totals.c.user_id == User.id
+        ).where(User.family_id == family_id).order_by(User.id)
+        rows = (await session.execute(query)).all()
+        
+        members = {}
+        for row in rows:
+            stats = members.setdefault(row.id, {
+                "user_id": row.id,
+                "username": row.username,
+                "income": 0.0,
+                "expense": 0.0,
+                "balance": 0.0,
+                "bill_count": 0
+            })
+            if row.bill_type in (BillType.INCOME, BillType.EXPENSE):
+                stats[row.bill_type] = float(row.amount)
+                stats["bill_count"] += row.bill_count
+        for stats in members.values():
+            stats["balance"] = stats["income"] - stats["expense"]
+        
+        total_income = sum(m["income"] for m in members.values())
+        total_expense = sum(m["expense"] for m in members.values())
+        return orjson.dumps({
+            "total_income": total_income,
+            "total_expense": total_expense,
+            "balance": total_income - total_expense,
+            "member_stats": list(members.values())
+        })
+    
+    return await cache_get_or_compute_scoped(
+        CacheKeys.SCOPE_FAMILY, family_id, cache_key,
+        compute=lambda: compute(db),
+        refresh=lambda: run_in_new_session(db, compute),
+        ttl=300,
+    )
+
+
 def refresh_invite_code(db: Session, user_id: int) -> str:
     """
     刷新邀请码（仅创建者可操作）
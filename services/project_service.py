@@ -4,28 +4,47 @@
 处理项目相关的业务逻辑
 
 性能优化：
-- 使用子查询一次性获取所有项目的账单数量（解决N+1问题）
-- 添加项目列表缓存失效机制
+- 账单数量、收支合计、最新账单日期保存在项目表的计数列中，由账单写入在同一事务中维护
+  （见 models.project.apply_project_counters），项目列表是一次按用户索引的读取
+- 项目列表缓存 key 内嵌项目代数，账单写入和项目增删改时失效
+- 项目详情只返回汇总和第一页账单，后续页按 (project_id, date, id) 索引游标分页
+- 删除项目按批执行 INSERT ... SELECT 存档 + 批量 DELETE，不把账单加载进会话
+- 计数列与账单不一致时，用 `python -m services.project_service reconcile` 校正
+
+命令行用法：
+    python -m services.project_service reconcile [--user-id N] [--dry-run]
 """
+import sys
+from pathlib import Path
+
+# 以脚本方式运行时添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import logging
+from datetime import timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.engine import Connection
+from sqlalchemy import bindparam, case, delete, func, select, update
+from typing import List, Optional
+import orjson
 from models.project import Project
 from models.bill import Bill
-from schemas.project import ProjectCreate, ProjectUpdate
-from utils.exceptions import NotFoundException
-from utils.cache import _memory_cache
-
-
-def _get_project_list_cache_key(user_id: int) -> str:
-    """生成项目列表缓存key"""
-    return f"project:list:{user_id}"
+from models.rollup import apply_bill_changes, load_user_timezones
+from schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
+from config import settings
+from utils.constants import BillType, Pagination
+from utils.exceptions import NotFoundException, AppException
+from utils.cache import CacheKeys, cache_get_or_compute_scoped
+from services.bill_archive import archive_and_delete_bills
+from utils.timezone_utils import from_utc_to_local
+from utils.pagination import encode_cursor, keyset_before
 
+logger = logging.getLogger(__name__)
 
-def _invalidate_project_cache(user_id: int):
-    """清除用户的项目缓存"""
-    cache_key = _get_project_list_cache_key(user_id)
-    _memory_cache.delete(cache_key)
+# 浮点累加误差容忍度
+_TOLERANCE = 1e-6
 
 
 def create_project(db: Session, project: ProjectCreate, user_id: int) -> Project:
@@ -48,53 +67,39 @@ def create_project(db: Session, project: ProjectCreate, user_id: int) -> Project
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
-    
-    # 清除项目列表缓存
-    _invalidate_project_cache(user_id)
-    
-    # 新项目账单计数为0
-    db_project.bill_count = 0
     return db_project
 
 
-def get_projects(db: Session, user_id: int) -> List[Project]:
+async def get_projects_async(db: AsyncSession, user_id: int) -> bytes:
     """
-    获取用户的所有项目列表（带缓存 + N+1查询优化）
+    获取用户的所有项目列表（带缓存）
     
-    优化策略：
-    1. 使用单次子查询获取所有项目的账单数量
-    2. 结果缓存 2 分钟
+    计数列随账单写入维护，列表就是一次按 idx_user_project_name 的读取，不再聚合账单表
     
     Args:
-        db: 数据库会话
+        db: 异步数据库会话
         user_id: 用户ID
         
     Returns:
-        项目列表（包含账单计数）
+        List[ProjectResponse] 的 JSON 响应体
     """
-    # 查询所有项目
-    projects = db.query(Project).filter(Project.user_id == user_id).all()
-    
-    if not projects:
-        return []
-    
-    # 一次性获取所有项目的账单数量（解决 N+1 问题）
-    project_ids = [p.id for p in projects]
-    bill_counts = db.query(
-        Bill.project_id,
-        func.count(Bill.id).label('count')
-    ).filter(
-        Bill.project_id.in_(project_ids)
-    ).group_by(Bill.project_id).all()
-    
-    # 构建 project_id -> count 映射
-    count_map = {project_id: count for project_id, count in bill_counts}
+    def cache_key(gen: Optional[int]) -> str:
+        return CacheKeys.project_list_key(user_id, gen or 0)
     
-    # 为每个项目设置账单数量
-    for project in projects:
-        project.bill_count = count_map.get(project.id, 0)
+    async def compute() -> bytes:
+        result = await db.execute(
+            select(Project).where(Project.user_id == user_id).order_by(Project.id)
+        )
+        return orjson.dumps([
+            ProjectResponse.model_validate(project).model_dump(mode="json")
+            for project in result.scalars().all()
+        ])
     
-    return projects
+    return await cache_get_or_compute_scoped(
+        CacheKeys.SCOPE_PROJECT, user_id, cache_key,
+        compute=compute,
+        ttl=300,
+    )
 
 
 def get_project_by_id(db: Session, project_id: int, user_id: int) -> Project:
@@ -123,32 +128,92 @@ def get_project_by_id(db: Session, project_id: int, user_id: int) -> Project:
     return project
 
 
-def get_project_with_bills(db: Session, project_id: int, user_id: int) -> Project:
+async def get_project_bills_page_async(
+    db: AsyncSession,
+    project_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Pagination.DEFAULT_LIMIT
+) -> dict:
+    """
+    游标分页获取项目下的账单（调用方负责校验项目归属）
+    
+    按 (date DESC, id DESC) 排序，条件只有 project_id，
+    直接走 idx_project_date_id 索引，每页开销与页码和项目总账单数无关
+    
+    Returns:
+        {"items", "page_size", "has_more", "next_cursor"}，可直接构造 PaginatedBillResponse
     """
-    获取项目详情，包含该项目下的所有账单
+    if limit < Pagination.MIN_LIMIT or limit > Pagination.MAX_LIMIT:
+        raise AppException(
+            message="无效的分页参数",
+            error_code="INVALID_PAGINATION"
+        )
+    
+    filters = [Bill.project_id == project_id]
+    seek = keyset_before(Bill.date, Bill.id, cursor)
+    if seek is not None:
+        filters.append(seek)
+    
+    # 多取一条用于判断是否还有下一页
+    result = await db.execute(
+        select(Bill)
+        .where(*filters)
+        .order_by(Bill.date.desc(), Bill.id.desc())
+        .limit(limit + 1)
+    )
+    bills = result.scalars().all()
+    
+    has_more = len(bills) > limit
+    items = bills[:limit]
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if has_more else None
+    
+    return {
+        "items": items,
+        "page_size": limit,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    }
+
+
+async def get_project_detail_async(
+    db: AsyncSession,
+    project_id: int,
+    user_id: int,
+    limit: int = Pagination.DEFAULT_LIMIT
+) -> dict:
+    """
+    获取项目详情：计数列中的汇总 + 第一页账单
+    
+    不再一次加载项目的全部账单，后续页通过 get_project_bills_page_async 按游标获取
     
     Args:
-        db: 数据库会话
+        db: 异步数据库会话
         project_id: 项目ID
         user_id: 用户ID
-        
+        limit: 第一页账单数
+    
     Returns:
-        包含账单列表的项目对象
-        
+        项目字段 + {"bills", "page_size", "has_more", "next_cursor"}，可直接构造 ProjectWithBills
+    
     Raises:
         NotFoundException: 项目不存在
     """
-    project = get_project_by_id(db, project_id, user_id)
-    
-    # 获取项目下的账单
-    bills = db.query(Bill).filter(
-        Bill.project_id == project_id
-    ).order_by(Bill.date.desc()).all()
-    
-    project.bills = bills
-    project.bill_count = len(bills)
+    result = await db.execute(
+        select(Project).where(Project.id == project_id, Project.user_id == user_id)
+    )
+    project = result.scalar_one_or_none()
+    if not project:
+        raise NotFoundException("项目", project_id)
     
-    return project
+    page = await get_project_bills_page_async(db, project_id, limit=limit)
+    detail = ProjectResponse.model_validate(project).model_dump()
+    detail.update(
+        bills=page["items"],
+        page_size=page["page_size"],
+        has_more=page["has_more"],
+        next_cursor=page["next_cursor"],
+    )
+    return detail
 
 
 def update_project(
@@ -181,41 +246,195 @@ def update_project(
     db.commit()
     db.refresh(db_project)
     
-    # 清除项目列表缓存
-    _invalidate_project_cache(user_id)
-    
-    # 添加账单计数
-    db_project.bill_count = _get_project_bill_count(db, project_id)
-    
     return db_project
 
 
-def delete_project(db: Session, project_id: int, user_id: int) -> dict:
+async def delete_project_async(
+    db: AsyncSession,
+    project_id: int,
+    user_id: int,
+    chunk_size: Optional[int] = None
+) -> dict:
     """
-    删除项目（项目下的账单会被一并删除）
+    删除项目（项目下的账单先存档到历史记录再一并删除）
+    
+    集合操作，不把账单加载进会话：每批按 id 升序取一段账单 id，
+    存档并删除其中仍属于该项目的账单（DELETE ... RETURNING，见 archive_and_delete_bills），
+    只按实际删除的行同步日汇总和项目计数后提交。选取 id 之后才移入项目的账单不在本批删除，
+    由后续批次处理，汇总不会漂移。5 万条账单的项目按默认批大小只需十批，每批事务较短，
+    不会长时间占用写锁
+    
+    最后一批与删除项目在同一事务中：先锁定项目行（SELECT ... FOR UPDATE），
+    再按项目删除剩余的全部账单（包括删除过程中新写入的），最后删除项目；
+    锁定之后的账单写入等待本事务结束，随后因项目已不存在被外键拒绝，不会留下孤儿账单。
+    存档的账单可通过恢复接口指定其他项目恢复
     
     Args:
-        db: 数据库会话
+        db: 异步数据库会话
         project_id: 项目ID
         user_id: 用户ID
-        
+        chunk_size: 每批账单数，默认 settings.PROJECT_DELETE_CHUNK_SIZE
+    
     Returns:
-        删除成功消息
-        
+        删除成功消息和删除（存档）的账单数
+    
     Raises:
         NotFoundException: 项目不存在
     """
-    db_project = get_project_by_id(db, project_id, user_id)
+    owned = (Project.id == project_id, Project.user_id == user_id)
+    result = await db.execute(select(Project.id).where(*owned))
+    if result.scalar_one_or_none() is None:
+        raise NotFoundException("项目", project_id)
     
-    db.delete(db_project)
-    db.commit()
+    chunk_size = chunk_size or settings.PROJECT_DELETE_CHUNK_SIZE
+    connection = await db.connection()
+    timezones = await connection.run_sync(load_user_timezones, [user_id])
+    
+    deleted = 0
+    while True:
+        result = await db.execute(
+            select(Bill.id).where(Bill.project_id == project_id).order_by(Bill.id).limit(chunk_size)
+        )
+        bill_ids = result.scalars().all()
+        last_chunk = len(bill_ids) < chunk_size
+        
+        if last_chunk:
+            # 锁定项目行并复查：并发删除同一项目时只有一个请求能完成
+            result = await db.execute(select(Project.id).where(*owned).with_for_update())
+            if result.scalar_one_or_none() is None:
+                await db.rollback()
+                raise NotFoundException("项目", project_id)
+            rows = await archive_and_delete_bills(db, Bill.project_id == project_id)
+        else:
+            rows = await archive_and_delete_bills(
+                db, Bill.id.in_(bill_ids), Bill.project_id == project_id
+            )
+        
+        if rows:
+            connection = await db.connection()
+            await connection.run_sync(apply_bill_changes, removed=rows, timezones=timezones)
+        if last_chunk:
+            await db.execute(delete(Project).where(Project.id == project_id))
+        await db.commit()
+        deleted += len(rows)
+        if last_chunk:
+            break
+    
+    logger.info(f"删除项目 {project_id}，存档并删除 {deleted} 条账单，用户: {user_id}")
+    return {"message": "项目删除成功", "deleted_bills": deleted}
+
+
+def compute_project_counters(connection: Connection, user_id: Optional[int] = None) -> dict:
+    """
+    从原始账单计算项目计数（一次按 project_id 分组的聚合）
+    
+    Returns:
+        {project_id: (笔数, 收入, 支出, 最新账单日期)}
+    """
+    query = select(
+        Bill.project_id,
+        func.count(Bill.id).label("bill_count"),
+        func.sum(case((Bill.bill_type == BillType.INCOME.value, Bill.amount), else_=0)).label("income"),
+        func.sum(case((Bill.bill_type == BillType.EXPENSE.value, Bill.amount), else_=0)).label("expense"),
+        func.max(Bill.date).label("last_bill_at"),
+    ).where(Bill.project_id.isnot(None)).group_by(Bill.project_id)
+    if user_id is not None:
+        query = query.where(Bill.user_id == user_id)
+    return {
+        row.project_id: (row.bill_count, float(row.income or 0), float(row.expense or 0), row.last_bill_at)
+        for row in connection.execute(query)
+    }
+
+
+def _same_time(a, b) -> bool:
+    return from_utc_to_local(a, timezone.utc) == from_utc_to_local(b, timezone.utc)
+
+
+def reconcile_project_counters(
+    connection: Connection,
+    user_id: Optional[int] = None,
+    dry_run: bool = False
+) -> List[dict]:
+    """
+    校验并修正项目计数列（在调用方事务中执行）
+    
+    Args:
+        connection: 数据库连接
+        user_id: 只处理指定用户的项目
+        dry_run: 只报告不一致，不写入
+    
+    Returns:
+        不一致项列表，每项包含 project_id、expected、actual
+    """
+    expected = compute_project_counters(connection, user_id)
+    
+    query = select(
+        Project.id, Project.bill_count, Project.total_income,
+        Project.total_expense, Project.last_bill_at
+    )
+    if user_id is not None:
+        query = query.where(Project.user_id == user_id)
+    
+    mismatches = []
+    for row in connection.execute(query):
+        exp = expected.get(row.id, (0, 0.0, 0.0, None))
+        act = (row.bill_count, row.total_income, row.total_expense, row.last_bill_at)
+        if (
+            exp[0] != act[0]
+            or abs(exp[1] - (act[1] or 0)) > _TOLERANCE
+            or abs(exp[2] - (act[2] or 0)) > _TOLERANCE
+            or not _same_time(exp[3], act[3])
+        ):
+            mismatches.append({"project_id": row.id, "expected": exp, "actual": act})
+    
+    if mismatches and not dry_run:
+        table = Project.__table__
+        connection.execute(
+            update(table).where(table.c.id == bindparam("pid")).values(
+                bill_count=bindparam("count"),
+                total_income=bindparam("income"),
+                total_expense=bindparam("expense"),
+                last_bill_at=bindparam("latest"),
+                updated_at=table.c.updated_at,
+            ),
+            [
+                {
+                    "pid": item["project_id"], "count": item["expected"][0],
+                    "income": item["expected"][1], "expense": item["expected"][2],
+                    "latest": item["expected"][3],
+                }
+                for item in mismatches
+            ],
+        )
+    return mismatches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    from db.database import engine
+    import models  # noqa: F401  确保所有表已注册
+    
+    parser = argparse.ArgumentParser(description="项目计数列维护")
+    parser.add_argument("command", choices=["reconcile"], help="reconcile: 校验并修正计数列")
+    parser.add_argument("--user-id", type=int, default=None, help="只处理指定用户")
+    parser.add_argument("--dry-run", action="store_true", help="只报告不一致，不写入")
+    args = parser.parse_args(argv)
     
-    # 清除项目列表缓存
-    _invalidate_project_cache(user_id)
+    logging.basicConfig(level=logging.INFO)
     
-    return {"message": "项目删除成功"}
+    with engine.begin() as conn:
+        mismatches = reconcile_project_counters(conn, args.user_id, dry_run=args.dry_run)
+    for item in mismatches[:50]:
+        logger.warning(f"不一致: 项目 {item['project_id']} 期望={item['expected']} 实际={item['actual']}")
+    if not mismatches:
+        logger.info("项目计数校验通过")
+    elif args.dry_run:
+        logger.error(f"项目计数校验失败：{len(mismatches)} 个项目不一致，请执行 reconcile")
+        return 1
+    else:
+        logger.info(f"已修正 {len(mismatches)} 个项目的计数")
+    return 0
 
 
-def _get_project_bill_count(db: Session, project_id: int) -> int:
-    """获取项目下的账单数量"""
-    return db.query(Bill).filter(Bill.project_id == project_id).count()
+if __name__ == "__main__":
+    sys.exit(main())
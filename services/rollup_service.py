@@ -0,0 +1,161 @@
+"""
+账单日汇总服务
+
+提供日汇总表（bill_daily_rollups）的重建与校验：
+- rebuild: 按原始账单重新计算汇总行（全部用户或指定用户）
+- verify: 对比汇总表与原始账单，报告不一致的汇总行
+
+命令行用法：
+    python -m services.rollup_service rebuild [--user-id N]
+    python -m services.rollup_service verify [--user-id N]
+"""
+import sys
+from pathlib import Path
+
+# 以脚本方式运行时添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import logging
+from typing import Dict, List, Optional
+from sqlalchemy import select, delete, insert
+from sqlalchemy.engine import Connection
+from models.bill import Bill
+from models.rollup import (
+    BillDailyRollup, RollupKey, _rollup_key, load_user_timezones
+)
+
+logger = logging.getLogger(__name__)
+
+# 浮点累加误差容忍度
+_TOLERANCE = 1e-6
+
+# 逐批读取原始账单，避免一次性加载全部数据
+_SCAN_BATCH_SIZE = 5000
+
+
+def compute_rollups(connection: Connection, user_id: Optional[int] = None) -> Dict[RollupKey, list]:
+    """
+    从原始账单计算汇总值
+
+    Returns:
+        {汇总 key: [金额, 工时, 笔数]}
+    """
+    query = select(
+        Bill.user_id, Bill.project_id, Bill.date, Bill.bill_type,
+        Bill.category, Bill.name, Bill.amount, Bill.duration_hours
+    )
+    if user_id is not None:
+        query = query.where(Bill.user_id == user_id)
+
+    timezones = {}
+    totals: Dict[RollupKey, list] = {}
+    result = connection.execution_options(yield_per=_SCAN_BATCH_SIZE).execute(query)
+    for rows in result.partitions():
+        missing = {row.user_id for row in rows} - timezones.keys()
+        if missing:
+            timezones.update(load_user_timezones(connection, missing))
+        for row in rows:
+            total = totals.setdefault(_rollup_key(row, timezones[row.user_id]), [0.0, 0.0, 0])
+            total[0] += row.amount or 0
+            total[1] += row.duration_hours or 0
+            total[2] += 1
+    return totals
+
+
+def _load_rollups(connection: Connection, user_id: Optional[int] = None) -> Dict[RollupKey, list]:
+    """读取汇总表现有数据"""
+    query = select(BillDailyRollup)
+    if user_id is not None:
+        query = query.where(BillDailyRollup.user_id == user_id)
+    rows = connection.execute(query).all()
+    return {
+        (r.user_id, r.project_id, r.local_date, r.bill_type, r.category, r.name):
+            [r.total_amount, r.total_hours, r.bill_count]
+        for r in rows
+    }
+
+
+def rebuild_rollups(connection: Connection, user_id: Optional[int] = None) -> int:
+    """
+    重建日汇总（在调用方事务中执行）
+
+    用于首次部署、用户修改时区、或 verify 发现不一致之后
+
+    Returns:
+        写入的汇总行数
+    """
+    totals = compute_rollups(connection, user_id)
+
+    clear = delete(BillDailyRollup)
+    if user_id is not None:
+        clear = clear.where(BillDailyRollup.user_id == user_id)
+    connection.execute(clear)
+
+    params = [
+        {
+            "user_id": key[0], "project_id": key[1], "local_date": key[2],
+            "bill_type": key[3], "category": key[4], "name": key[5],
+            "total_amount": amount, "total_hours": hours, "bill_count": count,
+        }
+        for key, (amount, hours, count) in totals.items()
+    ]
+    if params:
+        connection.execute(insert(BillDailyRollup), params)
+    return len(params)
+
+
+def verify_rollups(connection: Connection, user_id: Optional[int] = None) -> List[dict]:
+    """
+    校验日汇总与原始账单是否一致
+
+    Returns:
+        不一致项列表，每项包含 key、expected、actual
+    """
+    expected = compute_rollups(connection, user_id)
+    actual = _load_rollups(connection, user_id)
+
+    mismatches = []
+    for key in expected.keys() | actual.keys():
+        exp = expected.get(key, [0.0, 0.0, 0])
+        act = actual.get(key, [0.0, 0.0, 0])
+        if (
+            exp[2] != act[2]
+            or abs(exp[0] - act[0]) > _TOLERANCE
+            or abs(exp[1] - act[1]) > _TOLERANCE
+        ):
+            mismatches.append({"key": key, "expected": exp, "actual": act})
+    return mismatches
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    from db.database import engine, Base
+    import models  # noqa: F401  确保所有表已注册
+
+    parser = argparse.ArgumentParser(description="账单日汇总表维护")
+    parser.add_argument("command", choices=["rebuild", "verify"], help="rebuild: 重建; verify: 校验")
+    parser.add_argument("--user-id", type=int, default=None, help="只处理指定用户")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine, tables=[BillDailyRollup.__table__])
+
+    with engine.begin() as conn:
+        if args.command == "rebuild":
+            count = rebuild_rollups(conn, args.user_id)
+            logger.info(f"日汇总重建完成：{count} 行")
+            return 0
+
+        mismatches = verify_rollups(conn, args.user_id)
+        for item in mismatches[:50]:
+            logger.warning(f"不一致: {item['key']} 期望={item['expected']} 实际={item['actual']}")
+        if mismatches:
+            logger.error(f"日汇总校验失败：{len(mismatches)} 行不一致，请执行 rebuild")
+            return 1
+        logger.info("日汇总校验通过")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
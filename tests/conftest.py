@@ -3,29 +3,54 @@ Pytest 配置文件
 
 提供测试用的 fixtures
 """
+import os
+import tempfile
+
+# 测试环境：启用调试模式（允许开发密钥），应用数据库指向临时目录
+_TEST_DIR = tempfile.mkdtemp(prefix="bill_test_")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("SQLITE_PATH", os.path.join(_TEST_DIR, "app.db"))
+# 测试使用最低 bcrypt 成本因子，避免哈希拖慢测试
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "2")
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, StaticPool
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 from datetime import datetime, timezone
 
 from db.database import Base, get_db
+from db.async_database import get_async_db
 from models.user import User
 from models.bill import Bill, BillHistory
 from models.project import Project
 
 
-# 使用共享内存数据库进行测试（StaticPool 确保连接共享）
-TEST_DATABASE_URL = "sqlite:///:memory:"
+# 使用临时文件数据库进行测试（同步与异步引擎需要共享同一份数据）
+TEST_DB_PATH = os.path.join(_TEST_DIR, "test.db")
+TEST_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
+TEST_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DB_PATH}"
 
 test_engine = create_engine(
     TEST_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,  # 使用静态连接池确保所有连接共享同一个内存数据库
 )
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
+test_async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=test_async_engine,
+    class_=AsyncSession,
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 
 @pytest.fixture(scope="function")
 def db():
@@ -47,14 +72,23 @@ def client(db):
     # 延迟导入 app 避免在导入时触发数据库初始化
     from main import app
     from utils.rate_limit import rate_limiter
+    from utils.cache import _memory_cache
+    from utils.jwt import _revoked_epochs
     
-    # 清除速率限制器状态
+    # 清除速率限制器、缓存和令牌吊销状态（各测试的用户ID会重复）
     rate_limiter._requests.clear()
+    _memory_cache.clear()
+    _revoked_epochs.clear()
     
     def override_get_db():
         yield db
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+    
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     
     with TestClient(app) as test_client:
         yield test_client
@@ -62,6 +96,8 @@ def client(db):
     app.dependency_overrides.clear()
     # 测试后再次清除
     rate_limiter._requests.clear()
+    _memory_cache.clear()
+    _revoked_epochs.clear()
 
 
 @pytest.fixture
@@ -109,7 +145,7 @@ def test_project(db, test_user):
 
 
 @pytest.fixture
-def sample_bill_data(test_projecttest_project):
+def sample_bill_data(test_project):
     """示例账单数据（用于 API 请求）"""
     return {
         "name": "张师傅工作",
@@ -0,0 +1,114 @@
+"""
+重接口准入控制测试
+
+测试加权公平排队、排队上限/超时以及按用户的成本预算
+"""
+import asyncio
+import pytest
+from fastapi import status
+
+
+# API 路径前缀
+API_PREFIX = "/api/v1"
+
+
+@pytest.mark.unit
+class TestFairAdmission:
+    """加权公平排队测试"""
+    
+    async def test_fair_order_across_users(self):
+        """测试名额空出时按虚拟完成时间放行：连发请求的用户排在其他用户之后"""
+        from utils.admission import FairAdmission
+        gate = FairAdmission(max_concurrent=1, per_user_concurrent=1, per_user_queue=5)
+        assert await gate.acquire(1, cost=1, timeout=1) == 0.0
+        
+        order = []
+        
+        async def request(user_id, cost):
+            await gate.acquire(user_id, cost, timeout=1)
+            order.append(user_id)
+            gate.release(user_id)
+        
+        # 用户 1 先排了两个重请求，用户 2 随后排一个轻请求
+        tasks = [asyncio.create_task(request(1, 4)), asyncio.create_task(request(1, 4))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request(2, 1)))
+        await asyncio.sleep(0)
+        assert gate.queued == 3
+        
+        gate.release(1)
+        await asyncio.gather(*tasks)
+        assert order == [2, 1, 1]
+        assert gate.running == 0
+        assert gate._user_finish == {}
+    
+    async def test_per_user_concurrency(self):
+        """测试单个用户并发已满时排队，其他用户不受影响"""
+        from utils.admission import FairAdmission
+        gate = FairAdmission(max_concurrent=3, per_user_concurrent=1, per_user_queue=5)
+        await gate.acquire(1, cost=1, timeout=1)
+        
+        waiter = asyncio.create_task(gate.acquire(1, cost=1, timeout=1))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert await gate.acquire(2, cost=1, timeout=1) == 0.0
+        
+        gate.release(1)
+        assert await waiter > 0
+        assert gate.running == 2
+    
+    async def test_queue_full_and_timeout(self):
+        """测试排队数已满立即拒绝，排队超时后拒绝且不占用名额"""
+        from utils.admission import FairAdmission, AdmissionRejected
+        gate = FairAdmission(max_concurrent=1, per_user_concurrent=1, per_user_queue=1)
+        await gate.acquire(1, cost=1, timeout=1)
+        
+        waiter = asyncio.create_task(gate.acquire(2, cost=1, timeout=0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            await gate.acquire(2, cost=1, timeout=1)
+        assert exc.value.reason == "queue_full"
+        
+        with pytest.raises(AdmissionRejected) as exc:
+            await waiter
+        assert exc.value.reason == "timeout"
+        
+        gate.release(1)
+        assert gate.running == 0
+        assert gate.queued == 0
+
+
+@pytest.mark.unit
+class TestHeavyRouteAdmission:
+    """重接口准入依赖测试"""
+    
+    def test_cost_budget_exhausted(self, client, test_auth_headers, monkeypatch):
+        """测试成本预算用尽后返回 429，并记录到监控"""
+        from config import settings
+        from utils.performance import monitor
+        monkeypatch.setattr(settings, "HEAVY_USER_COST_PER_MINUTE", 10)
+        
+        # 导出成本 8：第一次放行，第二次超出预算
+        response = client.get(f"{API_PREFIX}/bills/export", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        response = client.get(f"{API_PREFIX}/bills/export", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert "Retry-After" in response.headers
+        
+        # 各重接口共用同一预算，剩余的 2 仍够一次月度统计
+        response = client.get(f"{API_PREFIX}/bills/statistics/monthly", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        stats = monitor.get_stats()["admission"]
+        assert stats["bills:export"]["rejected"]["budget"] >= 1
+        assert stats["bills:export"]["admitted"] >= 1
+    
+    def test_slot_released_after_request(self, client, test_auth_headers):
+        """测试请求结束后归还执行名额"""
+        from utils.admission import heavy_admission
+        for _ in range(3):
+            response = client.get(f"{API_PREFIX}/bills/statistics/category", headers=test_auth_headers)
+            assert response.status_code == status.HTTP_200_OK
+        assert heavy_admission.running == 0
+        assert heavy_admission.queued == 0
@@ -117,6 +117,24 @@ class TestAuth:
         assert "username" in data
         assert "email" in data
     
+    def test_current_user_cache_refreshed_after_timezone_update(self, client, test_auth_headers):
+        """测试用户信息走共享缓存，修改时区后缓存失效"""
+        first = client.get(f"{API_PREFIX}/auth/me", headers=test_auth_headers)
+        assert first.json()["tz_offset_minutes"] != 540
+        
+        response = client.put(
+            f"{API_PREFIX}/auth/me/timezone",
+            json={"tz_offset_minutes": 540},
+            headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        
+        # 时区写在令牌声明中：旧令牌被吊销，使用重新签发的令牌
+        assert client.get(f"{API_PREFIX}/auth/me", headers=test_auth_headers).status_code == status.HTTP_401_UNAUTHORIZED
+        new_headers = {"Authorization": f"Bearer {response.headers['X-Access-Token']}"}
+        second = client.get(f"{API_PREFIX}/auth/me", headers=new_headers)
+        assert second.json()["tz_offset_minutes"] == 540
+    
     def test_get_current_user_without_token(self, client):
         """测试未认证获取用户失败"""
         response = client.get(f"{API_PREFIX}/auth/me")
@@ -128,4 +146,210 @@ class TestAuth:
             f"{API_PREFIX}/auth/me",
             headers={"Authorization": "Bearer invalid_token"}
         )
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.unit
+class TestPasswordHashing:
+    """密码哈希进程池与登录保护测试"""
+    
+    def test_unknown_username_negative_cached(self, client):
+        """测试未知用户名被负缓存，注册后可立即登录"""
+        from utils.performance import monitor
+        payload = {"username": "ghost", "password": "Test@123"}
+        before = monitor.get_stats()["password_hash"]["negative_cache_hits"]
+        
+        assert client.post(f"{API_PREFIX}/auth/login", json=payload).status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.post(f"{API_PREFIX}/auth/login", json=payload).status_code == status.HTTP_401_UNAUTHORIZED
+        assert monitor.get_stats()["password_hash"]["negative_cache_hits"] == before + 1
+        
+        client.post(
+            f"{API_PREFIX}/auth/register",
+            json={"username": "ghost", "email": "ghost@example.com", "password": "Test@123"}
+        )
+        assert client.post(f"{API_PREFIX}/auth/login", json=payload).status_code == status.HTTP_200_OK
+    
+    def test_login_rejected_when_pool_saturated(self, client, test_user, monkeypatch):
+        """测试进程池排队已满时快速返回 503"""
+        from config import settings
+        monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 0)
+        
+        response = client.post(
+            f"{API_PREFIX}/auth/login",
+            json={"username": test_user.username, "password": "Test@123"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+        assert response.json()["error"]["code"] == "SERVICE_UNAVAILABLE"
+    
+    def test_login_recovers_from_broken_pool(self, client, test_user):
+        """测试哈希工作进程被杀后进程池重建，登录不会一直失败"""
+        from utils import password_hasher
+        from utils.performance import monitor
+        payload = {"username": test_user.username, "password": "Test@123"}
+        assert client.post(f"{API_PREFIX}/auth/login", json=payload).status_code == status.HTTP_200_OK
+        
+        rebuilt = monitor.get_stats()["password_hash"]["pool_rebuilt"]
+        broken = password_hasher._executor
+        for process in list(broken._processes.values()):
+            process.kill()
+            process.join()
+        
+        assert client.post(f"{API_PREFIX}/auth/login", json=payload).status_code == status.HTTP_200_OK
+        assert password_hasher._executor is not broken
+        assert monitor.get_stats()["password_hash"]["pool_rebuilt"] == rebuilt + 1
+    
+    def test_login_upgrades_cost_factor(self, client, db, test_user, monkeypatch):
+        """测试登录成功时升级低成本因子的哈希"""
+        from config import settings
+        from utils.password_hasher import hash_rounds
+        monkeypatch.setattr(settings, "BCRYPT_ROUNDS", hash_rounds(test_user.hashed_password) + 1)
+        
+        response = client.post(
+            f"{API_PREFIX}/auth/login",
+            json={"username": test_user.username, "password": "Test@123"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        
+        db.refresh(test_user)
+        assert hash_rounds(test_user.hashed_password) == settings.BCRYPT_ROUNDS
+        # 升级后的哈希仍可登录
+        response = client.post(
+            f"{API_PREFIX}/auth/login",
+            json={"username": test_user.username, "password": "Test@123"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.unit
+class TestTokenClaims:
+    """令牌声明与吊销测试"""
+    
+    def _login(self, client, username="testuser"):
+        response = client.post(
+            f"{API_PREFIX}/auth/login",
+            json={"username": username, "password": "Test@123"}
+        )
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    
+    def test_token_carries_principal_claims(self, client, test_user, test_auth_headers):
+        """测试令牌携带 uid/fid/epoch 声明"""
+        from jose import jwt
+        from config import settings
+        token = test_auth_headers["Authorization"].split()[1]
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        assert claims["uid"] == test_user.id
+        assert claims["fid"] is None
+        assert claims["epoch"] == 0
+    
+    def test_logout_all_revokes_existing_tokens(self, client, test_user):
+        """测试登出全部设备后所有旧令牌失效，重新登录可用"""
+        first = self._login(client)
+        second = self._login(client)
+        
+        assert client.post(f"{API_PREFIX}/auth/logout-all", headers=first).status_code == status.HTTP_200_OK
+        assert client.get(f"{API_PREFIX}/projects/", headers=first).status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get(f"{API_PREFIX}/projects/", headers=second).status_code == status.HTTP_401_UNAUTHORIZED
+        
+        fresh = self._login(client)
+        assert client.get(f"{API_PREFIX}/projects/", headers=fresh).status_code == status.HTTP_200_OK
+    
+    def test_revocation_without_redis_checks_db(self, client, test_user):
+        """测试未配置 Redis 时，吊销集合丢失（其他 worker、重启后）旧令牌仍按数据库 epoch 失效"""
+        from utils.jwt import _revoked_epochs
+        headers = self._login(client)
+        
+        assert client.post(f"{API_PREFIX}/auth/logout-all", headers=headers).status_code == status.HTTP_200_OK
+        _revoked_epochs.clear()
+        assert client.get(f"{API_PREFIX}/projects/", headers=headers).status_code == status.HTTP_401_UNAUTHORIZED
+        
+        fresh = self._login(client)
+        assert client.get(f"{API_PREFIX}/projects/", headers=fresh).status_code == status.HTTP_200_OK
+    
+    def test_family_change_reissues_token(self, client, test_user, test_auth_headers):
+        """测试创建家庭后旧令牌失效，新令牌携带 fid"""
+        from jose import jwt
+        from config import settings
+        response = client.post(f"{API_PREFIX}/family/", json={"name": "测试家庭"}, headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        token = response.headers["X-Access-Token"]
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        assert claims["fid"] == response.json()["id"]
+        assert claims["epoch"] == 1
+        assert client.get(f"{API_PREFIX}/family/", headers=test_auth_headers).status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get(
+            f"{API_PREFIX}/family/", headers={"Authorization": f"Bearer {token}"}
+        ).status_code == status.HTTP_200_OK
+    
+    def test_revocation_broadcast_from_other_worker(self):
+        """测试其他 worker 广播的吊销（JSON 字符串 key）合并到本进程，且不回退"""
+        import time
+        from utils.jwt import _apply_revocations, _revoked_epochs, is_token_revoked
+        expires_at = time.time() + 60
+        _apply_revocations({"9301": [3, expires_at]})
+        _apply_revocations({"9301": [2, expires_at]})
+        
+        assert is_token_revoked(9301, 2)
+        assert not is_token_revoked(9301, 3)
+        assert not is_token_revoked(9302, 0)
+        _revoked_epochs.pop(9301)
+
+
+@pytest.mark.unit
+class TestRefreshToken:
+    """刷新令牌测试"""
+    
+    def _login(self, client, test_user):
+        response = client.post(
+            f"{API_PREFIX}/auth/login",
+            json={"username": test_user.username, "password": "Test@123"}
+        )
+        return response.json()
+    
+    def test_refresh_rotates_token(self, client, db, test_user):
+        """测试刷新返回新的访问令牌和刷新令牌，服务端只保存摘要"""
+        from models.refresh_token import RefreshToken
+        tokens = self._login(client, test_user)
+        assert tokens["refresh_token"]
+        
+        response = client.post(f"{API_PREFIX}/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert response.status_code == status.HTTP_200_OK
+        rotated = response.json()
+        assert rotated["refresh_token"] != tokens["refresh_token"]
+        assert client.get(
+            f"{API_PREFIX}/projects/", headers={"Authorization": f"Bearer {rotated['access_token']}"}
+        ).status_code == status.HTTP_200_OK
+        
+        stored = {t.token_hash for t in db.query(RefreshToken).all()}
+        assert len(stored) == 2
+        assert tokens["refresh_token"] not in stored
+    
+    def test_refresh_reuse_revokes_chain(self, client, test_user):
+        """测试重放已轮换的刷新令牌会吊销整条链和已签发的访问令牌"""
+        tokens = self._login(client, test_user)
+        rotated = client.post(f"{API_PREFIX}/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+        
+        reuse = client.post(f"{API_PREFIX}/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert reuse.status_code == status.HTTP_401_UNAUTHORIZED
+        # 合法持有者手中的新令牌也随链一起失效
+        assert client.post(
+            f"{API_PREFIX}/auth/refresh", json={"refresh_token": rotated["refresh_token"]}
+        ).status_code == status.HTTP_401_UNAUTHORIZED
+        assert client.get(
+            f"{API_PREFIX}/projects/", headers={"Authorization": f"Bearer {rotated['access_token']}"}
+        ).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_logout_all_revokes_refresh_tokens(self, client, test_user):
+        """测试登出全部设备后刷新令牌失效"""
+        tokens = self._login(client, test_user)
+        client.post(
+            f"{API_PREFIX}/auth/logout-all", headers={"Authorization": f"Bearer {tokens['access_token']}"}
+        )
+        assert client.post(
+            f"{API_PREFIX}/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        ).status_code == status.HTTP_401_UNAUTHORIZED
+    
+    def test_refresh_unknown_token(self, client):
+        """测试未知刷新令牌返回 401"""
+        response = client.post(f"{API_PREFIX}/auth/refresh", json={"refresh_token": "not-a-token"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -135,6 +135,17 @@ class TestBills:
         assert len(data) > 0
         assert data[0]["name"] == sample_bill.name
     
+    def test_statistics_reject_out_of_range_year(self, client, test_auth_headers):
+        """测试边界年份按参数错误拒绝，而不是计算区间时溢出"""
+        for query in ("date=9999-12-31", "month=9999-12", "month=0001-01",
+                      "start_date=2024-01-01&end_date=9999-12-31"):
+            response = client.get(
+                f"{API_PREFIX}/bills/statistics/monthly?{query}",
+                headers=test_auth_headers
+            )
+            assert response.status_code == status.HTTP_400_BAD_REQUEST, query
+            assert response.json()["error"]["code"] == "DATE_OUT_OF_RANGE"
+    
     def test_get_bill_history(self, client, test_auth_headers, sample_bill):
         """测试获取账单历史"""
         # 先更新账单以创建历史记录
@@ -222,4 +233,457 @@ class TestBills:
             f"{API_PREFIX}/bills/{bill.id}",
             headers={"Authorization": f"Bearer {token}"}
         )
-        assert response.status_code == status.HTTP_404_NOT_FOUND
\ No newline at end of file
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_get_bills_page_cursor(self, client, db, test_auth_headers, test_user, test_project):
+        """测试游标分页遍历全部账单且不重复"""
+        base = datetime(2025, 6, 1, 8, 0, tzinfo=timezone.utc)
+        for i in range(5):
+            db.add(Bill(
+                name=f"工人{i}",
+                amount=10.0 + i,
+                bill_type="expense",
+                category="人工",
+                # 两条账单日期相同，验证 id 作为次级排序键
+                date=base.replace(day=1 + min(i, 3)),
+                user_id=test_user.id,
+                project_id=test_project.id
+            ))
+        db.commit()
+        
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(
+                f"{API_PREFIX}/bills/page",
+                params=params,
+                headers=test_auth_headers
+            )
+            assert response.status_code == status.HTTP_200_OK
+            data = response.json()
+            assert len(data["items"]) <= 2
+            seen.extend(item["id"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if not data["has_more"]:
+                assert cursor is None
+                break
+        
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+    
+    def test_get_bills_page_invalid_cursor(self, client, test_auth_headers):
+        """测试无效游标"""
+        response = client.get(
+            f"{API_PREFIX}/bills/page?cursor=not-a-cursor",
+            headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_monthly_statistics_uses_user_timezone(self, client, db, test_auth_headers, test_user, test_project):
+        """测试月份按用户时区划分（UTC 6月30日20点 = 东八区7月1日）"""
+        db.add(Bill(
+            name="跨月账单",
+            amount=50.0,
+            bill_type="expense",
+            category="人工",
+            date=datetime(2025, 6, 30, 20, 0, tzinfo=timezone.utc),
+            user_id=test_user.id,
+            project_id=test_project.id
+        ))
+        db.commit()
+        # 时区写在令牌声明中，修改后改用重新签发的令牌
+        headers = dict(test_auth_headers)
+        
+        def expense(month):
+            response = client.get(
+                f"{API_PREFIX}/bills/statistics/monthly?month={month}",
+                headers=headers
+            )
+            assert response.status_code == status.HTTP_200_OK
+            return response.json()["total_expense"]
+        
+        response = client.put(
+            f"{API_PREFIX}/auth/me/timezone",
+            json={"tz_offset_minutes": 480},
+            headers=headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        headers["Authorization"] = f"Bearer {response.headers['X-Access-Token']}"
+        assert expense("2025-07") == 50.0
+        assert expense("2025-06") == 0
+        
+        response = client.put(
+            f"{API_PREFIX}/auth/me/timezone",
+            json={"tz_offset_minutes": 0},
+            headers=headers
+        )
+        assert response.json()["tz_offset_minutes"] == 0
+        headers["Authorization"] = f"Bearer {response.headers['X-Access-Token']}"
+        assert expense("2025-06") == 50.0
+        assert expense("2025-07") == 0
+    
+    def test_statistics_stale_while_revalidate(self, client, test_auth_headers, sample_bill_data):
+        """测试写入后统计先返回旧值（带 X-Cache-Stale 头），后台重算后返回新值"""
+        import time
+        month = sample_bill_data["date"][:7]
+        url = f"{API_PREFIX}/bills/statistics/monthly?month={month}"
+        
+        client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+        first = client.get(url, headers=test_auth_headers)
+        assert "X-Cache-Stale" not in first.headers
+        
+        client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+        stale = client.get(url, headers=test_auth_headers)
+        assert stale.headers["X-Cache-Stale"] == "true"
+        assert stale.json()["total_expense"] == first.json()["total_expense"]
+        
+        for _ in range(50):
+            fresh = client.get(url, headers=test_auth_headers)
+            if "X-Cache-Stale" not in fresh.headers:
+                break
+            time.sleep(0.02)
+        assert "X-Cache-Stale" not in fresh.headers
+        assert fresh.json()["total_expense"] == first.json()["total_expense"] * 2
+    
+    def test_rollups_consistent_after_writes(self, client, db, test_auth_headers, sample_bill_data):
+        """测试各写入路径后日汇总与原始账单一致"""
+        from services.rollup_service import verify_rollups
+        
+        created = client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers).json()
+        batch = client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [dict(sample_bill_data, name=f"批量{i}", amount=10.0 * (i + 1)) for i in range(3)]},
+            headers=test_auth_headers
+        )
+        assert batch.status_code == status.HTTP_200_OK
+        client.put(
+            f"{API_PREFIX}/bills/{created['id']}",
+            json={"amount": 999.0, "category": "材料", "bill_type": "income"},
+            headers=test_auth_headers
+        )
+        history_id = client.get(
+            f"{API_PREFIX}/bills/{created['id']}/history", headers=test_auth_headers
+        ).json()[0]["id"]
+        client.delete(f"{API_PREFIX}/bills/{created['id']}", headers=test_auth_headers)
+        client.post(f"{API_PREFIX}/bills/history/{history_id}/restore", headers=test_auth_headers)
+        
+        bills = client.get(f"{API_PREFIX}/bills/", headers=test_auth_headers).json()
+        response = client.request(
+            "DELETE", f"{API_PREFIX}/bills/batch",
+            json={"bill_ids": [b["id"] for b in bills[:2]]},
+            headers=test_auth_headers
+        )
+        assert response.json()["count"] == 2
+        
+        db.expire_all()
+        assert verify_rollups(db.connection()) == []
+        
+        remaining = client.get(f"{API_PREFIX}/bills/", headers=test_auth_headers).json()
+        stats = client.get(f"{API_PREFIX}/bills/statistics/monthly", headers=test_auth_headers).json()
+        expected_expense = sum(b["amount"] for b in remaining if b["bill_type"] == "expense")
+        assert abs(stats["total_expense"] - expected_expense) < 1e-6
+
+
+@pytest.mark.unit
+class TestBillBatchCreate:
+    """批量创建账单测试"""
+    
+    def test_chunked_insert_returning(self, client, db, test_auth_headers, test_project, sample_bill_data, monkeypatch):
+        """测试按批一条 INSERT ... RETURNING 写入，不再逐条查询，日汇总和项目计数一致"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from config import settings
+        from services.rollup_service import verify_rollups
+        from services.project_service import reconcile_project_counters
+        
+        monkeypatch.setattr(settings, "BILL_BATCH_CHUNK_SIZE", 4)
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            response = client.post(
+                f"{API_PREFIX}/bills/batch",
+                json={"bills": [dict(sample_bill_data, name=f"批量{i}", amount=i + 1.0) for i in range(10)]},
+                headers=test_auth_headers
+            )
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["count"] == 10
+        
+        assert sum(s.startswith("INSERT INTO bills") for s in statements) == 3
+        assert not any(s.startswith("SELECT bills.") and "WHERE bills.id = ?" in s for s in statements)
+        
+        db.expire_all()
+        assert db.query(Bill).filter(Bill.project_id == test_project.id).count() == 10
+        assert verify_rollups(db.connection()) == []
+        assert reconcile_project_counters(db.connection(), dry_run=True) == []
+    
+    def test_partial_failure_invalidates_cache(self, client, db, test_auth_headers, sample_bill_data, monkeypatch):
+        """测试中途某一批失败时，已提交的批次保留且项目列表等缓存失效"""
+        from sqlalchemy.exc import OperationalError
+        from config import settings
+        import services.async_bill_service as bill_service
+        
+        projects_url = f"{API_PREFIX}/projects/"
+        assert client.get(projects_url, headers=test_auth_headers).json()[0]["bill_count"] == 0
+        
+        original = bill_service.apply_bill_changes
+        calls = []
+        
+        def fail_second_chunk(connection, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise OperationalError("INSERT", {}, Exception("磁盘已满"))
+            return original(connection, *args, **kwargs)
+        
+        monkeypatch.setattr(settings, "BILL_BATCH_CHUNK_SIZE", 2)
+        monkeypatch.setattr(bill_service, "apply_bill_changes", fail_second_chunk)
+        response = client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [dict(sample_bill_data, amount=10.0) for _ in range(4)]},
+            headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert db.query(Bill).count() == 2
+        assert client.get(projects_url, headers=test_auth_headers).json()[0]["bill_count"] == 2
+    
+    def test_foreign_project_rejected_before_insert(self, client, db, test_auth_headers, sample_bill_data):
+        """测试批次中有不属于自己的项目时整批拒绝，不写入任何账单"""
+        bills = [sample_bill_data, dict(sample_bill_data, project_id=9999)]
+        response = client.post(f"{API_PREFIX}/bills/batch", json={"bills": bills}, headers=test_auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert db.query(Bill).count() == 0
+
+
+@pytest.mark.unit
+class TestBillImport:
+    """账单流式导入测试"""
+    
+    def test_csv_roundtrip_in_chunks(self, client, db, test_auth_headers, test_project, sample_bill_data, monkeypatch):
+        """测试导出的 CSV 可原样导入：按批写入，日汇总和项目计数一致"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from config import settings
+        from services.rollup_service import verify_rollups
+        from services.project_service import reconcile_project_counters
+        
+        client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [
+                dict(sample_bill_data, name=f"导出{i}", amount=i + 1.0, note="含,逗号\n和换行" if i == 0 else None)
+                for i in range(5)
+            ]},
+            headers=test_auth_headers
+        )
+        exported = client.get(f"{API_PREFIX}/bills/export", headers=test_auth_headers).content
+        
+        monkeypatch.setattr(settings, "BILL_IMPORT_CHUNK_SIZE", 2)
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            response = client.post(
+                f"{API_PREFIX}/bills/import?project_id={test_project.id}",
+                content=exported, headers=dict(test_auth_headers, **{"Content-Type": "text/csv"})
+            )
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"imported": 5, "failed": 0, "errors": []}
+        assert sum(s.startswith("INSERT INTO bills") for s in statements) == 3
+        
+        db.expire_all()
+        imported = db.query(Bill).filter(Bill.name == "导出0").order_by(Bill.id).all()
+        assert len(imported) == 2
+        assert imported[1].note == imported[0].note == "含,逗号\n和换行"
+        # 导出精确到秒
+        assert imported[1].date == imported[0].date.replace(microsecond=0)
+        assert verify_rollups(db.connection()) == []
+        assert reconcile_project_counters(db.connection(), dry_run=True) == []
+    
+    def test_ndjson_reports_row_errors(self, client, db, test_auth_headers, test_project, sample_bill_data):
+        """测试 NDJSON 中无效行跳过并返回行号，其余行照常导入"""
+        import json
+        lines = [
+            json.dumps(sample_bill_data),
+            json.dumps(dict(sample_bill_data, amount=-1)),
+            "不是 JSON",
+            "",
+            json.dumps(dict(sample_bill_data, project_id=9999)),
+            json.dumps({k: v for k, v in sample_bill_data.items() if k != "project_id"}),
+        ]
+        response = client.post(
+            f"{API_PREFIX}/bills/import?project_id={test_project.id}",
+            content="\n".join(lines).encode(),
+            headers=dict(test_auth_headers, **{"Content-Type": "application/x-ndjson"})
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["imported"] == 2
+        assert data["failed"] == 3
+        assert [e["line"] for e in data["errors"]] == [2, 3, 5]
+        assert "amount" in data["errors"][0]["message"]
+        assert db.query(Bill).count() == 2
+    
+    def test_line_splitting_across_chunks(self, client, db, test_auth_headers, sample_bill_data):
+        """测试只按 \\n 切行：字符串中的 U+2028 不切开，跨块的 \\r\\n 不多出空行、行号不偏移"""
+        import json
+        body = "\r\n".join([
+            json.dumps(dict(sample_bill_data, note="第一行\u2028第二行"), ensure_ascii=False),
+            json.dumps(dict(sample_bill_data, amount=-1)),
+            json.dumps(sample_bill_data),
+            json.dumps(dict(sample_bill_data, amount=-2)),
+        ]).encode()
+        # 在每个 \r 之后切块，使 \r\n 落在两块之间
+        parts, start = [], 0
+        for index, byte in enumerate(body):
+            if byte == ord("\r"):
+                parts.append(body[start:index + 1])
+                start = index + 1
+        parts.append(body[start:])
+        
+        response = client.post(
+            f"{API_PREFIX}/bills/import?format=ndjson", content=iter(parts), headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["imported"] == 2
+        assert [e["line"] for e in data["errors"]] == [2, 4]
+        assert db.query(Bill).filter(Bill.note == "第一行\u2028第二行").count() == 1
+    
+    def test_csv_unterminated_quote(self, client, db, test_auth_headers, test_project, monkeypatch):
+        """测试引号未闭合的行单独报错，缓冲有上限，之后的有效行照常导入"""
+        from config import settings
+        row = "2024-01-01 00:00:00,导入,支出,人工,10,,,,\n"
+        url = f"{API_PREFIX}/bills/import?project_id={test_project.id}"
+        
+        # 缓冲超过上限时报错（请求体未结束）
+        monkeypatch.setattr(settings, "BILL_IMPORT_MAX_RECORD_CHARS", len(row) * 2)
+        response = client.post(url, content=('a,"b\n' + row * 5).encode(), headers=test_auth_headers)
+        assert response.json() == {
+            "imported": 5, "failed": 1, "errors": [{"line": 1, "message": "引号未闭合"}]
+        }
+        
+        # 请求体结束时仍未闭合
+        monkeypatch.setattr(settings, "BILL_IMPORT_MAX_RECORD_CHARS", 8192)
+        response = client.post(url, content=(row + 'a,"b\n' + row * 2).encode(), headers=test_auth_headers)
+        assert response.json() == {
+            "imported": 3, "failed": 1, "errors": [{"line": 2, "message": "引号未闭合"}]
+        }
+        assert db.query(Bill).count() == 8
+    
+    def test_invalid_utf8_reported_per_row(self, client, db, test_auth_headers, test_project, sample_bill_data):
+        """测试无效的 UTF-8 字节按行报错并返回汇总，而不是 500"""
+        import json
+        row = "2024-01-01 00:00:00,导入,支出,人工,10,,,,\n".encode()
+        response = client.post(
+            f"{API_PREFIX}/bills/import?project_id={test_project.id}",
+            content=row + b"\xff\xfe,x\n" + row, headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {
+            "imported": 2, "failed": 1, "errors": [{"line": 2, "message": "包含无效的 UTF-8 字节"}]
+        }
+        
+        response = client.post(
+            f"{API_PREFIX}/bills/import?format=ndjson",
+            content=b"\xff\xfe\n" + json.dumps(sample_bill_data).encode(), headers=test_auth_headers
+        )
+        assert response.json()["imported"] == 1
+        assert response.json()["errors"] == [{"line": 1, "message": "包含无效的 UTF-8 字节"}]
+    
+    def test_ndjson_null_project_uses_default(self, client, db, test_auth_headers, test_project, sample_bill_data):
+        """测试 NDJSON 行的 project_id 为 null 时同样使用默认项目"""
+        import json
+        response = client.post(
+            f"{API_PREFIX}/bills/import?format=ndjson&project_id={test_project.id}",
+            content=json.dumps(dict(sample_bill_data, project_id=None)).encode(), headers=test_auth_headers
+        )
+        assert response.json() == {"imported": 1, "failed": 0, "errors": []}
+        assert db.query(Bill).one().project_id == test_project.id
+    
+    def test_csv_requires_project(self, client, test_auth_headers):
+        """测试 CSV 导入未指定项目、格式不支持时返回错误"""
+        response = client.post(f"{API_PREFIX}/bills/import", content=b"", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["error"]["code"] == "PROJECT_ID_REQUIRED"
+        
+        response = client.post(f"{API_PREFIX}/bills/import?format=xml", content=b"", headers=test_auth_headers)
+        assert response.json()["error"]["code"] == "INVALID_IMPORT_FORMAT"
+
+
+@pytest.mark.unit
+class TestBillBatchDelete:
+    """批量删除账单测试"""
+    
+    def test_set_based_archive_and_delete(self, client, db, test_auth_headers, test_project, sample_bill_data):
+        """测试一条 INSERT ... SELECT 存档、一条 DELETE ... RETURNING 删除，不加载账单，汇总和计数一致"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from models.bill import BillHistory
+        from services.rollup_service import verify_rollups
+        from services.project_service import reconcile_project_counters
+        
+        client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [dict(sample_bill_data, name=f"批量{i}", amount=i + 1.0) for i in range(10)]},
+            headers=test_auth_headers
+        )
+        ids = [b.id for b in db.query(Bill).order_by(Bill.id)]
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            response = client.request(
+                "DELETE", f"{API_PREFIX}/bills/batch",
+                json={"bill_ids": ids[:6] + [ids[0], 9999]}, headers=test_auth_headers
+            )
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["count"] == 6
+        
+        assert sum(s.startswith("INSERT INTO bill_histories") for s in statements) == 1
+        assert sum(s.startswith("DELETE FROM bills") and "RETURNING" in s for s in statements) == 1
+        assert not any(s.startswith("SELECT bills.") for s in statements)
+        
+        db.expire_all()
+        assert [b.id for b in db.query(Bill).order_by(Bill.id)] == ids[6:]
+        histories = db.query(BillHistory).order_by(BillHistory.bill_id).all()
+        assert [h.bill_id for h in histories] == ids[:6]
+        assert {h.operation_type for h in histories} == {"DELETE"}
+        assert [h.amount for h in histories] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+        assert verify_rollups(db.connection()) == []
+        assert reconcile_project_counters(db.connection(), dry_run=True) == []
+    
+    def test_other_users_bills_untouched(self, client, db, test_auth_headers, sample_bill):
+        """测试只能删除自己的账单，全部不匹配时返回 404"""
+        from models.bill import BillHistory
+        from utils.constants import BatchLimits
+        
+        response = client.request(
+            "DELETE", f"{API_PREFIX}/bills/batch", json={"bill_ids": [9999]}, headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert db.query(BillHistory).count() == 0
+        assert db.query(Bill).count() == 1
+        
+        response = client.request(
+            "DELETE", f"{API_PREFIX}/bills/batch",
+            json={"bill_ids": list(range(1, BatchLimits.DELETE_MAX + 2))}, headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,324 @@
+"""
+缓存模块测试
+
+测试代数计数器失效、内存缓存模式删除等功能
+"""
+import pytest
+from utils.cache import (
+    CacheKeys, _memory_cache, cache_get, cache_set, cache_delete_pattern,
+    get_generation, bump_generation, invalidate_user_cache
+)
+from utils.performance import monitor
+
+
+@pytest.mark.unit
+class TestCacheGeneration:
+    """缓存代数计数器测试"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        _memory_cache.clear()
+        yield
+        _memory_cache.clear()
+
+    async def test_bump_generation_increments(self):
+        """测试递增代数"""
+        before = await get_generation(CacheKeys.SCOPE_USER, 9001)
+        after = await bump_generation(CacheKeys.SCOPE_USER, 9001)
+        assert after == before + 1
+        assert await get_generation(CacheKeys.SCOPE_USER, 9001) == after
+        # 其他作用域不受影响
+        assert await get_generation(CacheKeys.SCOPE_FAMILY, 9001) == 0
+
+    async def test_invalidate_user_cache_keeps_other_users(self):
+        """测试失效只影响当前用户，其他用户的缓存保留"""
+        gen_a = await get_generation(CacheKeys.SCOPE_USER, 9002)
+        gen_b = await get_generation(CacheKeys.SCOPE_USER, 9003)
+        key_a = CacheKeys.bill_stats_key(9002, "2024-01@None", gen_a)
+        key_b = CacheKeys.bill_stats_key(9003, "2024-01@None", gen_b)
+        await cache_set(key_a, "a")
+        await cache_set(key_b, "b")
+
+        await invalidate_user_cache(9002)
+
+        new_gen_a = await get_generation(CacheKeys.SCOPE_USER, 9002)
+        assert new_gen_a != gen_a
+        assert await cache_get(CacheKeys.bill_stats_key(9002, "2024-01@None", new_gen_a)) is None
+        assert await cache_get(key_b) == "b"
+
+    async def test_invalidation_metric_recorded(self):
+        """测试记录失效开销指标"""
+        await cache_set("other:key", "x")
+        before = monitor.get_stats()["cache_invalidation"]
+
+        await invalidate_user_cache(9004)
+
+        after = monitor.get_stats()["cache_invalidation"]
+        assert after["count"] == before["count"] + 1
+        assert after["last_keys_touched"] == 3
+        # 内存模式下旧方式会清空整个缓存
+        assert after["last_legacy_keys"] >= 1
+
+    async def test_legacy_cost_sampled_off_write_path(self, monkeypatch):
+        """测试 Redis 模式下失效路径不等待 DBSIZE，按采样间隔在后台刷新估算值"""
+        import asyncio
+        import utils.cache as cache_module
+
+        calls = []
+
+        class FakeRedis:
+            async def dbsize(self):
+                calls.append(1)
+                return 10
+
+        async def fake_client():
+            return FakeRedis()
+
+        monkeypatch.setattr(cache_module, "get_redis_client", fake_client)
+        monkeypatch.setattr(
+            cache_module, "_legacy_cost_sample", {"dbsize": 0, "sampled_at": float("-inf"), "pending": False}
+        )
+
+        assert await cache_module._legacy_invalidation_cost() == 0
+        assert calls == []
+        await asyncio.sleep(0)
+        assert calls == [1]
+        # 采样间隔内不再访问 Redis
+        assert await cache_module._legacy_invalidation_cost() == 40
+        await asyncio.sleep(0)
+        assert calls == [1]
+
+    async def test_bump_reseeds_missing_redis_generation(self, monkeypatch):
+        """测试 Redis 中代数计数器丢失后递增，新代数仍大于丢失前的代数"""
+        import asyncio
+        import utils.cache as cache_module
+
+        class FakePipeline:
+            def __init__(self, redis):
+                self.redis, self.commands = redis, []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def set(self, key, value, nx=False):
+                self.commands.append(("set", key, value, nx))
+
+            def incr(self, key):
+                self.commands.append(("incr", key))
+
+            async def execute(self):
+                return [await getattr(self.redis, name)(*args) for name, *args in self.commands]
+
+        class FakeRedis:
+            def __init__(self):
+                self.data = {}
+
+            async def get(self, key):
+                return self.data.get(key)
+
+            async def set(self, key, value, nx=False):
+                if nx and key in self.data:
+                    return None
+                self.data[key] = str(value)
+                return True
+
+            async def incr(self, key):
+                self.data[key] = str(int(self.data.get(key, 0)) + 1)
+                return int(self.data[key])
+
+            async def publish(self, channel, message):
+                return 0
+
+            def pipeline(self, transaction=True):
+                return FakePipeline(self)
+
+        redis = FakeRedis()
+
+        async def fake_client():
+            return redis
+
+        monkeypatch.setattr(cache_module, "get_redis_client", fake_client)
+        key = CacheKeys.generation_key(CacheKeys.SCOPE_USER, 9010)
+
+        before = await get_generation(CacheKeys.SCOPE_USER, 9010)
+        assert await bump_generation(CacheKeys.SCOPE_USER, 9010) == before + 1
+
+        # 计数器丢失（淘汰 / Redis 重启）后递增：不会从 1 重新计数（种子为毫秒时间戳）
+        await asyncio.sleep(0.002)
+        del redis.data[key]
+        after = await bump_generation(CacheKeys.SCOPE_USER, 9010)
+        assert after > before + 1
+
+    async def test_tier_counters(self):
+        """测试按层级统计命中/未命中"""
+        before = monitor.get_stats()["cache"]["tiers"].get("l1", {"hits": 0, "misses": 0})
+        await cache_set("bill:stats:9005:g0:all", "1")
+        assert await cache_get("bill:stats:9005:g0:all") == "1"
+        assert await cache_get("bill:stats:9005:g0:none") is None
+
+        after = monitor.get_stats()["cache"]["tiers"]["l1"]
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"] + 1
+
+    async def test_invalidation_message_from_other_worker(self):
+        """测试其他 worker 广播的失效消息作用于本进程的已注册 L1"""
+        from utils.cache import TTLCache, register_l1_cache, _apply_invalidation, _l1_caches
+        token_cache = TTLCache(maxsize=10)
+        register_l1_cache("test-tokens", token_cache)
+        token_cache.set("token:a", 1)
+        token_cache.set("token:b", 2)
+        await cache_set("user:name:alice", "x")
+
+        _apply_invalidation({"origin": "other", "cache": "test-tokens", "keys": ["token:a"]})
+        assert token_cache.get("token:a") is None
+        assert token_cache.get("token:b") == 2
+        assert await cache_get("user:name:alice") == "x"
+
+        _apply_invalidation({"origin": "other", "all": True})
+        assert token_cache.get("token:b") is None
+        assert await cache_get("user:name:alice") is None
+        _l1_caches.pop("test-tokens")
+
+    async def test_memory_delete_pattern(self):
+        """测试内存缓存按模式删除，不再清空全部"""
+        await cache_set("bill:stats:1:g0:all", "1")
+        await cache_set("bill:stats:2:g0:all", "2")
+
+        count = await cache_delete_pattern("bill:stats:1:*")
+
+        assert count == 1
+        assert await cache_get("bill:stats:1:g0:all") is None
+        assert await cache_get("bill:stats:2:g0:all") == "2"
+
+
+@pytest.mark.unit
+class TestTTLCache:
+    """内存 TTL 缓存测试"""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """可控的单调时钟"""
+        now = [1000.0]
+        monkeypatch.setattr("utils.cache.time.monotonic", lambda: now[0])
+        return now
+
+    def test_expired_entries_reclaimed(self, clock):
+        """测试过期项在读取时惰性失效，并由时间轮在写入时回收"""
+        from utils.cache import TTLCache
+        cache = TTLCache(maxsize=100, default_ttl=10)
+        cache.set("a:1", "x")
+        cache.set("a:2", "y", ttl=60)
+
+        clock[0] += 11
+        assert cache.get("a:1") is None
+
+        cache.set("a:3", "z")
+        clock[0] += 11
+        cache.set("a:4", "w")
+        assert len(cache) == 2
+        assert cache.get("a:2") == "y"
+
+    def test_keyspace_bound(self, clock):
+        """测试单个 keyspace 超限只淘汰该 keyspace 的最久未使用项"""
+        from utils.cache import TTLCache
+        cache = TTLCache(maxsize=100, keyspace_maxsize={"user": 2})
+        cache.set("bill:1", "b")
+        cache.set("user:1", "u1")
+        cache.set("user:2", "u2")
+        cache.get("user:1")
+        cache.set("user:3", "u3")
+
+        assert cache.get("user:2") is None
+        assert cache.get("user:1") == "u1"
+        assert cache.get("bill:1") == "b"
+        assert cache.keyspace_sizes() == {"bill": 1, "user": 2}
+
+    def test_byte_budget(self, clock):
+        """测试字节预算超出时按 LRU 淘汰"""
+        from utils.cache import TTLCache
+        cache = TTLCache(maxsize=100, max_bytes=30)
+        cache.set("k:1", "x" * 10)
+        cache.set("k:2", "x" * 10)
+        assert cache.current_bytes == 26
+        cache.set("k:3", "x" * 10)
+
+        assert cache.get("k:1") is None
+        assert cache.current_bytes == 26
+        # 单项超出预算时不缓存
+        cache.set("k:4", "x" * 100)
+        assert cache.get("k:4") is None
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """缓存未命中合并测试"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        _memory_cache.clear()
+        yield
+        _memory_cache.clear()
+
+    async def test_concurrent_misses_compute_once(self):
+        """测试并发未命中只执行一次计算"""
+        import asyncio
+        from utils.cache import cache_get_or_compute
+
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"total": 42}
+
+        before = monitor.get_stats()["single_flight"]["coalesced_local"]
+        results = await asyncio.gather(*[
+            cache_get_or_compute("bill:stats:9100:g0:all", compute) for _ in range(10)
+        ])
+
+        assert calls == 1
+        assert results == [{"total": 42}] * 10
+        assert monitor.get_stats()["single_flight"]["coalesced_local"] == before + 9
+        # 结果已写入缓存
+        assert await cache_get_or_compute("bill:stats:9100:g0:all", compute) == {"total": 42}
+        assert calls == 1
+
+    async def test_waiters_receive_exception(self):
+        """测试计算失败时等待者收到同一异常，且不写入缓存"""
+        import asyncio
+        from utils.cache import cache_get_or_compute
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        results = await asyncio.gather(
+            *[cache_get_or_compute("bill:stats:9101:g0:all", compute) for _ in range(3)],
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert await cache_get("bill:stats:9101:g0:all") is None
+
+
+@pytest.mark.unit
+class TestBinaryCache:
+    """二进制（预序列化响应体）缓存测试"""
+
+    async def test_bytes_roundtrip(self):
+        """测试二进制缓存存取"""
+        from utils.cache import cache_get_bytes, cache_set_bytes
+        body = b'{"total_income":1.0}'
+        await cache_set_bytes("bill:stats:9200:g0:all", body)
+        assert await cache_get_bytes("bill:stats:9200:g0:all") == body
+
+    def test_compress_roundtrip(self):
+        """测试 Redis 二进制值编码可还原（未安装 zstandard 时不压缩）"""
+        from utils.cache import _compress, _decompress
+        body = b'{"name":"x"}' * 500
+        assert _decompress(_compress(body)) == body
+        assert _decompress(b"\xff" + body) is None
@@ -0,0 +1,201 @@
+"""
+家庭组模块测试
+
+测试家庭统计的 SQL 聚合、家庭缓存失效、家庭账单游标分页以及请求主体上下文缓存
+"""
+import time
+import pytest
+from fastapi import status
+from models.project import Project
+
+
+# API 路径前缀
+API_PREFIX = "/api/v1"
+
+
+def _wait_fresh(client, url, headers):
+    """等待 stale-while-revalidate 后台重算完成"""
+    for _ in range(50):
+        response = client.get(url, headers=headers)
+        if "X-Cache-Stale" not in response.headers:
+            return response
+        time.sleep(0.02)
+    return response
+
+
+@pytest.fixture
+def family(client, db, test_auth_headers, sample_bill_data):
+    """创建者（带一条支出）+ 一名成员（带自己的项目），返回双方认证头和成员项目"""
+    from services.auth_service import create_user
+    from schemas.user import UserCreate
+    
+    client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+    response = client.post(f"{API_PREFIX}/family/", json={"name": "测试家庭"}, headers=test_auth_headers)
+    owner_headers = {"Authorization": f"Bearer {response.headers['X-Access-Token']}"}
+    invite_code = response.json()["invite_code"]
+    
+    member = create_user(db, UserCreate(username="member", email="member@test.com", password="Test@123"))
+    project = Project(name="成员项目", user_id=member.id)
+    db.add(project)
+    db.commit()
+    login = client.post(f"{API_PREFIX}/auth/login", json={"username": "member", "password": "Test@123"})
+    response = client.post(
+        f"{API_PREFIX}/family/join", json={"invite_code": invite_code},
+        headers={"Authorization": f"Bearer {login.json()['access_token']}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    member_headers = {"Authorization": f"Bearer {response.headers['X-Access-Token']}"}
+    return owner_headers, member_headers, project.id
+
+
+@pytest.mark.unit
+class TestFamilyStatistics:
+    """家庭统计测试"""
+    
+    def test_member_stats_aggregated(self, client, family, sample_bill_data):
+        """测试按成员、收支类型汇总，没有账单的成员同样列出"""
+        owner_headers, member_headers, _ = family
+        
+        response = client.get(f"{API_PREFIX}/family/statistics", headers=owner_headers)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_expense"] == pytest.approx(sample_bill_data["amount"])
+        assert data["total_income"] == 0
+        assert [m["username"] for m in data["member_stats"]] == ["testuser", "member"]
+        owner, member = data["member_stats"]
+        assert owner["bill_count"] == 1
+        assert owner["balance"] == pytest.approx(-sample_bill_data["amount"])
+        assert member["bill_count"] == 0
+        assert member["expense"] == 0
+    
+    def test_member_write_invalidates(self, client, family, sample_bill_data):
+        """测试成员记账后家庭统计缓存失效"""
+        owner_headers, member_headers, member_project_id = family
+        url = f"{API_PREFIX}/family/statistics"
+        before = client.get(url, headers=owner_headers).json()
+        
+        income = {**sample_bill_data, "bill_type": "income", "amount": 300, "project_id": member_project_id}
+        response = client.post(f"{API_PREFIX}/bills/", json=income, headers=member_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        after = _wait_fresh(client, url, owner_headers).json()
+        assert after["total_income"] == before["total_income"] + 300
+        assert after["member_stats"][1]["income"] == 300
+        assert after["member_stats"][1]["bill_count"] == 1
+    
+    def test_membership_change_invalidates(self, client, family):
+        """测试成员退出后家庭统计缓存失效"""
+        owner_headers, member_headers, _ = family
+        url = f"{API_PREFIX}/family/statistics"
+        assert len(client.get(url, headers=owner_headers).json()["member_stats"]) == 2
+        
+        response = client.post(f"{API_PREFIX}/family/leave", headers=member_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        assert len(_wait_fresh(client, url, owner_headers).json()["member_stats"]) == 1
+    
+    def test_not_in_family(self, client, test_auth_headers):
+        """测试未加入家庭时返回错误"""
+        response = client.get(f"{API_PREFIX}/family/statistics", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.unit
+class TestFamilyBillFeed:
+    """家庭账单游标分页测试"""
+    
+    def test_pages_cover_all_members(self, client, family, sample_bill_data):
+        """测试逐页翻完所有成员的账单，不重复不遗漏，按日期倒序"""
+        owner_headers, member_headers, member_project_id = family
+        for day in range(1, 4):
+            bill = {**sample_bill_data, "project_id": member_project_id, "date": f"2024-03-0{day}T08:00:00+00:00"}
+            client.post(f"{API_PREFIX}/bills/", json=bill, headers=member_headers)
+        
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get(f"{API_PREFIX}/family/bills/page", params=params, headers=owner_headers)
+            assert response.status_code == status.HTTP_200_OK
+            page = response.json()
+            seen.extend(page["items"])
+            cursor = page["next_cursor"]
+            if not page["has_more"]:
+                break
+        
+        assert len(seen) == 4
+        assert len({item["id"] for item in seen}) == 4
+        assert [item["date"] for item in seen] == sorted((item["date"] for item in seen), reverse=True)
+        assert {item["username"] for item in seen} == {"testuser", "member"}
+    
+    def test_month_and_member_filters(self, client, family, sample_bill_data):
+        """测试按月份、成员筛选"""
+        owner_headers, member_headers, member_project_id = family
+        bill = {**sample_bill_data, "project_id": member_project_id, "date": "2024-03-15T08:00:00+00:00"}
+        client.post(f"{API_PREFIX}/bills/", json=bill, headers=member_headers)
+        member_id = client.get(f"{API_PREFIX}/auth/me", headers=member_headers).json()["id"]
+        
+        url = f"{API_PREFIX}/family/bills/page"
+        items = client.get(url, params={"month": "2024-03"}, headers=owner_headers).json()["items"]
+        assert [item["username"] for item in items] == ["member"]
+        
+        items = client.get(url, params={"member_id": member_id}, headers=owner_headers).json()["items"]
+        assert len(items) == 1 and items[0]["user_id"] == member_id
+    
+    def test_invalid_cursor(self, client, family):
+        """测试无效游标返回错误"""
+        owner_headers, _, _ = family
+        response = client.get(f"{API_PREFIX}/family/bills/page?cursor=bad", headers=owner_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.unit
+class TestPrincipalContext:
+    """请求主体上下文缓存测试"""
+    
+    def test_members_and_creator(self, client, family):
+        """测试家庭成员、创建者来自主体上下文"""
+        owner_headers, member_headers, _ = family
+        members = client.get(f"{API_PREFIX}/family/members", headers=member_headers).json()
+        assert [(m["username"], m["is_creator"]) for m in members] == [("testuser", True), ("member", False)]
+        
+        response = client.get(f"{API_PREFIX}/family/", headers=owner_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["name"] == "测试家庭"
+    
+    def test_cached_between_requests(self, client, db, test_auth_headers, test_user, sample_bill_data):
+        """测试命中缓存时不再查库：绕过服务层直接写入的项目不可见"""
+        client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+        project = Project(name="直接写入", user_id=test_user.id)
+        db.add(project)
+        db.commit()
+        
+        bill = {**sample_bill_data, "project_id": project.id}
+        response = client.post(f"{API_PREFIX}/bills/", json=bill, headers=test_auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_project_create_invalidates(self, client, test_auth_headers, sample_bill_data):
+        """测试经接口创建的项目立即可用于记账"""
+        client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+        project_id = client.post(
+            f"{API_PREFIX}/projects/", json={"name": "新项目"}, headers=test_auth_headers
+        ).json()["id"]
+        
+        bill = {**sample_bill_data, "project_id": project_id}
+        response = client.post(f"{API_PREFIX}/bills/", json=bill, headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+    
+    def test_foreign_project_rejected(self, client, family, sample_bill_data):
+        """测试不能在其他成员的项目下记账"""
+        owner_headers, _, member_project_id = family
+        bill = {**sample_bill_data, "project_id": member_project_id}
+        response = client.post(f"{API_PREFIX}/bills/", json=bill, headers=owner_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_membership_change_invalidates(self, client, family):
+        """测试成员退出后成员列表缓存失效"""
+        owner_headers, member_headers, _ = family
+        assert len(client.get(f"{API_PREFIX}/family/members", headers=owner_headers).json()) == 2
+        
+        client.post(f"{API_PREFIX}/family/leave", headers=member_headers)
+        members = client.get(f"{API_PREFIX}/family/members", headers=owner_headers).json()
+        assert [m["username"] for m in members] == ["testuser"]
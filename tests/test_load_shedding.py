@@ -0,0 +1,82 @@
+"""
+过载保护测试
+
+测试信号平滑衰减、低优先级路径判定以及过载时的 503 响应
+"""
+import pytest
+from fastapi import status
+
+
+# API 路径前缀
+API_PREFIX = "/api/v1"
+
+
+@pytest.mark.unit
+class TestLoadShedder:
+    """过载判定测试"""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """可控的单调时钟"""
+        now = [1000.0]
+        monkeypatch.setattr("utils.load_shedding.time.monotonic", lambda: now[0])
+        return now
+    
+    def test_signal_decays_without_samples(self, clock):
+        """测试没有新样本时信号随时间衰减，过载判定自动解除"""
+        from utils.load_shedding import LoadShedder
+        shedder = LoadShedder()
+        for _ in range(20):
+            shedder.record_pool_wait(0.5)
+        assert shedder.overload_reason() == "pool_wait"
+        
+        clock[0] += 10
+        assert shedder.overload_reason() is None
+    
+    def test_loop_lag_and_priority(self, clock):
+        """测试事件循环延迟超标，以及按路径前缀区分优先级"""
+        from utils.load_shedding import LoadShedder
+        shedder = LoadShedder()
+        for _ in range(20):
+            shedder.record_loop_lag(1.0)
+        assert shedder.overload_reason() == "loop_lag"
+        
+        assert shedder.is_low_priority(f"{API_PREFIX}/bills/statistics/monthly")
+        assert shedder.is_low_priority(f"{API_PREFIX}/bills/export")
+        assert not shedder.is_low_priority(f"{API_PREFIX}/bills/")
+        assert not shedder.is_low_priority(f"{API_PREFIX}/auth/login")
+
+
+@pytest.mark.unit
+class TestLoadSheddingMiddleware:
+    """过载保护中间件测试"""
+    
+    @pytest.fixture
+    def overloaded(self):
+        from utils.load_shedding import load_shedder
+        for _ in range(20):
+            load_shedder.record_pool_wait(5.0)
+        yield load_shedder
+        load_shedder.pool_wait.reset()
+    
+    def test_sheds_low_priority_only(self, client, test_auth_headers, sample_bill_data, overloaded):
+        """测试过载时统计、导出返回 503，记账不受影响"""
+        from utils.performance import monitor
+        before = monitor.get_stats()["load_shedding"]["by_reason"].get("pool_wait", 0)
+        
+        response = client.get(f"{API_PREFIX}/bills/statistics/monthly", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "2"
+        assert response.json()["error"]["code"] == "SERVICE_UNAVAILABLE"
+        
+        response = client.get(f"{API_PREFIX}/bills/export", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        
+        response = client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        
+        assert monitor.get_stats()["load_shedding"]["by_reason"]["pool_wait"] == before + 2
+        
+        overloaded.pool_wait.reset()
+        response = client.get(f"{API_PREFIX}/bills/statistics/monthly", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
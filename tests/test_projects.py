@@ -0,0 +1,310 @@
+"""
+项目模块测试
+
+测试项目计数列维护与校正、项目列表缓存、项目详情游标分页以及按批存档删除项目
+"""
+import pytest
+from fastapi import status
+from models.project import Project
+
+
+# API 路径前缀
+API_PREFIX = "/api/v1"
+
+
+def _project(client, headers, project_id):
+    """从项目列表中取出指定项目"""
+    projects = client.get(f"{API_PREFIX}/projects/", headers=headers).json()
+    return next(p for p in projects if p["id"] == project_id)
+
+
+@pytest.mark.unit
+class TestProjectCounters:
+    """项目计数列测试"""
+    
+    def test_counters_follow_writes(self, client, test_auth_headers, test_project, sample_bill_data):
+        """测试新增、批量新增、修改、删除、恢复后计数与账单一致"""
+        url = f"{API_PREFIX}/bills/"
+        created = client.post(url, json=sample_bill_data, headers=test_auth_headers).json()
+        client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [
+                dict(sample_bill_data, bill_type="income", amount=50.0, date="2030-01-01T00:00:00+00:00"),
+                dict(sample_bill_data, amount=20.0),
+            ]},
+            headers=test_auth_headers
+        )
+        project = _project(client, test_auth_headers, test_project.id)
+        assert project["bill_count"] == 3
+        assert project["total_income"] == pytest.approx(50.0)
+        assert project["total_expense"] == pytest.approx(sample_bill_data["amount"] + 20.0)
+        assert project["last_bill_at"].startswith("2030-01-01")
+        
+        client.put(f"{url}{created['id']}", json={"bill_type": "income"}, headers=test_auth_headers)
+        project = _project(client, test_auth_headers, test_project.id)
+        assert project["total_income"] == pytest.approx(50.0 + sample_bill_data["amount"])
+        assert project["total_expense"] == pytest.approx(20.0)
+        
+        # 删除最新的账单后，最新日期回退到剩余账单
+        bills = client.get(url, headers=test_auth_headers).json()
+        latest = next(b for b in bills if b["date"].startswith("2030-01-01"))
+        client.delete(f"{url}{latest['id']}", headers=test_auth_headers)
+        project = _project(client, test_auth_headers, test_project.id)
+        assert project["bill_count"] == 2
+        assert not project["last_bill_at"].startswith("2030")
+        
+        history_id = client.get(f"{url}{latest['id']}/history", headers=test_auth_headers).json()[0]["id"]
+        client.post(f"{url}history/{history_id}/restore", headers=test_auth_headers)
+        client.request(
+            "DELETE", f"{API_PREFIX}/bills/batch",
+            json={"bill_ids": [created["id"]]}, headers=test_auth_headers
+        )
+        project = _project(client, test_auth_headers, test_project.id)
+        assert project["bill_count"] == 2
+        assert project["total_income"] == pytest.approx(50.0)
+        assert project["total_expense"] == pytest.approx(20.0)
+        assert project["last_bill_at"].startswith("2030-01-01")
+    
+    def test_move_between_projects(self, client, db, test_auth_headers, test_user, test_project, sample_bill_data):
+        """测试账单改到另一个项目时两边计数同时调整"""
+        other = client.post(f"{API_PREFIX}/projects/", json={"name": "另一个项目"}, headers=test_auth_headers).json()
+        created = client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers).json()
+        
+        client.put(
+            f"{API_PREFIX}/bills/{created['id']}", json={"project_id": other["id"]}, headers=test_auth_headers
+        )
+        assert _project(client, test_auth_headers, test_project.id)["bill_count"] == 0
+        assert _project(client, test_auth_headers, test_project.id)["last_bill_at"] is None
+        moved = _project(client, test_auth_headers, other["id"])
+        assert moved["bill_count"] == 1
+        assert moved["total_expense"] == pytest.approx(sample_bill_data["amount"])
+    
+    def test_reconcile_fixes_drift(self, db, test_user, test_project, sample_bill):
+        """测试绕过维护路径造成的计数偏差可被校验并修正"""
+        from services.project_service import reconcile_project_counters
+        
+        db.query(Project).filter(Project.id == test_project.id).update({"bill_count": 7, "total_expense": 0})
+        db.commit()
+        
+        mismatches = reconcile_project_counters(db.connection(), dry_run=True)
+        assert [m["project_id"] for m in mismatches] == [test_project.id]
+        
+        reconcile_project_counters(db.connection(), user_id=test_user.id)
+        db.commit()
+        db.expire_all()
+        project = db.get(Project, test_project.id)
+        assert project.bill_count == 1
+        assert project.total_expense == pytest.approx(sample_bill.amount)
+        assert reconcile_project_counters(db.connection(), dry_run=True) == []
+
+
+@pytest.mark.unit
+class TestProjectList:
+    """项目列表缓存测试"""
+    
+    def test_list_cached_until_write(self, client, db, test_auth_headers, test_project, sample_bill_data):
+        """测试项目列表命中缓存，记账、改名后失效"""
+        url = f"{API_PREFIX}/projects/"
+        assert client.get(url, headers=test_auth_headers).json()[0]["bill_count"] == 0
+        
+        # 绕过服务层直接改库：缓存未失效，仍返回旧值
+        db.query(Project).filter(Project.id == test_project.id).update({"description": "直接修改"})
+        db.commit()
+        assert client.get(url, headers=test_auth_headers).json()[0]["description"] != "直接修改"
+        
+        client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers)
+        project = client.get(url, headers=test_auth_headers).json()[0]
+        assert project["bill_count"] == 1
+        assert project["description"] == "直接修改"
+        
+        response = client.put(f"{url}{test_project.id}", json={"name": "改名"}, headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["bill_count"] == 1
+        assert client.get(url, headers=test_auth_headers).json()[0]["name"] == "改名"
+    
+    def test_create_and_delete_invalidate(self, client, test_auth_headers):
+        """测试创建、删除项目后列表立即更新"""
+        url = f"{API_PREFIX}/projects/"
+        assert client.get(url, headers=test_auth_headers).json() == []
+        
+        project_id = client.post(url, json={"name": "新项目"}, headers=test_auth_headers).json()["id"]
+        assert [p["id"] for p in client.get(url, headers=test_auth_headers).json()] == [project_id]
+        
+        client.delete(f"{url}{project_id}", headers=test_auth_headers)
+        assert client.get(url, headers=test_auth_headers).json() == []
+
+
+@pytest.mark.unit
+class TestProjectDetail:
+    """项目详情与项目账单游标分页测试"""
+    
+    @pytest.fixture
+    def project_bills(self, db, test_user, test_project):
+        """项目下 5 条账单，其中两条日期相同（按 id 区分先后）"""
+        from datetime import datetime, timezone
+        from models.bill import Bill
+        dates = [datetime(2024, 3, day, tzinfo=timezone.utc) for day in (1, 2, 2, 3, 4)]
+        db.add_all([
+            Bill(name=f"账单{i}", amount=10.0 * (i + 1), bill_type="expense", category="人工",
+                 date=date, user_id=test_user.id, project_id=test_project.id)
+            for i, date in enumerate(dates)
+        ])
+        db.commit()
+        return test_project
+    
+    def test_detail_summary_and_first_page(self, client, test_auth_headers, project_bills):
+        """测试详情返回计数汇总和第一页账单"""
+        response = client.get(f"{API_PREFIX}/projects/{project_bills.id}?limit=2", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["bill_count"] == 5
+        assert data["total_expense"] == pytest.approx(150.0)
+        assert data["last_bill_at"].startswith("2024-03-04")
+        assert [b["name"] for b in data["bills"]] == ["账单4", "账单3"]
+        assert data["has_more"] is True
+        assert data["next_cursor"]
+    
+    def test_pages_cover_project(self, client, test_auth_headers, project_bills):
+        """测试从详情的游标开始逐页翻完，不重复不遗漏"""
+        detail = client.get(f"{API_PREFIX}/projects/{project_bills.id}?limit=2", headers=test_auth_headers).json()
+        seen, cursor = [b["id"] for b in detail["bills"]], detail["next_cursor"]
+        while cursor:
+            page = client.get(
+                f"{API_PREFIX}/projects/{project_bills.id}/bills",
+                params={"cursor": cursor, "limit": 2}, headers=test_auth_headers
+            ).json()
+            seen.extend(b["id"] for b in page["items"])
+            cursor = page["next_cursor"]
+        
+        assert len(seen) == 5
+        assert len(set(seen)) == 5
+    
+    def test_other_users_project(self, client, db, test_auth_headers):
+        """测试不能访问其他用户的项目"""
+        from services.auth_service import create_user
+        from schemas.user import UserCreate
+        other = create_user(db, UserCreate(username="other", email="other@test.com", password="Test@123"))
+        project = Project(name="别人的项目", user_id=other.id)
+        db.add(project)
+        db.commit()
+        
+        response = client.get(f"{API_PREFIX}/projects/{project.id}", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = client.get(f"{API_PREFIX}/projects/{project.id}/bills", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_invalid_cursor(self, client, test_auth_headers, test_project):
+        """测试无效游标返回错误"""
+        response = client.get(
+            f"{API_PREFIX}/projects/{test_project.id}/bills?cursor=bad", headers=test_auth_headers
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.unit
+class TestProjectDelete:
+    """项目删除测试"""
+    
+    def test_bulk_archive_and_delete(self, client, db, test_auth_headers, test_project, sample_bill_data, monkeypatch):
+        """测试按批存档删除：每批一条 DELETE，账单全部进入历史记录，日汇总一致"""
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from config import settings
+        from models.bill import Bill, BillHistory
+        from services.rollup_service import verify_rollups
+        
+        client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [dict(sample_bill_data, amount=float(i + 1)) for i in range(5)]},
+            headers=test_auth_headers
+        )
+        monkeypatch.setattr(settings, "PROJECT_DELETE_CHUNK_SIZE", 2)
+        project_id = test_project.id
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            response = client.delete(f"{API_PREFIX}/projects/{project_id}", headers=test_auth_headers)
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["deleted_bills"] == 5
+        assert sum(s.startswith("DELETE FROM bills") for s in statements) == 3
+        
+        db.expire_all()
+        assert db.query(Bill).count() == 0
+        assert db.get(Project, project_id) is None
+        histories = db.query(BillHistory).all()
+        assert len(histories) == 5
+        assert {h.operation_type for h in histories} == {"DELETE"}
+        assert sorted(h.amount for h in histories) == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert verify_rollups(db.connection()) == []
+        
+        assert client.get(f"{API_PREFIX}/projects/", headers=test_auth_headers).json() == []
+    
+    def test_restore_after_project_deleted(self, client, test_auth_headers, test_project, sample_bill_data):
+        """测试项目删除后，存档的账单不能恢复到已不存在的项目，可指定其他项目恢复"""
+        created = client.post(f"{API_PREFIX}/bills/", json=sample_bill_data, headers=test_auth_headers).json()
+        client.delete(f"{API_PREFIX}/projects/{test_project.id}", headers=test_auth_headers)
+        
+        history = client.get(f"{API_PREFIX}/bills/{created['id']}/history", headers=test_auth_headers).json()
+        assert len(history) == 1
+        response = client.post(f"{API_PREFIX}/bills/history/{history[0]['id']}/restore", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["error"]["code"] == "BILL_PROJECT_DELETED"
+        
+        restore_url = f"{API_PREFIX}/bills/history/{history[0]['id']}/restore"
+        response = client.post(f"{restore_url}?project_id=9999", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        
+        target = client.post(f"{API_PREFIX}/projects/", json={"name": "恢复目标"}, headers=test_auth_headers).json()
+        response = client.post(f"{restore_url}?project_id={target['id']}", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["project_id"] == target["id"]
+        assert response.json()["amount"] == pytest.approx(sample_bill_data["amount"])
+        assert _project(client, test_auth_headers, target["id"])["bill_count"] == 1
+    
+    def test_bill_moved_in_during_delete(self, client, db, test_auth_headers, test_project, sample_bill_data, monkeypatch):
+        """测试删除过程中移入项目的账单（id 小于已处理批次）同样存档删除，汇总和计数不漂移"""
+        from config import settings
+        from models.bill import Bill, BillHistory
+        from services import project_service
+        from services.rollup_service import verify_rollups
+        from services.project_service import reconcile_project_counters
+        
+        other = client.post(f"{API_PREFIX}/projects/", json={"name": "另一个项目"}, headers=test_auth_headers).json()
+        moved_id = client.post(
+            f"{API_PREFIX}/bills/", json=dict(sample_bill_data, project_id=other["id"]), headers=test_auth_headers
+        ).json()["id"]
+        client.post(
+            f"{API_PREFIX}/bills/batch",
+            json={"bills": [dict(sample_bill_data, amount=float(i + 1)) for i in range(5)]},
+            headers=test_auth_headers
+        )
+        project_id = test_project.id
+        
+        original = project_service.archive_and_delete_bills
+        
+        async def move_then_delete(session, *where):
+            # 第一批选出 id 之后、删除之前，另一个项目的账单移入（经 ORM，汇总照常维护）
+            if not getattr(move_then_delete, "moved", False):
+                move_then_delete.moved = True
+                bill = await session.get(Bill, moved_id)
+                bill.project_id = project_id
+                await session.flush()
+            return await original(session, *where)
+        
+        monkeypatch.setattr(settings, "PROJECT_DELETE_CHUNK_SIZE", 2)
+        monkeypatch.setattr(project_service, "archive_and_delete_bills", move_then_delete)
+        response = client.delete(f"{API_PREFIX}/projects/{project_id}", headers=test_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["deleted_bills"] == 6
+        
+        db.expire_all()
+        assert db.query(Bill).count() == 0
+        assert db.query(BillHistory).count() == 6
+        assert verify_rollups(db.connection()) == []
+        assert reconcile_project_counters(db.connection(), dry_run=True) == []
@@ -0,0 +1,97 @@
+"""
+速率限制测试
+
+测试 GCRA 限流判定、RateLimit-* 响应头和按用户限流依赖
+"""
+import pytest
+from fastapi import status
+
+
+# API 路径前缀
+API_PREFIX = "/api/v1"
+
+
+@pytest.mark.unit
+class TestGCRA:
+    """GCRA 限流器测试"""
+    
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        """可控的单调时钟"""
+        now = [1000.0]
+        monkeypatch.setattr("utils.rate_limit.time.monotonic", lambda: now[0])
+        return now
+    
+    async def test_burst_then_steady_rate(self, clock):
+        """测试允许突发 max_requests 次，之后按 window/max_requests 匀速恢复"""
+        from utils.rate_limit import RateLimiter
+        limiter = RateLimiter(maxsize=100)
+        
+        decisions = [await limiter.hit("t:ip", 3, 60) for _ in range(3)]
+        assert [d.allowed for d in decisions] == [True, True, True]
+        assert [d.remaining for d in decisions] == [2, 1, 0]
+        
+        denied = await limiter.hit("t:ip", 3, 60)
+        assert not denied.allowed
+        assert denied.retry_after == pytest.approx(20)
+        assert denied.headers()["Retry-After"] == "20"
+        
+        clock[0] += 20
+        assert (await limiter.hit("t:ip", 3, 60)).allowed
+        assert not (await limiter.hit("t:ip", 3, 60)).allowed
+        # 其他 key 不受影响
+        assert (await limiter.hit("t:other", 3, 60)).allowed
+    
+    async def test_single_value_per_key(self, clock):
+        """测试每个 key 只保存一个 TAT，配额恢复后自动过期回收"""
+        from utils.rate_limit import RateLimiter
+        limiter = RateLimiter(maxsize=100)
+        for _ in range(3):
+            await limiter.hit("t:ip", 3, 60)
+        assert len(limiter._requests) == 1
+        assert isinstance(limiter._requests.get("t:ip"), float)
+        
+        clock[0] += 61
+        await limiter.hit("t:new", 3, 60)
+        assert limiter._requests.get("t:ip") is None
+
+
+@pytest.mark.unit
+class TestRateLimitDependency:
+    """限流依赖测试"""
+    
+    def test_login_rate_limit_headers(self, client, test_user):
+        """测试登录接口返回 RateLimit-* 头，超限返回 429"""
+        payload = {"username": test_user.username, "password": "wrong"}
+        response = client.post(f"{API_PREFIX}/auth/login", json=payload)
+        assert response.headers["RateLimit-Limit"] == "10"
+        assert response.headers["RateLimit-Remaining"] == "9"
+        assert response.headers["RateLimit-Policy"] == "10;w=60"
+        
+        for _ in range(9):
+            client.post(f"{API_PREFIX}/auth/login", json=payload)
+        response = client.post(f"{API_PREFIX}/auth/login", json=payload)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers["RateLimit-Remaining"] == "0"
+        assert int(response.headers["Retry-After"]) >= 1
+    
+    def test_user_rate_limit_dependency(self, client, test_auth_headers):
+        """测试按用户限流依赖可挂到任意路由"""
+        from fastapi import Depends, FastAPI
+        from fastapi.testclient import TestClient
+        from main import app as main_app
+        from routers.auth import user_rate_limit
+        
+        app = FastAPI()
+        # 未配置 Redis 时 get_current_user 查库比对令牌 epoch，沿用测试数据库
+        app.dependency_overrides = main_app.dependency_overrides
+        
+        @app.get("/limited", dependencies=[Depends(user_rate_limit(2, 60, "test:limited"))])
+        async def limited():
+            return {"ok": True}
+        
+        with TestClient(app) as test_client:
+            assert test_client.get("/limited").status_code == status.HTTP_401_UNAUTHORIZED
+            assert test_client.get("/limited", headers=test_auth_headers).status_code == status.HTTP_200_OK
+            assert test_client.get("/limited", headers=test_auth_headers).status_code == status.HTTP_200_OK
+            assert test_client.get("/limited", headers=test_auth_headers).status_code == status.HTTP_429_TOO_MANY_REQUESTS
@@ -0,0 +1,183 @@
+"""
+重接口准入控制
+
+导出、统计、家庭统计、批量操作等接口单次就要扫描大量账单。少数用户连续刷这些接口时
+会占满数据库连接池，拖慢所有人的普通请求。这里对这类接口做两层控制：
+
+- 成本预算：每个用户每分钟可消耗的成本（按接口权重计，复用 GCRA 限流，多 worker 共享），
+  用尽直接返回 429
+- 加权公平排队：每个 worker 同时执行的重请求数有上限（HEAVY_MAX_CONCURRENT），
+  单个用户的并发数也有上限；超出时按虚拟完成时间（起始虚拟时间 + 成本）排队，
+  多发请求的用户自然排在其他用户之后。排队超过 HEAVY_QUEUE_TIMEOUT 或排队数已满时返回 429
+
+排队等待时间记录到性能监控的 admission 部分。
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from config import settings
+from utils.performance import monitor
+from utils.rate_limit import enforce_rate_limit
+
+
+class AdmissionRejected(Exception):
+    """排队已满或排队超时"""
+    
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class FairAdmission:
+    """
+    按用户加权公平排队的并发闸门（单个 worker 内，只在事件循环线程中使用）
+    
+    每个请求的虚拟完成时间 = max(当前虚拟时间, 该用户上一个请求的虚拟完成时间) + 成本，
+    空出名额时放行完成时间最小、且该用户并发未满的请求
+    """
+    
+    def __init__(self, max_concurrent: int, per_user_concurrent: int, per_user_queue: int):
+        self.max_concurrent = max_concurrent
+        self.per_user_concurrent = per_user_concurrent
+        self.per_user_queue = per_user_queue
+        self._running = 0
+        self._active: Dict[int, int] = {}
+        self._queued: Dict[int, int] = {}
+        self._user_finish: Dict[int, float] = {}
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        # (虚拟完成时间, 序号, 用户ID, 放行信号)
+        self._queue: List[Tuple[float, int, int, asyncio.Future]] = []
+    
+    def _can_run(self, user_id: int) -> bool:
+        return (
+            self._running < self.max_concurrent
+            and self._active.get(user_id, 0) < self.per_user_concurrent
+        )
+    
+    def _start(self, user_id: int) -> None:
+        self._running += 1
+        self._active[user_id] = self._active.get(user_id, 0) + 1
+    
+    def _dispatch(self) -> None:
+        """按虚拟完成时间放行排队请求，跳过并发已满的用户"""
+        skipped = []
+        while self._queue and self._running < self.max_concurrent:
+            entry = heapq.heappop(self._queue)
+            finish, _, user_id, future = entry
+            if future.done():
+                # 已超时或客户端已断开
+                continue
+            if self._active.get(user_id, 0) >= self.per_user_concurrent:
+                skipped.append(entry)
+                continue
+            self._vtime = finish
+            self._start(user_id)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+    
+    def _forget(self, user_id: int) -> None:
+        """用户没有执行中和排队中的请求时清理其状态，保持字典有界"""
+        if not self._active.get(user_id) and not self._queued.get(user_id):
+            self._active.pop(user_id, None)
+            self._queued.pop(user_id, None)
+            self._user_finish.pop(user_id, None)
+    
+    async def acquire(self, user_id: int, cost: float, timeout: float) -> float:
+        """
+        获取执行名额，返回排队等待的秒数
+        
+        Raises:
+            AdmissionRejected: 排队数已满（queue_full）或排队超时（timeout）
+        """
+        # 有空闲名额时仍在排队的只会是并发已满的用户，新用户可直接执行
+        if self._can_run(user_id) and not self._queued.get(user_id):
+            self._start(user_id)
+            return 0.0
+        if self._queued.get(user_id, 0) >= self.per_user_queue:
+            raise AdmissionRejected("queue_full")
+        
+        finish = max(self._vtime, self._user_finish.get(user_id, 0.0)) + cost
+        self._user_finish[user_id] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._seq), user_id, future))
+        self._queued[user_id] = self._queued.get(user_id, 0) + 1
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 超时的同时恰好被放行：归还名额
+                self.release(user_id)
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("timeout")
+            raise
+        finally:
+            self._queued[user_id] -= 1
+            self._forget(user_id)
+        return time.monotonic() - started
+    
+    def release(self, user_id: int) -> None:
+        """归还执行名额并放行下一个排队请求"""
+        self._running -= 1
+        self._active[user_id] -= 1
+        self._forget(user_id)
+        self._dispatch()
+    
+    @property
+    def running(self) -> int:
+        return self._running
+    
+    @property
+    def queued(self) -> int:
+        return sum(self._queued.values())
+
+
+# 全局准入闸门（每个 worker 一个）
+heavy_admission = FairAdmission(
+    max_concurrent=settings.HEAVY_MAX_CONCURRENT,
+    per_user_concurrent=settings.HEAVY_PER_USER_CONCURRENT,
+    per_user_queue=settings.HEAVY_PER_USER_QUEUE,
+)
+
+
+async def admit_heavy_request(request: Request, user_id: int, route: str, cost: int) -> float:
+    """
+    重接口准入：先扣成本预算，再排队获取执行名额；调用方执行完毕后必须 release
+    
+    Returns:
+        排队等待的秒数
+    
+    Raises:
+        HTTPException: 预算用尽、排队已满或排队超时时抛出 429
+    """
+    try:
+        await enforce_rate_limit(
+            request, f"heavy:user:{user_id}", settings.HEAVY_USER_COST_PER_MINUTE, 60, cost=cost
+        )
+    except HTTPException:
+        monitor.record_admission(route, 0.0, rejected="budget")
+        raise
+    
+    try:
+        wait = await heavy_admission.acquire(user_id, cost, settings.HEAVY_QUEUE_TIMEOUT)
+    except AdmissionRejected as e:
+        waited = settings.HEAVY_QUEUE_TIMEOUT if e.reason == "timeout" else 0.0
+        monitor.record_admission(route, waited, rejected=e.reason)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="请求过多，请稍后重试",
+            headers={"Retry-After": str(max(1, math.ceil(settings.HEAVY_QUEUE_TIMEOUT)))},
+        )
+    monitor.record_admission(route, wait)
+    return wait
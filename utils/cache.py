@@ -7,86 +7,268 @@ Redis 缓存模块
 - 统计数据缓存
 - 热点数据缓存
 
-如果 Redis 不可用，自动降级到内存缓存（LRU）
+两级缓存：
+- L1：进程内 TTLCache（每个 worker 独立），命中时无网络开销
+- L2：Redis（多个 worker 共享），L1 未命中时读取并回填 L1
+- 删除/失效时通过 Redis pub/sub 广播，所有 worker 同步丢弃 L1 中的对应项
+- 如果 Redis 不可用，自动降级为仅使用 L1（单进程内即时失效）
+
+缓存失效采用代数计数器（generation）：
+- 统计等派生数据的 key 内嵌所属作用域（用户/家庭/项目）的当前代数
+- 数据变更时只需对代数执行一次 INCR，旧 key 不再被读取，随 TTL 自然过期
+- 避免每次写入都对整个 keyspace 做 SCAN + DELETE
 """
 import json
 import hashlib
 import asyncio
+import sys
 import time
-from typing import Optional, Any, Callable, TypeVar
+import fnmatch
+from typing import Optional, Any, Awaitable, Callable, TypeVar, Dict, Iterable, List
 from functools import wraps
 from collections import OrderedDict
 from threading import RLock
 import logging
+import uuid
+import struct
+import orjson
+from contextvars import ContextVar
+from dataclasses import dataclass
+from fastapi import Response
 from config import settings
+from utils.performance import monitor
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖，未安装时不压缩
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
 # Redis 客户端（延迟加载）
 _redis_client = None
+# 二进制值（预序列化响应体）使用的客户端，不做 UTF-8 解码
+_redis_binary_client = None
 _redis_available = None
 
+# L1 失效广播
+INVALIDATION_CHANNEL = "cache:invalidate"
+_WORKER_ID = uuid.uuid4().hex
+_invalidation_task: Optional[asyncio.Task] = None
+# 订阅启动时的事件循环，供线程池中的同步代码提交后台协程
+_main_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _estimate_size(key: str, value: Any) -> int:
+    """估算缓存项占用的字节数（字符串/字节按长度，其余按对象浅层大小）"""
+    if isinstance(value, (bytes, bytearray)):
+        size = len(value)
+    elif isinstance(value, str):
+        size = len(value) if value.isascii() else len(value.encode("utf-8"))
+    else:
+        size = sys.getsizeof(value)
+    return size + len(key)
+
+
+def _default_keyspace(key: str) -> str:
+    """取 key 的第一段作为 keyspace（如 bill:stats:1:... 属于 bill）"""
+    return key.split(":", 1)[0]
+
+
+class _Entry:
+    """缓存项"""
+    __slots__ = ("value", "expire_at", "bucket", "keyspace", "size")
+    
+    def __init__(self, value: Any, expire_at: float, bucket: int, keyspace: str, size: int):
+        self.value = value
+        self.expire_at = expire_at
+        self.bucket = bucket
+        self.keyspace = keyspace
+        self.size = size
+
 
 class TTLCache:
-    """带 TTL 的线程安全内存缓存"""
+    """
+    带 TTL 的线程安全内存缓存
     
-    def __init__(self, maxsize: int = 1000, default_ttl: int = 300):
+    - get/set 均摊 O(1)：过期由按秒分桶的时间轮回收，读取时惰性检查过期
+    - 全局 LRU + 每个 keyspace 独立 LRU（per-keyspace 条目上限）
+    - 可选字节预算 max_bytes，超出时按全局 LRU 淘汰
+    """
+    
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        default_ttl: int = 300,
+        max_bytes: Optional[int] = None,
+        keyspace_maxsize: Optional[Dict[str, int]] = None,
+        keyspace: Callable[[str], str] = _default_keyspace,
+        sizeof: Callable[[str, Any], int] = _estimate_size,
+    ):
         self.maxsize = maxsize
         self.default_ttl = default_ttl
-        self._cache: OrderedDict = OrderedDict()
+        self.max_bytes = max_bytes
+        self.keyspace_maxsize = dict(keyspace_maxsize or {})
+        self._keyspace = keyspace
+        self._sizeof = sizeof
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._keyspaces: Dict[str, OrderedDict] = {}
+        # 时间轮：到期秒 -> 该秒到期的 key 集合
+        self._wheel: Dict[int, set] = {}
+        self._wheel_cursor = int(time.monotonic())
+        self.current_bytes = 0
         self._lock = RLock()
     
     def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
         with self._lock:
-            if key not in self._cache:
+            entry = self._cache.get(key)
+            if entry is None:
                 return None
-            value, expire_at = self._cache[key]
-            if time.time() > expire_at:
-                del self._cache[key]
+            if time.monotonic() >= entry.expire_at:
+                self._remove(key)
                 return None
             # 移到末尾（LRU）
             self._cache.move_to_end(key)
-            return value
+            self._keyspaces[entry.keyspace].move_to_end(key)
+            return entry.value
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None):
         """设置缓存值"""
         with self._lock:
-            expire_at = time.time() + (ttl or self.default_ttl)
-            self._cache[key] = (value, expire_at)
-            self._cache.move_to_end(key)
-            # 清理过期和超限
-            self._cleanup()
+            now = time.monotonic()
+            self._expire(now)
+            if key in self._cache:
+                self._remove(key)
+            
+            size = self._sizeof(key, value)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # 单项超出全部预算，不缓存
+                return
+            
+            expire_at = now + (ttl or self.default_ttl)
+            bucket = int(expire_at) + 1
+            keyspace = self._keyspace(key)
+            self._cache[key] = _Entry(value, expire_at, bucket, keyspace, size)
+            self._keyspaces.setdefault(keyspace, OrderedDict())[key] = None
+            self._wheel.setdefault(bucket, set()).add(key)
+            self.current_bytes += size
+            self._evict(keyspace)
     
     def delete(self, key: str):
         """删除缓存"""
         with self._lock:
-            self._cache.pop(key, None)
+            if key in self._cache:
+                self._remove(key)
+    
+    def delete_pattern(self, pattern: str) -> int:
+        """按 glob 模式删除缓存，返回删除数量"""
+        with self._lock:
+            keys = [k for k in self._cache if fnmatch.fnmatchcase(k, pattern)]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
     
     def clear(self):
         """清空缓存"""
         with self._lock:
             self._cache.clear()
+            self._keyspaces.clear()
+            self._wheel.clear()
+            self.current_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._cache)
+    
+    def keyspace_sizes(self) -> Dict[str, int]:
+        """各 keyspace 当前条目数"""
+        with self._lock:
+            return {name: len(keys) for name, keys in self._keyspaces.items()}
+    
+    def _remove(self, key: str):
+        """移除缓存项并维护索引（调用方持锁）"""
+        entry = self._cache.pop(key)
+        keys = self._keyspaces[entry.keyspace]
+        del keys[key]
+        if not keys:
+            del self._keyspaces[entry.keyspace]
+        bucket = self._wheel.get(entry.bucket)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._wheel[entry.bucket]
+        self.current_bytes -= entry.size
+    
+    def _expire(self, now: float):
+        """
+        回收已到期的时间轮桶（调用方持锁）
+        
+        每个桶只被处理一次，回收开销均摊到每次写入为 O(1)
+        """
+        now_sec = int(now)
+        if now_sec <= self._wheel_cursor:
+            return
+        if now_sec - self._wheel_cursor > len(self._wheel):
+            # 长时间空闲：直接找出到期的桶，避免逐秒遍历
+            due = [b for b in self._wheel if b <= now_sec]
+        else:
+            due = range(self._wheel_cursor + 1, now_sec + 1)
+        for b in due:
+            keys = self._wheel.pop(b, None)
+            if keys:
+                for k in keys:
+                    entry = self._cache.pop(k)
+                    ks_keys = self._keyspaces[entry.keyspace]
+                    del ks_keys[k]
+                    if not ks_keys:
+                        del self._keyspaces[entry.keyspace]
+                    self.current_bytes -= entry.size
+        self._wheel_cursor = now_sec
     
-    def _cleanup(self):
-        """清理过期项和超限项"""
-        now = time.time()
-        # 删除过期项
-        expired_keys = [k for k, (_, exp) in self._cache.items() if now > exp]
-        for k in expired_keys:
-            del self._cache[k]
-        # 删除超限项（LRU）
+    def _evict(self, keyspace: str):
+        """按 keyspace 上限、全局条目上限和字节预算淘汰最久未使用项（调用方持锁）"""
+        limit = self.keyspace_maxsize.get(keyspace)
+        if limit is not None:
+            keys = self._keyspaces[keyspace]
+            while len(keys) > limit:
+                self._remove(next(iter(keys)))
         while len(self._cache) > self.maxsize:
-            self._cache.popitem(last=False)
+            self._remove(next(iter(self._cache)))
+        if self.max_bytes is not None:
+            while self.current_bytes > self.max_bytes and self._cache:
+                self._remove(next(iter(self._cache)))
 
 
-# 全局内存缓存实例
-_memory_cache = TTLCache(maxsize=2000, default_ttl=300)
+# 全局内存缓存实例（按 keyspace 限额，避免某一类数据挤占全部容量）
+_memory_cache = TTLCache(
+    maxsize=settings.MEMORY_CACHE_MAXSIZE,
+    default_ttl=300,
+    max_bytes=settings.MEMORY_CACHE_MAX_BYTES,
+    keyspace_maxsize={
+        "user": settings.MEMORY_CACHE_MAXSIZE // 2,      # 认证用户信息
+        "bill": settings.MEMORY_CACHE_MAXSIZE // 4,      # 收支统计
+        "category": settings.MEMORY_CACHE_MAXSIZE // 8,  # 分类统计
+        "name": settings.MEMORY_CACHE_MAXSIZE // 8,      # 名称统计
+    },
+)
+
+# 可被失效广播作用到的 L1 缓存（名称 -> 实例）
+_l1_caches: Dict[str, TTLCache] = {"default": _memory_cache}
+
+
+def register_l1_cache(name: str, cache: TTLCache):
+    """注册进程内缓存，使其可以接收跨 worker 的失效广播"""
+    _l1_caches[name] = cache
+
+
+# 内存模式下的代数计数器（独立于 LRU 缓存存放，不会被淘汰导致代数回退）
+_memory_generations: Dict[str, int] = {}
+_generation_lock = RLock()
 
 
 async def get_redis_client():
     """获取 Redis 客户端（单例）"""
-    global _redis_client, _redis_available
+    global _redis_client, _redis_binary_client, _redis_available
     
     if _redis_available is False:
         return None
@@ -112,6 +294,14 @@ async def get_redis_client():
             retry_on_timeout=True,
             max_connections=settings.REDIS_MAX_CONNECTIONS if hasattr(settings, 'REDIS_MAX_CONNECTIONS') else 20,
         )
+        _redis_binary_client = aioredis.from_url(
+            redis_url,
+            decode_responses=False,
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            retry_on_timeout=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS if hasattr(settings, 'REDIS_MAX_CONNECTIONS') else 20,
+        )
         # 测试连接
         await _redis_client.ping()
         logger.info("Redis 连接成功")
@@ -123,25 +313,234 @@ async def get_redis_client():
         return None
 
 
-async def cache_get(key: str) -> Optional[str]:
-    """获取缓存（自动选择 Redis 或内存）"""
+def _l1_ttl(ttl: int) -> int:
+    """L1 回填的 TTL：不超过 CACHE_L1_TTL，限制广播丢失时的最长陈旧时间"""
+    return max(1, min(ttl, settings.CACHE_L1_TTL))
+
+
+def _apply_invalidation(message: dict):
+    """在本进程的 L1 中执行失效消息"""
+    if message.get("all"):
+        for cache in _l1_caches.values():
+            cache.clear()
+        return
+    cache = _l1_caches.get(message.get("cache", "default"))
+    if cache is None:
+        return
+    for key in message.get("keys", ()):
+        cache.delete(key)
+    for pattern in message.get("patterns", ()):
+        cache.delete_pattern(pattern)
+
+
+# 跨 worker 事件（与 L1 失效共用同一频道）：事件名 -> 处理函数
+_event_handlers: Dict[str, Callable[[Any], None]] = {}
+# 订阅（重新）建立后执行的全量同步，弥补断线期间漏掉的事件
+_resync_handlers: List[Callable[[], Awaitable[None]]] = []
+_background_tasks: set = set()
+
+
+def register_event_handler(
+    event: str,
+    handler: Callable[[Any], None],
+    resync: Optional[Callable[[], Awaitable[None]]] = None,
+):
+    """注册跨 worker 事件的处理函数（以及可选的重新同步函数）"""
+    _event_handlers[event] = handler
+    if resync is not None:
+        _resync_handlers.append(resync)
+
+
+async def broadcast_event(event: str, payload: Any):
+    """在本进程处理事件，并通知其他 worker（Redis 不可用时只作用于本进程）"""
+    _event_handlers[event](payload)
+    
     redis = await get_redis_client()
     if redis:
         try:
-            return await redis.get(key)
+            message = {"event": event, "payload": payload, "origin": _WORKER_ID}
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps(message))
         except Exception as e:
-            logger.warning(f"Redis GET 失败: {e}")
+            logger.warning(f"Redis PUBLISH 失败: {e}")
+
+
+def run_in_background(coro: Awaitable[Any]):
+    """
+    在事件循环中后台执行协程，不等待结果
     
-    # 回退到内存缓存
-    return _memory_cache.get(key)
+    可以从事件循环线程或线程池线程（同步路由）中调用；
+    两者都不可用时（如脚本中）丢弃该协程
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        task = loop.create_task(coro)
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    elif _main_loop is not None and _main_loop.is_running():
+        asyncio.run_coroutine_threadsafe(coro, _main_loop)
+    else:
+        coro.close()
 
 
-async def cache_set(key: str, value: str, ttl: int = 300) -> bool:
-    """设置缓存（自动选择 Redis 或内存）"""
+def _dispatch_message(data: dict):
+    """处理来自其他 worker 的广播消息"""
+    event = data.get("event")
+    if event is None:
+        _apply_invalidation(data)
+        return
+    handler = _event_handlers.get(event)
+    if handler is not None:
+        handler(data.get("payload"))
+
+
+async def _resync_all():
+    for resync in _resync_handlers:
+        try:
+            await resync()
+        except Exception as e:
+            logger.warning(f"广播事件重新同步失败: {e}")
+
+
+async def broadcast_invalidation(
+    keys: Iterable[str] = (),
+    patterns: Iterable[str] = (),
+    cache: str = "default",
+):
+    """
+    丢弃本进程 L1 中的 key，并通知其他 worker 同步丢弃
+    
+    Redis 不可用时只作用于本进程（单进程部署下即为全部）
+    """
+    message = {"cache": cache, "keys": list(keys), "patterns": list(patterns)}
+    _apply_invalidation(message)
+    
     redis = await get_redis_client()
     if redis:
         try:
-            await redis.set(key, value, ex=ttl)
+            message["origin"] = _WORKER_ID
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.warning(f"Redis PUBLISH 失败: {e}")
+
+
+async def _listen_invalidations(redis):
+    """订阅失效广播，丢弃本进程 L1 中对应的 key（断线自动重连）"""
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            await _resync_all()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    data = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                if data.get("origin") != _WORKER_ID:
+                    _dispatch_message(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 断线期间可能漏掉广播，保守起见清空 L1
+            logger.warning(f"缓存失效订阅中断，清空 L1 后重连: {e}")
+            _apply_invalidation({"all": True})
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+
+async def start_invalidation_listener():
+    """启动 L1 失效广播订阅（应用启动时调用，未配置 Redis 时不做任何事）"""
+    global _invalidation_task, _main_loop
+    _main_loop = asyncio.get_running_loop()
+    redis = await get_redis_client()
+    if redis is None or _invalidation_task is not None:
+        return
+    _invalidation_task = asyncio.create_task(_listen_invalidations(redis))
+    logger.info("缓存失效订阅已启动")
+
+
+# 二进制值在 Redis 中的格式标记（首字节）
+_RAW_MARKER = b"\x00"
+_ZSTD_MARKER = b"\x01"
+
+_zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def _compress(value: bytes) -> bytes:
+    """写入 Redis 前按配置压缩（只压缩较大的值，L1 始终保存原始字节）"""
+    if (
+        _zstd_compressor is not None
+        and settings.CACHE_COMPRESSION == "zstd"
+        and len(value) >= settings.CACHE_COMPRESSION_MIN_BYTES
+    ):
+        return _ZSTD_MARKER + _zstd_compressor.compress(value)
+    return _RAW_MARKER + value
+
+
+def _decompress(data: bytes) -> Optional[bytes]:
+    """解析 Redis 中的二进制值，无法识别（如未安装 zstandard）时返回 None"""
+    marker, payload = data[:1], data[1:]
+    if marker == _RAW_MARKER:
+        return payload
+    if marker == _ZSTD_MARKER and _zstd_decompressor is not None:
+        return _zstd_decompressor.decompress(payload)
+    return None
+
+
+async def _l2_get(key: str, binary: bool = False):
+    """读取 Redis（调用方确认 Redis 可用），命中时回填 L1"""
+    if binary:
+        data = await _redis_binary_client.get(key)
+        value = _decompress(data) if data is not None else None
+    else:
+        value = await _redis_client.get(key)
+    if value is not None:
+        _memory_cache.set(key, value, _l1_ttl(settings.CACHE_L1_TTL))
+    return value
+
+
+async def _tiered_get(key: str, binary: bool = False):
+    """先查 L1，未命中再查 Redis"""
+    value = _memory_cache.get(key)
+    if value is not None:
+        monitor.record_cache_hit("l1")
+        return value
+    
+    redis = await get_redis_client()
+    monitor.record_cache_miss("l1", final=redis is None)
+    if redis:
+        try:
+            value = await _l2_get(key, binary)
+        except Exception as e:
+            logger.warning(f"Redis GET 失败: {e}")
+            return None
+        if value is None:
+            monitor.record_cache_miss("l2")
+            return None
+        monitor.record_cache_hit("l2")
+        return value
+    return None
+
+
+async def _tiered_set(key: str, value, ttl: int, binary: bool = False) -> bool:
+    """写入 Redis 和 L1；Redis 不可用时仅写 L1"""
+    redis = await get_redis_client()
+    if redis:
+        try:
+            if binary:
+                await _redis_binary_client.set(key, _compress(value), ex=ttl)
+            else:
+                await redis.set(key, value, ex=ttl)
+            _memory_cache.set(key, value, _l1_ttl(ttl))
             return True
         except Exception as e:
             logger.warning(f"Redis SET 失败: {e}")
@@ -151,8 +550,28 @@ async def cache_set(key: str, value: str, ttl: int = 300) -> bool:
     return True
 
 
+async def cache_get(key: str) -> Optional[str]:
+    """获取缓存（先查 L1，未命中再查 Redis 并回填 L1）"""
+    return await _tiered_get(key)
+
+
+async def cache_set(key: str, value: str, ttl: int = 300) -> bool:
+    """设置缓存（写入 Redis 和 L1；Redis 不可用时仅写 L1）"""
+    return await _tiered_set(key, value, ttl)
+
+
+async def cache_get_bytes(key: str) -> Optional[bytes]:
+    """获取二进制缓存（如预序列化的响应体），L1 中保存未压缩的原始字节"""
+    return await _tiered_get(key, binary=True)
+
+
+async def cache_set_bytes(key: str, value: bytes, ttl: int = 300) -> bool:
+    """设置二进制缓存，写入 Redis 时按 CACHE_COMPRESSION 压缩"""
+    return await _tiered_set(key, value, ttl, binary=True)
+
+
 async def cache_delete(key: str) -> bool:
-    """删除缓存"""
+    """删除缓存（Redis + 所有 worker 的 L1）"""
     redis = await get_redis_client()
     if redis:
         try:
@@ -160,12 +579,13 @@ async def cache_delete(key: str) -> bool:
         except Exception as e:
             logger.warning(f"Redis DELETE 失败: {e}")
     
-    _memory_cache.delete(key)
+    await broadcast_invalidation(keys=[key])
     return True
 
 
 async def cache_delete_pattern(pattern: str) -> int:
-    """按模式删除缓存（仅 Redis 支持）"""
+    """按模式删除缓存（Redis 使用 SCAN，L1 使用 glob 匹配并广播）"""
+    count = None
     redis = await get_redis_client()
     if redis:
         try:
@@ -174,13 +594,162 @@ async def cache_delete_pattern(pattern: str) -> int:
                 keys.append(key)
             if keys:
                 await redis.delete(*keys)
-            return len(keys)
+            count = len(keys)
         except Exception as e:
             logger.warning(f"Redis DELETE PATTERN 失败: {e}")
     
-    # 内存缓存不支持模式删除，清空全部
-    _memory_cache.clear()
-    return 0
+    local_count = _memory_cache.delete_pattern(pattern)
+    await broadcast_invalidation(patterns=[pattern])
+    return local_count if count is None else count
+
+
+# ============== 单飞（Single-flight）==============
+
+# 分布式锁的最长持有时间（秒），持锁方崩溃后锁自动释放
+SINGLE_FLIGHT_LOCK_TTL = 10
+# 未拿到锁时轮询缓存的间隔（秒）
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+# 本进程内正在计算的 key -> Future
+_inflight: Dict[str, asyncio.Future] = {}
+
+# 仅当锁仍由自己持有时才释放（避免误删他人在锁过期后获得的锁）
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_MISSING = object()
+
+
+def _decode(raw, deserialize: Callable[[Any], Any]) -> Any:
+    """反序列化缓存值，失败（格式变更等）视为未命中"""
+    if raw is None:
+        return _MISSING
+    try:
+        return deserialize(raw)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"缓存反序列化失败，重新计算: {e}")
+        return _MISSING
+
+
+async def _wait_for_peer(key: str, deserialize: Callable[[Any], Any], binary: bool) -> Any:
+    """等待持锁的其他 worker 写入缓存，超时返回 _MISSING"""
+    deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_TTL
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        try:
+            raw = await _l2_get(key, binary)
+        except Exception as e:
+            logger.warning(f"Redis GET 失败: {e}")
+            return _MISSING
+        value = _decode(raw, deserialize)
+        if value is not _MISSING:
+            return value
+    monitor.record_single_flight("lock_timeout")
+    return _MISSING
+
+
+async def _compute_and_store(
+    key: str,
+    compute: Callable[[], Any],
+    ttl: int,
+    serialize: Callable[[Any], Any],
+    deserialize: Callable[[Any], Any],
+    binary: bool = False,
+) -> Any:
+    """
+    计算并写入缓存；Redis 可用时先获取分布式锁，
+    未拿到锁的 worker 等待持锁方的结果而不是重复计算
+    """
+    redis = await get_redis_client()
+    lock_key = f"{CacheKeys.LOCK}:{key}"
+    lock_token = None
+    if redis:
+        token = uuid.uuid4().hex
+        try:
+            if await redis.set(lock_key, token, nx=True, ex=SINGLE_FLIGHT_LOCK_TTL):
+                lock_token = token
+            else:
+                value = await _wait_for_peer(key, deserialize, binary)
+                if value is not _MISSING:
+                    monitor.record_single_flight("distributed")
+                    return value
+        except Exception as e:
+            logger.warning(f"Redis 分布式锁失败，直接计算: {e}")
+    
+    try:
+        result = await compute()
+        try:
+            await _tiered_set(key, serialize(result), ttl, binary)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"缓存序列化失败: {e}")
+        return result
+    finally:
+        if lock_token is not None:
+            try:
+                await redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, lock_token)
+            except Exception as e:
+                logger.warning(f"Redis 释放锁失败: {e}")
+
+
+async def single_flight(key: str, compute: Callable[[], Any]) -> Any:
+    """
+    合并同一 key 的并发计算：第一个调用者执行 compute，
+    其余调用者等待同一结果（包括异常）
+    """
+    future = _inflight.get(key)
+    if future is not None:
+        monitor.record_single_flight("local")
+        return await asyncio.shield(future)
+    
+    future = asyncio.get_running_loop().create_future()
+    # 没有等待者时也消费异常，避免 "exception was never retrieved" 警告
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _inflight[key] = future
+    try:
+        result = await compute()
+    except BaseException as e:
+        if not future.done():
+            future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+async def cache_get_or_compute(
+    key: str,
+    compute: Callable[[], Any],
+    ttl: int = 300,
+    serialize: Callable[[Any], Any] = json.dumps,
+    deserialize: Callable[[Any], Any] = json.loads,
+    binary: bool = False,
+) -> Any:
+    """
+    读取缓存，未命中时计算并写入（带防击穿保护）
+    
+    - 本进程内同一 key 的并发未命中只计算一次（single-flight）
+    - Redis 可用时再通过分布式锁保证多个 worker 只有一个在计算
+    
+    Args:
+        key: 缓存 key
+        compute: 无参异步函数，返回需要缓存的结果
+        ttl: 缓存过期时间（秒）
+        serialize: 结果 -> 缓存值（binary=True 时为 bytes）
+        deserialize: 缓存值 -> 结果
+        binary: 是否以二进制存储（见 cache_get_bytes）
+    """
+    value = _decode(await _tiered_get(key, binary), deserialize)
+    if value is not _MISSING:
+        return value
+    return await single_flight(
+        key, lambda: _compute_and_store(key, compute, ttl, serialize, deserialize, binary)
+    )
 
 
 def cache_key(*args, prefix: str = "cache") -> str:
@@ -199,6 +768,14 @@ def cache_key_hash(*args, prefix: str = "cache") -> str:
 T = TypeVar('T')
 
 
+def _loads_or_raw(raw: str) -> Any:
+    """JSON 反序列化，非 JSON 内容原样返回"""
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        return raw
+
+
 def cached(
     ttl: int = 300,
     prefix: str = "cache",
@@ -230,25 +807,14 @@ def cached(
                 kwargs_str = ":".join(f"{k}={v}" for k, v in sorted(kwargs.items()))
                 cache_k = cache_key(func_name, args_str, kwargs_str, prefix=prefix)
             
-            # 尝试从缓存获取
-            cached_value = await cache_get(cache_k)
-            if cached_value is not None:
-                try:
-                    return json.loads(cached_value)
-                except json.JSONDecodeError:
-                    return cached_value
-            
-            # 执行原函数
-            result = await func(*args, **kwargs)
-            
-            # 存入缓存
-            try:
-                cache_value = json.dumps(result, ensure_ascii=False, default=str)
-                await cache_set(cache_k, cache_value, ttl)
-            except (TypeError, ValueError) as e:
-                logger.warning(f"缓存序列化失败: {e}")
-            
-            return result
+            # 尝试从缓存获取，未命中时合并并发计算
+            return await cache_get_or_compute(
+                cache_k,
+                lambda: func(*args, **kwargs),
+                ttl=ttl,
+                serialize=lambda result: json.dumps(result, ensure_ascii=False, default=str),
+                deserialize=_loads_or_raw,
+            )
         
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
@@ -286,12 +852,24 @@ class CacheKeys:
     """缓存 Key 前缀常量"""
     USER = "user"
     USER_BY_NAME = "user:name"
+    USER_MISSING = "user:missing"
     TOKEN = "token"
+    GENERATION = "gen"
+    LOCK = "lock"
     BILL_STATS = "bill:stats"
     BILL_LIST = "bill:list"
     CATEGORY_STATS = "category:stats"
     NAME_STATS = "name:stats"
     PROJECT_LIST = "project:list"
+    FAMILY_STATS = "family:stats"
+    PRINCIPAL = "principal"
+    
+    # 代数作用域
+    SCOPE_USER = "user"
+    SCOPE_FAMILY = "family"
+    SCOPE_PROJECT = "project"         # 用户的项目列表（按用户ID）
+    SCOPE_PRINCIPAL = "principal"     # 用户拥有的项目集合
+    SCOPE_MEMBERSHIP = "membership"   # 家庭成员集合
     
     @staticmethod
     def user_key(user_id: int) -> str:
@@ -301,25 +879,49 @@ class CacheKeys:
     def user_by_name_key(username: str) -> str:
         return f"{CacheKeys.USER_BY_NAME}:{username}"
     
+    @staticmethod
+    def user_missing_key(username: str) -> str:
+        """不存在的用户名（负缓存）"""
+        return f"{CacheKeys.USER_MISSING}:{username}"
+    
     @staticmethod
     def token_key(token_hash: str) -> str:
         return f"{CacheKeys.TOKEN}:{token_hash}"
     
     @staticmethod
-    def bill_stats_key(user_id: int, month: str) -> str:
-        return f"{CacheKeys.BILL_STATS}:{user_id}:{month}"
+    def generation_key(scope: str, scope_id: int) -> str:
+        return f"{CacheKeys.GENERATION}:{scope}:{scope_id}"
+    
+    @staticmethod
+    def _with_gen(prefix: str, scope_id: int, suffix: str, gen: Optional[int]) -> str:
+        """gen 为 None 时生成不含代数的稳定 key（stale-while-revalidate 模式使用）"""
+        if gen is None:
+            return f"{prefix}:{scope_id}:{suffix}"
+        return f"{prefix}:{scope_id}:g{gen}:{suffix}"
+    
+    @staticmethod
+    def bill_stats_key(user_id: int, month: str, gen: Optional[int] = 0) -> str:
+        return CacheKeys._with_gen(CacheKeys.BILL_STATS, user_id, month, gen)
+    
+    @staticmethod
+    def category_stats_key(user_id: int, month: Optional[str] = None, gen: Optional[int] = 0) -> str:
+        return CacheKeys._with_gen(CacheKeys.CATEGORY_STATS, user_id, month or 'all', gen)
+    
+    @staticmethod
+    def name_stats_key(user_id: int, month: Optional[str] = None, gen: Optional[int] = 0) -> str:
+        return CacheKeys._with_gen(CacheKeys.NAME_STATS, user_id, month or 'all', gen)
     
     @staticmethod
-    def category_stats_key(user_id: int, month: Optional[str] = None) -> str:
-        return f"{CacheKeys.CATEGORY_STATS}:{user_id}:{month or 'all'}"
+    def family_stats_key(family_id: int, month: str, gen: Optional[int] = 0) -> str:
+        return CacheKeys._with_gen(CacheKeys.FAMILY_STATS, family_id, month, gen)
     
     @staticmethod
-    def name_stats_key(user_id: int, month: Optional[str] = None) -> str:
-        return f"{CacheKeys.NAME_STATS}:{user_id}:{month or 'all'}"
+    def principal_key(user_id: int, family_id: Optional[int], gen: int, membership_gen: int) -> str:
+        return f"{CacheKeys.PRINCIPAL}:{user_id}:g{gen}:f{family_id or 0}:m{membership_gen}"
     
     @staticmethod
-    def project_list_key(user_id: int) -> str:
-        return f"{CacheKeys.PROJECT_LIST}:{user_id}"
+    def project_list_key(user_id: int, gen: int = 0) -> str:
+        return f"{CacheKeys.PROJECT_LIST}:{user_id}:g{gen}"
     
     @staticmethod
     def invalidate_user_stats_pattern(user_id: int) -> str:
@@ -327,25 +929,358 @@ class CacheKeys:
         return f"*:{user_id}:*"
 
 
-async def invalidate_user_cache(user_id: int):
-    """清除用户相关的所有缓存"""
-    patterns = [
-        f"{CacheKeys.BILL_STATS}:{user_id}:*",
-        f"{CacheKeys.CATEGORY_STATS}:{user_id}:*",
-        f"{CacheKeys.NAME_STATS}:{user_id}:*",
-        f"{CacheKeys.BILL_LIST}:{user_id}:*",
-    ]
-    for pattern in patterns:
-        await cache_delete_pattern(pattern)
+def _generation_seed() -> int:
+    """
+    代数初始值（毫秒时间戳）
+    
+    Redis 中的代数计数器丢失（重启/淘汰）后重新初始化，
+    以时间戳起步可保证新代数不会与仍在 TTL 内的旧 key 重复
+    """
+    return int(time.time() * 1000)
+
+
+async def get_generation(scope: str, scope_id: int) -> int:
+    """
+    获取作用域的当前缓存代数
+    
+    Redis 模式下代数同样缓存在 L1，递增时通过失效广播通知各 worker，
+    因此统计缓存命中路径无需访问 Redis
+    """
+    key = CacheKeys.generation_key(scope, scope_id)
+    redis = await get_redis_client()
+    if redis:
+        value = _memory_cache.get(key)
+        if value is not None:
+            return value
+        try:
+            value = await redis.get(key)
+            if value is None:
+                await redis.set(key, _generation_seed(), nx=True)
+                value = await redis.get(key)
+            value = int(value)
+            _memory_cache.set(key, value, _l1_ttl(settings.CACHE_L1_TTL))
+            return value
+        except Exception as e:
+            logger.warning(f"Redis 读取缓存代数失败: {e}")
+    
+    with _generation_lock:
+        return _memory_generations.get(key, 0)
+
+
+async def bump_generation(scope: str, scope_id: int) -> int:
+    """
+    递增作用域的缓存代数（O(1)），使该作用域下所有派生缓存失效
+    
+    Redis 中的计数器不存在（从未读取、被淘汰或 Redis 重启）时，先以时间戳初始化再递增
+    （SET NX + INCR 在同一事务中执行），否则 INCR 会从 1 重新计数，
+    与仍在 TTL 内的旧代数 key 重复
+    
+    Returns:
+        新的代数
+    """
+    key = CacheKeys.generation_key(scope, scope_id)
+    redis = await get_redis_client()
+    if redis:
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.set(key, _generation_seed(), nx=True)
+                pipe.incr(key)
+                _, value = await pipe.execute()
+            await broadcast_invalidation(keys=[key])
+            return value
+        except Exception as e:
+            logger.warning(f"Redis 递增缓存代数失败: {e}")
+    
+    with _generation_lock:
+        value = _memory_generations.get(key, 0) + 1
+        _memory_generations[key] = value
+        return value
+
+
+# ============== Stale-while-revalidate ==============
+
+@dataclass(frozen=True)
+class SWRPolicy:
+    """
+    stale-while-revalidate 策略
+    
+    - soft_ttl 内且代数未变：直接返回
+    - 超过 soft_ttl 或代数已变（有写入），但未超过 hard_ttl：立即返回旧值并后台重算
+    - 超过 hard_ttl：缓存已过期，同步计算
+    """
+    soft_ttl: int
+    hard_ttl: int
+
+
+def _parse_swr_policies(spec: str) -> Dict[str, SWRPolicy]:
+    """解析 "keyspace=soft:hard,..." 格式的策略配置"""
+    policies = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            keyspace, ttls = item.split("=", 1)
+            soft, hard = (int(v) for v in ttls.split(":", 1))
+        except ValueError:
+            logger.warning(f"忽略无效的 SWR 策略配置: {item}")
+            continue
+        policies[keyspace.strip()] = SWRPolicy(soft_ttl=soft, hard_ttl=max(soft, hard))
+    return policies
+
+
+# keyspace 前缀 -> 策略（未配置的 keyspace 不启用 stale-while-revalidate）
+SWR_POLICIES: Dict[str, SWRPolicy] = _parse_swr_policies(settings.CACHE_SWR_POLICIES)
+
+# 返回旧值时添加的响应头
+STALE_HEADER = "X-Cache-Stale"
+
+# 当前请求的 Response（由 track_cache_freshness 依赖设置），用于标记旧值
+_current_response: ContextVar[Optional[Response]] = ContextVar("cache_current_response", default=None)
+
+# 后台刷新任务（持有引用，避免任务被垃圾回收）
+_refresh_tasks: set = set()
+
+
+def swr_policy_for(key: str) -> Optional[SWRPolicy]:
+    """按 key 前缀查找 stale-while-revalidate 策略"""
+    for keyspace, policy in SWR_POLICIES.items():
+        if key.startswith(f"{keyspace}:"):
+            return policy
+    return None
+
+
+async def track_cache_freshness(response: Response):
+    """
+    路由依赖：本请求的缓存读取返回了旧值时，在响应上添加 X-Cache-Stale 头
+    
+    Example:
+        @router.get("/statistics", dependencies=[Depends(track_cache_freshness)])
+    """
+    _current_response.set(response)
+
+
+def cached_json_response(body: bytes) -> Response:
+    """
+    用预序列化的 JSON 响应体构建响应（跳过 response_model 校验和再次序列化）
+    
+    直接返回 Response 时 FastAPI 不会合并依赖注入的 Response 上的响应头，
+    这里把 track_cache_freshness 记录的响应头（如 X-Cache-Stale）复制过来
+    """
+    response = Response(content=body, media_type="application/json")
+    current = _current_response.get()
+    if current is not None:
+        for name, value in current.headers.items():
+            if name not in ("content-length", "content-type"):
+                response.headers[name] = value
+    return response
+
+
+def _mark_stale(age: float):
+    response = _current_response.get()
+    if response is not None:
+        response.headers[STALE_HEADER] = "true"
+        response.headers["Age"] = str(int(age))
+
+
+# SWR 缓存值头部：代数（int64）+ 计算时间戳（double），其后为序列化结果
+_ENVELOPE_HEADER = struct.Struct("!qd")
+
+
+def _envelope_codec(
+    generation: int,
+    serialize: Callable[[Any], bytes],
+    deserialize: Callable[[bytes], Any],
+):
+    """带代数和计算时间的二进制缓存值编解码"""
+    def dumps(result: Any) -> bytes:
+        return _ENVELOPE_HEADER.pack(generation, time.time()) + serialize(result)
+    
+    def loads(raw: bytes) -> Any:
+        return deserialize(raw[_ENVELOPE_HEADER.size:])
+    
+    return dumps, loads
+
+
+def _refresh_done(task: asyncio.Task):
+    _refresh_tasks.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        monitor.record_swr("refresh_error")
+        logger.warning(f"缓存后台刷新失败: {task.exception()}")
+
+
+def _schedule_refresh(key: str, refresh: Callable[[], Any], ttl: int, dumps, loads):
+    """后台重算（同一 key 同时只有一个刷新任务）"""
+    if key in _inflight:
+        return
+    monitor.record_swr("refresh")
+    task = asyncio.create_task(
+        single_flight(key, lambda: _compute_and_store(key, refresh, ttl, dumps, loads, binary=True))
+    )
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_done)
+
+
+async def _swr_get_or_compute(
+    key: str,
+    generation: int,
+    policy: SWRPolicy,
+    compute: Callable[[], Any],
+    refresh: Callable[[], Any],
+    serialize: Callable[[Any], bytes],
+    deserialize: Callable[[bytes], Any],
+) -> Any:
+    """stale-while-revalidate 读取（key 为不含代数的稳定 key）"""
+    dumps, loads = _envelope_codec(generation, serialize, deserialize)
+    
+    raw = await cache_get_bytes(key)
+    if raw is not None:
+        try:
+            entry_generation, computed_at = _ENVELOPE_HEADER.unpack_from(raw)
+            value = loads(raw)
+            age = time.time() - computed_at
+        except (ValueError, TypeError, struct.error) as e:
+            logger.warning(f"缓存反序列化失败，重新计算: {e}")
+        else:
+            if entry_generation >= generation and age < policy.soft_ttl:
+                return value
+            if age < policy.hard_ttl:
+                monitor.record_swr("stale_served")
+                _mark_stale(age)
+                _schedule_refresh(key, refresh, policy.hard_ttl, dumps, loads)
+                return value
     
-    # 也删除用户信息缓存和项目缓存
+    return await single_flight(
+        key, lambda: _compute_and_store(key, compute, policy.hard_ttl, dumps, loads, binary=True)
+    )
+
+
+async def cache_get_or_compute_scoped(
+    scope: str,
+    scope_id: int,
+    key: Callable[[Optional[int]], str],
+    compute: Callable[[], Any],
+    refresh: Optional[Callable[[], Any]] = None,
+    ttl: int = 300,
+    serialize: Optional[Callable[[Any], bytes]] = None,
+    deserialize: Optional[Callable[[bytes], Any]] = None,
+) -> Any:
+    """
+    按作用域代数失效的缓存读取（二进制存储，适合缓存预序列化的响应体）
+    
+    - keyspace 配置了 SWR 策略且提供了 refresh 时：使用不含代数的稳定 key，
+      写入后先返回旧值（响应带 X-Cache-Stale），后台用 refresh 重算
+    - 否则：key 内嵌代数，写入后同步重算（带 single-flight）
+    
+    Args:
+        scope / scope_id: 代数作用域（如 CacheKeys.SCOPE_USER, user_id）
+        key: 根据代数生成缓存 key 的函数，传入 None 时返回稳定 key
+        compute: 请求内计算（可使用请求的数据库会话）
+        refresh: 后台重算（请求结束后执行，不能依赖请求的会话）
+        serialize / deserialize: 结果与 bytes 互转；默认 None 表示结果本身就是 bytes
+            （预序列化的 JSON 响应体），原样存取
+    """
+    # bytes(b) 对 bytes 对象直接返回原对象，不复制
+    serialize = serialize or bytes
+    deserialize = deserialize or bytes
+    generation = await get_generation(scope, scope_id)
+    policy = swr_policy_for(key(None))
+    if policy is None or refresh is None:
+        return await cache_get_or_compute(
+            key(generation), compute, ttl, serialize, deserialize, binary=True
+        )
+    return await _swr_get_or_compute(
+        key(None), generation, policy, compute, refresh, serialize, deserialize
+    )
+
+
+# 旧版失效开销估算的采样间隔（秒）：Redis 模式下 DBSIZE 在后台按此间隔采样，
+# 失效路径只读取上次的采样值，不增加网络往返
+_LEGACY_COST_SAMPLE_SECONDS = 60.0
+_legacy_cost_sample = {"dbsize": 0, "sampled_at": float("-inf"), "pending": False}
+
+
+async def _sample_redis_dbsize(redis):
+    """后台采样 Redis DBSIZE"""
+    try:
+        _legacy_cost_sample["dbsize"] = await redis.dbsize()
+        _legacy_cost_sample["sampled_at"] = time.monotonic()
+    except Exception as e:
+        logger.warning(f"Redis DBSIZE 失败: {e}")
+    finally:
+        _legacy_cost_sample["pending"] = False
+
+
+async def _legacy_invalidation_cost() -> int:
+    """
+    估算旧版失效方式（4 次按模式 SCAN + DELETE）需要触及的 key 数量
+    
+    Redis：每次 SCAN 都遍历整个 keyspace，共 4 × DBSIZE（取最近一次后台采样值）；
+    内存模式：模式删除退化为 clear()，整个缓存被清空
+    """
+    redis = await get_redis_client()
+    if redis is None:
+        return len(_memory_cache)
+    if (
+        not _legacy_cost_sample["pending"]
+        and time.monotonic() - _legacy_cost_sample["sampled_at"] >= _LEGACY_COST_SAMPLE_SECONDS
+    ):
+        _legacy_cost_sample["pending"] = True
+        run_in_background(_sample_redis_dbsize(redis))
+    return 4 * _legacy_cost_sample["dbsize"]
+
+
+async def invalidate_user_cache(user_id: int, family_id: Optional[int] = None):
+    """
+    使用户相关的缓存失效
+    
+    统计缓存 key 内嵌用户代数，递增代数即可令其全部失效，
+    无需扫描 keyspace；项目列表（含账单计数）递增项目代数，用户信息缓存直接删除。
+    用户在家庭组中时，同时递增家庭代数（家庭统计包含该成员的账单）
+    """
+    legacy_keys = await _legacy_invalidation_cost()
+    
+    await bump_generation(CacheKeys.SCOPE_USER, user_id)
+    await bump_generation(CacheKeys.SCOPE_PROJECT, user_id)
     await cache_delete(CacheKeys.user_key(user_id))
-    _memory_cache.delete(CacheKeys.project_list_key(user_id))
+    keys_touched = 3
+    if family_id:
+        await bump_generation(CacheKeys.SCOPE_FAMILY, family_id)
+        keys_touched += 1
+    
+    # 本次触及：2~3 次 INCR + 1 次 DELETE
+    monitor.record_cache_invalidation(legacy_keys=legacy_keys, keys_touched=keys_touched)
+
+
+async def invalidate_family_cache(family_ids: Iterable[int]):
+    """家庭成员变化（加入、退出、解散）后使家庭统计和成员的主体上下文缓存失效"""
+    for family_id in set(family_ids):
+        await bump_generation(CacheKeys.SCOPE_FAMILY, family_id)
+        await bump_generation(CacheKeys.SCOPE_MEMBERSHIP, family_id)
+
+
+async def invalidate_project_cache(user_id: int):
+    """用户创建、修改或删除项目后使其项目列表缓存失效"""
+    await bump_generation(CacheKeys.SCOPE_PROJECT, user_id)
+
+
+async def invalidate_principal_cache(user_id: int):
+    """用户创建或删除项目后使其主体上下文缓存失效"""
+    await bump_generation(CacheKeys.SCOPE_PRINCIPAL, user_id)
 
 
 async def close_redis():
     """关闭 Redis 连接"""
-    global _redis_client
+    global _redis_client, _redis_binary_client, _invalidation_task
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+        try:
+            await _invalidation_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _invalidation_task = None
+    if _redis_binary_client:
+        await _redis_binary_client.close()
+        _redis_binary_client = None
     if _redis_client:
         await _redis_client.close()
         _redis_client = None
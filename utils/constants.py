@@ -72,6 +72,13 @@ class Pagination:
     MIN_LIMIT = 1
 
 
+# 批量操作限制
+class BatchLimits:
+    """批量操作常量"""
+    CREATE_MAX = 10000  # 单次批量创建上限（写入时按 BILL_BATCH_CHUNK_SIZE 分批提交）
+    DELETE_MAX = 5000  # 单次批量删除上限（一个事务内集合存档、删除）
+
+
 # 字段长度限制
 class FieldLimits:
     """字段长度限制"""
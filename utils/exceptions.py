@@ -18,11 +18,13 @@ class AppException(Exception):
         self,
         message: str,
         status_code: int = status.HTTP_400_BAD_REQUEST,
-        error_code: str = "APP_ERROR"
+        error_code: str = "APP_ERROR",
+        headers: dict = None
     ):
         self.message = message
         self.status_code = status_code
         self.error_code = error_code
+        self.headers = headers
         super().__init__(message)
 
 
@@ -69,11 +71,23 @@ class ConflictException(AppException):
         )
 
 
+class ServiceUnavailableException(AppException):
+    """服务繁忙异常（过载保护，客户端应在 Retry-After 秒后重试）"""
+    def __init__(self, message: str = "服务繁忙，请稍后重试", retry_after: int = 1):
+        super().__init__(
+            message=message,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            error_code="SERVICE_UNAVAILABLE",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
 def create_error_response(
     status_code: int,
     message: str,
     error_code: str = None,
-    details: dict = None
+    details: dict = None,
+    headers: dict = None
 ) -> JSONResponse:
     """创建标准化错误响应"""
     content = {
@@ -88,7 +102,8 @@ def create_error_response(
     
     return JSONResponse(
         status_code=status_code,
-        content=content
+        content=content,
+        headers=headers
     )
 
 
@@ -98,7 +113,8 @@ async def app_exception_handler(request: Request, exc: AppException):
     return create_error_response(
         status_code=exc.status_code,
         message=exc.message,
-        error_code=exc.error_code
+        error_code=exc.error_code,
+        headers=exc.headers
     )
 
 
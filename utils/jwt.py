@@ -1,13 +1,18 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import hashlib
+import logging
 from jose import JWTError, jwt
 from schemas.user import TokenData
 from config import settings
-from collections import OrderedDict
-from threading import RLock
+from utils.cache import (
+    TTLCache, CacheKeys, register_l1_cache, broadcast_invalidation,
+    register_event_handler, broadcast_event, run_in_background, get_redis_client
+)
 import time
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -20,69 +25,38 @@ class TokenCache:
     缓存已验证的 token 结果，避免重复解码
     - 使用 token hash 作为 key（安全性）
     - 设置较短 TTL（5分钟）
-    - LRU 淘汰策略
+    - LRU 淘汰策略，过期回收为 O(1)（复用 TTLCache 的时间轮）
     """
     
     def __init__(self, maxsize: int = 1000, ttl: int = 300):
         self.maxsize = maxsize
         self.ttl = ttl
-        self._cache: OrderedDict = OrderedDict()
-        self._lock = RLock()
+        self._cache = TTLCache(maxsize=maxsize, default_ttl=ttl)
     
     def _hash_token(self, token: str) -> str:
         """对 token 进行哈希（安全性，不存储原始 token）"""
-        return hashlib.sha256(token.encode()).hexdigest()[:32]
+        return CacheKeys.token_key(hashlib.sha256(token.encode()).hexdigest()[:32])
     
     def get(self, token: str) -> Optional[TokenData]:
         """从缓存获取验证结果"""
-        with self._lock:
-            key = self._hash_token(token)
-            if key not in self._cache:
-                return None
-            
-            data, expire_at = self._cache[key]
-            if time.time() > expire_at:
-                del self._cache[key]
-                return None
-            
-            # LRU: 移到末尾
-            self._cache.move_to_end(key)
-            return data
+        return self._cache.get(self._hash_token(token))
     
     def set(self, token: str, data: TokenData, ttl: Optional[int] = None):
         """缓存验证结果"""
-        with self._lock:
-            key = self._hash_token(token)
-            expire_at = time.time() + (ttl or self.ttl)
-            self._cache[key] = (data, expire_at)
-            self._cache.move_to_end(key)
-            self._cleanup()
+        self._cache.set(self._hash_token(token), data, ttl or self.ttl)
     
     def invalidate(self, token: str):
         """使缓存失效"""
-        with self._lock:
-            key = self._hash_token(token)
-            self._cache.pop(key, None)
+        self._cache.delete(self._hash_token(token))
     
     def clear(self):
         """清空缓存"""
-        with self._lock:
-            self._cache.clear()
-    
-    def _cleanup(self):
-        """清理过期和超限项"""
-        now = time.time()
-        # 删除过期项
-        expired = [k for k, (_, exp) in self._cache.items() if now > exp]
-        for k in expired:
-            del self._cache[k]
-        # 删除超限项
-        while len(self._cache) > self.maxsize:
-            self._cache.popitem(last=False)
+        self._cache.clear()
 
 
 # 全局 Token 缓存实例
 _token_cache = TokenCache(maxsize=2000, ttl=300)
+register_l1_cache("token", _token_cache._cache)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -112,9 +86,17 @@ def verify_token(token: str, credentials_exception):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        user_id = payload.get("uid")
+        # 缺少 uid/epoch 声明的旧格式令牌需要重新登录
+        if username is None or user_id is None or payload.get("epoch") is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        token_data = TokenData(
+            username=username,
+            user_id=user_id,
+            family_id=payload.get("fid"),
+            tz_offset_minutes=payload.get("tz"),
+            epoch=payload["epoch"],
+        )
     except JWTError:
         raise credentials_exception
     
@@ -130,11 +112,103 @@ def verify_token(token: str, credentials_exception):
     return token_data
 
 
-def invalidate_token(token: str):
-    """使 token 缓存失效（用于登出等场景）"""
-    _token_cache.invalidate(token)
+async def invalidate_token(token: str):
+    """使 token 缓存失效（用于登出等场景，广播到所有 worker）"""
+    await broadcast_invalidation(keys=[_token_cache._hash_token(token)], cache="token")
+
+
+async def clear_token_cache():
+    """清空 token 缓存（用于密钥轮换等场景，广播到所有 worker）"""
+    await broadcast_invalidation(patterns=["*"], cache="token")
+
+
+# ==================== 令牌吊销 ====================
+# 每个用户的令牌带有 epoch 声明；登出全部设备、家庭或时区变化时递增用户的 token_epoch，
+# 并在这里记录"该用户最小有效 epoch"。记录只需保留到旧令牌全部过期为止，
+# 所以集合很小，每个 worker 在内存中持有完整副本，校验时无需任何 I/O。
+# 多 worker 部署时通过 Redis Hash 持久化、通过失效频道广播；
+# 未配置 Redis 时集合只在本进程有效，get_current_user 回退到查库比对 epoch。
+
+REVOCATION_KEY = "auth:revoked"
+REVOCATION_EVENT = "token_revocation"
+
+# user_id -> (最小有效 epoch, 记录过期时间戳)
+_revoked_epochs: Dict[int, Tuple[int, float]] = {}
+
+
+def revocation_is_shared() -> bool:
+    """吊销集合是否在 worker 之间共享（配置了 Redis）"""
+    return bool(settings.REDIS_URL)
+
+
+def is_token_revoked(user_id: int, epoch: int) -> bool:
+    """令牌的 epoch 是否低于该用户的最小有效 epoch"""
+    entry = _revoked_epochs.get(user_id)
+    if entry is None:
+        return False
+    min_epoch, expires_at = entry
+    if expires_at < time.time():
+        _revoked_epochs.pop(user_id, None)
+        return False
+    return epoch < min_epoch
+
+
+def _apply_revocations(payload: Dict):
+    """合并吊销记录（只提升，不回退；payload 来自广播时 key 为字符串）"""
+    for user_id, (epoch, expires_at) in payload.items():
+        user_id = int(user_id)
+        current = _revoked_epochs.get(user_id)
+        if current is None or epoch >= current[0]:
+            _revoked_epochs[user_id] = (epoch, expires_at)
+
+
+async def _publish_revocations(payload: Dict):
+    """写入 Redis Hash（供新启动/重连的 worker 同步）并广播"""
+    redis = await get_redis_client()
+    if redis:
+        try:
+            await redis.hset(REVOCATION_KEY, mapping={
+                str(user_id): f"{epoch}:{expires_at}" for user_id, (epoch, expires_at) in payload.items()
+            })
+            # 整个 Hash 在最后一次吊销后的令牌有效期内保留
+            await redis.expire(REVOCATION_KEY, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        except Exception as e:
+            logger.warning(f"Redis 写入令牌吊销失败: {e}")
+    await broadcast_event(REVOCATION_EVENT, payload)
+
+
+async def _load_revocations():
+    """从 Redis 全量同步吊销集合，顺带清理已过期的记录"""
+    redis = await get_redis_client()
+    if redis is None:
+        return
+    entries = await redis.hgetall(REVOCATION_KEY)
+    now = time.time()
+    payload, expired = {}, []
+    for user_id, value in entries.items():
+        epoch, expires_at = value.split(":")
+        if float(expires_at) < now:
+            expired.append(user_id)
+        else:
+            payload[user_id] = (int(epoch), float(expires_at))
+    _apply_revocations(payload)
+    if expired:
+        await redis.hdel(REVOCATION_KEY, *expired)
+
+
+def revoke_token_epochs(revocations: Dict[int, int]):
+    """
+    吊销用户在指定 epoch 之前签发的令牌（在事务提交后调用）
+    
+    立即作用于本进程，Redis 同步与广播在后台完成（可从同步代码调用）
+    
+    Args:
+        revocations: {user_id: 新的最小有效 epoch}
+    """
+    expires_at = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    payload = {user_id: (epoch, expires_at) for user_id, epoch in revocations.items()}
+    _apply_revocations(payload)
+    run_in_background(_publish_revocations(payload))
 
 
-def clear_token_cache():
-    """清空 token 缓存（用于密钥轮换等场景）"""
-    _token_cache.clear()
\ No newline at end of file
+register_event_handler(REVOCATION_EVENT, _apply_revocations, resync=_load_revocations)
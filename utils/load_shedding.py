@@ -0,0 +1,153 @@
+"""
+过载保护（ASGI 层负载削减）
+
+连接池全部被占用时，请求会在检出连接处一直等到连接池超时，之后才被记为慢请求。
+这里在 ASGI 层提前判断过载，拒绝低优先级请求（统计、导出），把连接和事件循环留给
+记账和认证：
+
+- 连接池检出等待：异步引擎的连接池每次检出都上报等待时长（见 db.async_database）
+- 事件循环延迟：后台任务定时 sleep，实际唤醒时间与预期之差即为延迟
+
+两个信号都做指数平滑，并随时间衰减（没有新样本时过载判定自动解除）。
+任一信号超过目标值时，低优先级路径直接返回 503 + Retry-After，不进入路由和依赖。
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import status
+
+from config import settings
+from utils.exceptions import create_error_response
+from utils.performance import monitor
+
+logger = logging.getLogger(__name__)
+
+
+class _DecayingAverage:
+    """随时间衰减的指数平滑值（O(1) 存储）"""
+    
+    def __init__(self, decay_seconds: float, alpha: float = 0.2):
+        self.decay_seconds = decay_seconds
+        self.alpha = alpha
+        self._value = 0.0
+        self._updated = time.monotonic()
+    
+    def value(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return self._value * math.exp(-(now - self._updated) / self.decay_seconds)
+    
+    def add(self, sample: float) -> None:
+        now = time.monotonic()
+        current = self.value(now)
+        self._value = current + self.alpha * (sample - current)
+        self._updated = now
+    
+    def reset(self) -> None:
+        self._value = 0.0
+        self._updated = time.monotonic()
+
+
+class LoadShedder:
+    """过载判定：连接池检出等待和事件循环延迟（毫秒）"""
+    
+    def __init__(self):
+        self.pool_wait = _DecayingAverage(settings.SHED_DECAY_SECONDS)
+        self.loop_lag = _DecayingAverage(settings.SHED_DECAY_SECONDS)
+        self.low_priority_paths: Tuple[str, ...] = tuple(
+            p.strip() for p in settings.SHED_LOW_PRIORITY_PATHS.split(",") if p.strip()
+        )
+    
+    def record_pool_wait(self, seconds: float) -> None:
+        """连接池检出等待时长（在持有事件循环的线程中调用）"""
+        self.pool_wait.add(seconds * 1000)
+    
+    def record_loop_lag(self, seconds: float) -> None:
+        self.loop_lag.add(seconds * 1000)
+    
+    def overload_reason(self) -> Optional[str]:
+        """超过目标值的信号名，未过载时为 None"""
+        if self.pool_wait.value() > settings.SHED_POOL_WAIT_TARGET_MS:
+            return "pool_wait"
+        if self.loop_lag.value() > settings.SHED_LOOP_LAG_TARGET_MS:
+            return "loop_lag"
+        return None
+    
+    def is_low_priority(self, path: str) -> bool:
+        return path.startswith(self.low_priority_paths)
+    
+    def snapshot(self) -> Dict[str, float]:
+        """当前信号值，供监控接口展示"""
+        return {
+            "pool_wait_ms": round(self.pool_wait.value(), 2),
+            "loop_lag_ms": round(self.loop_lag.value(), 2),
+            "pool_wait_target_ms": settings.SHED_POOL_WAIT_TARGET_MS,
+            "loop_lag_target_ms": settings.SHED_LOOP_LAG_TARGET_MS,
+        }
+
+
+# 全局过载判定（每个 worker 一个）
+load_shedder = LoadShedder()
+
+_lag_task: Optional[asyncio.Task] = None
+
+
+async def _sample_loop_lag(interval: float):
+    """定时唤醒，记录实际唤醒时间比预期晚了多少"""
+    while True:
+        expected = time.monotonic() + interval
+        await asyncio.sleep(interval)
+        load_shedder.record_loop_lag(max(0.0, time.monotonic() - expected))
+
+
+def start_load_monitor() -> None:
+    """启动事件循环延迟采样（在应用启动时调用）"""
+    global _lag_task
+    if settings.SHED_ENABLED and (_lag_task is None or _lag_task.done()):
+        _lag_task = asyncio.get_running_loop().create_task(_sample_loop_lag(settings.SHED_LAG_INTERVAL))
+
+
+async def stop_load_monitor() -> None:
+    """停止事件循环延迟采样"""
+    global _lag_task
+    if _lag_task is not None:
+        _lag_task.cancel()
+        try:
+            await _lag_task
+        except asyncio.CancelledError:
+            pass
+        _lag_task = None
+
+
+class LoadSheddingMiddleware:
+    """
+    过载时在 ASGI 层直接拒绝低优先级请求
+    
+    纯 ASGI 中间件：未过载或非低优先级路径时只多一次前缀判断，不包装 receive/send
+    """
+    
+    def __init__(self, app, shedder: LoadShedder = load_shedder):
+        self.app = app
+        self.shedder = shedder
+    
+    async def __call__(self, scope, receive, send):
+        if (
+            settings.SHED_ENABLED
+            and scope["type"] == "http"
+            and self.shedder.is_low_priority(scope["path"])
+        ):
+            reason = self.shedder.overload_reason()
+            if reason:
+                monitor.record_load_shed(reason)
+                logger.debug(f"过载保护拒绝请求 ({reason}): {scope['method']} {scope['path']}")
+                response = create_error_response(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    message="服务繁忙，请稍后重试",
+                    error_code="SERVICE_UNAVAILABLE",
+                    headers={"Retry-After": str(settings.SHED_RETRY_AFTER)},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,70 @@
+"""
+游标分页工具模块
+
+基于 (date, id) 的键集分页（Keyset Pagination）：
+- 游标对客户端不透明（base64 编码）
+- 查询直接定位到索引位置，深分页与首页开销相同
+- 并发插入不会导致翻页时数据重复或遗漏
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from sqlalchemy import and_, or_
+from utils.exceptions import AppException
+
+
+def encode_cursor(date: datetime, row_id: int) -> str:
+    """
+    将最后一条记录的 (date, id) 编码为不透明游标
+
+    Args:
+        date: 最后一条记录的日期时间
+        row_id: 最后一条记录的ID
+
+    Returns:
+        URL 安全的游标字符串
+    """
+    if date.tzinfo is None:
+        # 数据库存储的是 UTC（SQLite 读出时不带时区）
+        date = date.replace(tzinfo=timezone.utc)
+    payload = json.dumps([date.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    解码游标
+
+    Raises:
+        AppException: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        date = datetime.fromisoformat(date_str)
+        if not isinstance(row_id, int):
+            raise ValueError("invalid id")
+    except (ValueError, TypeError, binascii.Error, json.JSONDecodeError):
+        raise AppException(message="无效的分页游标", error_code="INVALID_CURSOR")
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date, row_id
+
+
+def keyset_before(date_column, id_column, cursor: Optional[str]):
+    """
+    构建 "位于游标之后"（按 date DESC, id DESC 排序）的查询条件
+
+    Returns:
+        SQLAlchemy 条件表达式；cursor 为空时返回 None
+    """
+    if not cursor:
+        return None
+    last_date, last_id = decode_cursor(cursor)
+    return or_(
+        date_column < last_date,
+        and_(date_column == last_date, id_column < last_id),
+    )
@@ -0,0 +1,138 @@
+"""
+密码哈希进程池
+
+bcrypt 是 CPU 密集操作（成本因子 12 时单次约 250ms）。在同步路由中执行会占满
+AnyIO 共享线程池（默认 40 个线程），登录高峰或撞库时会拖慢所有同步接口。
+
+这里把哈希放到独立的进程池执行：
+- 进程数固定（PASSWORD_HASH_WORKERS），不与其他接口争用线程池，也不受 GIL 影响
+- 排队上限（PASSWORD_HASH_MAX_PENDING）：已满时立即返回 503，而不是让请求无限堆积
+- 工作进程异常退出（BrokenProcessPool）时丢弃旧进程池，在新进程池上重试一次，仍失败返回 503
+"""
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+
+from config import settings
+from utils.exceptions import ServiceUnavailableException
+from utils.performance import monitor
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# 已提交（执行中 + 排队中）的哈希任务数，只在事件循环线程中修改
+_pending = 0
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    """在工作进程中执行"""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    """在工作进程中执行"""
+    return bcrypt.checkpw(password, hashed)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """惰性创建进程池（spawn：不继承父进程的连接池和线程状态）"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"密码哈希进程池已启动: {settings.PASSWORD_HASH_WORKERS} 个进程")
+    return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """丢弃已损坏的进程池（并发请求可能已经换上新池，只丢弃自己用的那个）"""
+    global _executor
+    if _executor is executor:
+        _executor = None
+        logger.error("密码哈希工作进程异常退出，进程池将重建")
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _submit(func, *args):
+    """
+    提交到进程池；排队已满时快速失败
+    
+    进程池损坏（工作进程被杀、OOM 等）后所有提交都会抛 BrokenProcessPool，
+    这里重建进程池并重试一次，避免之后的登录、注册一直失败到进程重启
+    """
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        monitor.record_password_hash("rejected")
+        raise ServiceUnavailableException("登录请求过多，请稍后重试")
+    
+    _pending += 1
+    try:
+        for attempt in range(2):
+            executor = _get_executor()
+            try:
+                result = await asyncio.wrap_future(executor.submit(func, *args))
+            except BrokenProcessPool:
+                _discard_executor(executor)
+                monitor.record_password_hash("broken")
+                if attempt:
+                    raise ServiceUnavailableException("登录服务暂不可用，请稍后重试")
+                continue
+            monitor.record_password_hash("completed")
+            return result
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """
+    生成密码哈希
+    
+    Raises:
+        ServiceUnavailableException: 进程池排队已满或重建后仍不可用
+    """
+    hashed = await _submit(_hashpw, password.encode("utf-8"), rounds or settings.BCRYPT_ROUNDS)
+    return hashed.decode("utf-8")
+
+
+async def check_password(password: str, hashed_password: str) -> bool:
+    """
+    校验密码
+    
+    Raises:
+        ServiceUnavailableException: 进程池排队已满或重建后仍不可用
+    """
+    return await _submit(_checkpw, password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """从 bcrypt 哈希（$2b$12$...）中解析成本因子，无法解析时返回 0"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """哈希成本因子低于当前配置时需要升级"""
+    return hash_rounds(hashed_password) < settings.BCRYPT_ROUNDS
+
+
+def pending_count() -> int:
+    """当前已提交的哈希任务数"""
+    return _pending
+
+
+def shutdown_password_pool():
+    """关闭进程池（应用关闭时调用）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
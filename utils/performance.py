@@ -13,7 +13,7 @@ from typing import Optional, Dict, Any
 from collections import defaultdict
 from threading import RLock
 from functools import wraps
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -44,6 +44,30 @@ class CacheMetrics:
         return self.hits / total if total > 0 else 0.0
 
 
+@dataclass
+class AdmissionMetrics:
+    """重接口准入控制指标"""
+    admitted: int = 0
+    queued: int = 0              # 需要排队后才放行的请求数
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    rejected: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    
+    @property
+    def avg_queue_wait(self) -> float:
+        return self.queue_wait_total / self.queued if self.queued > 0 else 0.0
+
+
+@dataclass
+class InvalidationMetrics:
+    """缓存失效开销指标"""
+    count: int = 0
+    legacy_keys: int = 0   # 旧版 SCAN + DELETE 方式需要触及的 key 数
+    keys_touched: int = 0  # 代数计数器方式实际触及的 key 数
+    last_legacy_keys: int = 0
+    last_keys_touched: int = 0
+
+
 class PerformanceMonitor:
     """
     性能监控器（单例）
@@ -68,6 +92,13 @@ class PerformanceMonitor:
         self._lock = RLock()
         self._request_metrics: Dict[str, RequestMetrics] = defaultdict(RequestMetrics)
         self._cache_metrics = CacheMetrics()
+        self._tier_metrics: Dict[str, CacheMetrics] = defaultdict(CacheMetrics)
+        self._invalidation_metrics = InvalidationMetrics()
+        self._single_flight: Dict[str, int] = defaultdict(int)
+        self._swr: Dict[str, int] = defaultdict(int)
+        self._password_hash: Dict[str, int] = defaultdict(int)
+        self._admission: Dict[str, AdmissionMetrics] = defaultdict(AdmissionMetrics)
+        self._load_shed: Dict[str, int] = defaultdict(int)
         self._db_query_count = 0
         self._db_query_time = 0.0
         self._slow_queries: list = []
@@ -85,15 +116,91 @@ class PerformanceMonitor:
             if is_error:
                 metrics.errors += 1
     
-    def record_cache_hit(self):
-        """记录缓存命中"""
+    def record_cache_hit(self, tier: str = "l1"):
+        """记录缓存命中（tier: l1 进程内 / l2 Redis）"""
         with self._lock:
             self._cache_metrics.hits += 1
+            self._tier_metrics[tier].hits += 1
+    
+    def record_cache_miss(self, tier: str = "l1", final: bool = True):
+        """
+        记录缓存未命中
+        
+        Args:
+            tier: 未命中的层级
+            final: 是否为最后一级（L1 未命中但还会查询 L2 时为 False）
+        """
+        with self._lock:
+            self._tier_metrics[tier].misses += 1
+            if final:
+                self._cache_metrics.misses += 1
+    
+    def record_single_flight(self, kind: str):
+        """
+        记录被合并的缓存未命中请求
+        
+        kind: local（等待本进程内的计算）/ distributed（等待其他 worker 的计算）/
+              lock_timeout（等待超时后自行计算）
+        """
+        with self._lock:
+            self._single_flight[kind] += 1
+    
+    def record_swr(self, kind: str):
+        """
+        记录 stale-while-revalidate 事件
+        
+        kind: stale_served（返回旧值）/ refresh（触发后台重算）/ refresh_error（后台重算失败）
+        """
+        with self._lock:
+            self._swr[kind] += 1
+    
+    def record_password_hash(self, kind: str):
+        """
+        记录密码哈希进程池事件
+        
+        kind: completed（完成）/ rejected（排队已满，返回 503）/
+              negative_hit（未知用户名命中负缓存）/ rehash（登录时升级成本因子）/
+              broken（工作进程异常退出，进程池重建）
+        """
+        with self._lock:
+            self._password_hash[kind] += 1
+    
+    def record_admission(self, route: str, wait: float, rejected: Optional[str] = None):
+        """
+        记录重接口准入结果
+        
+        wait: 排队等待秒数（未排队为 0）
+        rejected: 被拒绝的原因 budget（成本预算用尽）/ queue_full（排队已满）/ timeout（排队超时），放行时为 None
+        """
+        with self._lock:
+            metrics = self._admission[route]
+            if rejected:
+                metrics.rejected[rejected] += 1
+            else:
+                metrics.admitted += 1
+            if wait > 0:
+                metrics.queued += 1
+                metrics.queue_wait_total += wait
+                metrics.queue_wait_max = max(metrics.queue_wait_max, wait)
+    
+    def record_load_shed(self, reason: str):
+        """
+        记录过载保护拒绝的请求
+        
+        reason: pool_wait（连接池检出等待超标）/ loop_lag（事件循环延迟超标）
+        """
+        with self._lock:
+            self._load_shed[reason] += 1
     
-    def record_cache_miss(self):
-        """记录缓存未命中"""
+    def record_cache_invalidation(self, legacy_keys: int, keys_touched: int):
+        """记录一次缓存失效：旧方式需触及的 key 数与当前实际触及数"""
         with self._lock:
-            self._cache_metrics.misses += 1
+            metrics = self._invalidation_metrics
+            metrics.count += 1
+            metrics.legacy_keys += legacy_keys
+            metrics.keys_touched += keys_touched
+            metrics.last_legacy_keys = legacy_keys
+            metrics.last_keys_touched = keys_touched
     
     def record_db_query(self, duration: float, sql: Optional[str] = None):
         """记录数据库查询"""
@@ -127,6 +234,7 @@ class PerformanceMonitor:
                 reverse=True
             )[:5]
             
+            invalidation = self._invalidation_metrics
             return {
                 "uptime_seconds": uptime,
                 "requests": {
@@ -139,6 +247,50 @@ class PerformanceMonitor:
                     "hits": self._cache_metrics.hits,
                     "misses": self._cache_metrics.misses,
                     "hit_rate": f"{self._cache_metrics.hit_rate:.2%}",
+                    "tiers": {
+                        tier: {"hits": m.hits, "misses": m.misses, "hit_rate": f"{m.hit_rate:.2%}"}
+                        for tier, m in self._tier_metrics.items()
+                    },
+                },
+                "single_flight": {
+                    "coalesced_local": self._single_flight["local"],
+                    "coalesced_distributed": self._single_flight["distributed"],
+                    "lock_timeouts": self._single_flight["lock_timeout"],
+                },
+                "stale_while_revalidate": {
+                    "stale_served": self._swr["stale_served"],
+                    "refreshes": self._swr["refresh"],
+                    "refresh_errors": self._swr["refresh_error"],
+                },
+                "password_hash": {
+                    "completed": self._password_hash["completed"],
+                    "rejected": self._password_hash["rejected"],
+                    "negative_cache_hits": self._password_hash["negative_hit"],
+                    "rehashed": self._password_hash["rehash"],
+                    "pool_rebuilt": self._password_hash["broken"],
+                },
+                "admission": {
+                    route: {
+                        "admitted": m.admitted,
+                        "queued": m.queued,
+                        "rejected": dict(m.rejected),
+                        "avg_queue_wait_ms": round(m.avg_queue_wait * 1000, 2),
+                        "max_queue_wait_ms": round(m.queue_wait_max * 1000, 2),
+                    }
+                    for route, m in self._admission.items()
+                },
+                "load_shedding": {
+                    "shed": sum(self._load_shed.values()),
+                    "by_reason": dict(self._load_shed),
+                },
+                "cache_invalidation": {
+                    "count": invalidation.count,
+                    "legacy_keys_touched": invalidation.legacy_keys,
+                    "keys_touched": invalidation.keys_touched,
+                    "avg_legacy_keys": invalidation.legacy_keys / invalidation.count if invalidation.count > 0 else 0,
+                    "avg_keys_touched": invalidation.keys_touched / invalidation.count if invalidation.count > 0 else 0,
+                    "last_legacy_keys": invalidation.last_legacy_keys,
+                    "last_keys_touched": invalidation.last_keys_touched,
                 },
                 "database": {
                     "query_count": self._db_query_count,
@@ -157,6 +309,13 @@ class PerformanceMonitor:
         with self._lock:
             self._request_metrics.clear()
             self._cache_metrics = CacheMetrics()
+            self._tier_metrics.clear()
+            self._invalidation_metrics = InvalidationMetrics()
+            self._single_flight.clear()
+            self._swr.clear()
+            self._password_hash.clear()
+            self._admission.clear()
+            self._load_shed.clear()
             self._db_query_count = 0
             self._db_query_time = 0.0
             self._slow_queries.clear()
@@ -1,92 +1,141 @@
 """
-简单的内存速率限制器
+速率限制（GCRA）
 
-用于保护登录、注册等敏感接口，防止暴力破解
+使用 GCRA（Generic Cell Rate Algorithm，等价于令牌桶）限制请求速率：
+每个 key 只保存一个数（理论到达时间 TAT），判定和更新都是 O(1)，无需保存请求时间列表或定期全量清理。
+
+- 配置了 REDIS_URL 时通过 Lua 脚本在 Redis 中原子执行，多个 worker 共享同一配额
+- 未配置或 Redis 出错时回退到进程内实现（TTLCache，过期自动回收）
+- 以依赖形式挂到任意路由上，响应带 RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset 头
 """
+import math
 import time
-from collections import defaultdict
-from typing import Tuple
-from functools import wraps
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict
 from fastapi import HTTPException, status, Request
+from config import settings
+from utils.cache import TTLCache, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1]: 限流 key；ARGV[1]: 发放间隔（秒）；ARGV[2]: 突发容量对应的时长（秒）；ARGV[3]: 本次消耗的配额
+# 使用 Redis 服务器时间，各 worker 时钟不一致也不影响判定；浮点数以字符串返回避免被截断
+_GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - burst
+if now < allow_at then
+    return {0, tostring(allow_at - now), tostring(tat - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0', tostring(new_tat - now)}
+"""
+
+
+@dataclass
+class RateLimitDecision:
+    """一次限流判定的结果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float   # 配额完全恢复还需的秒数
+    retry_after: float   # 被限制时需要等待的秒数
+    window_seconds: int
+    
+    def headers(self) -> Dict[str, str]:
+        """RateLimit-* 响应头（IETF draft-ietf-httpapi-ratelimit-headers）"""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "RateLimit-Policy": f"{self.limit};w={self.window_seconds}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _decide(
+    allowed: bool, limit: int, window_seconds: int, interval: float,
+    retry_after: float, backlog: float
+) -> RateLimitDecision:
+    """由 GCRA 状态（backlog = TAT - now）换算剩余配额"""
+    remaining = 0
+    if allowed:
+        remaining = max(0, int((window_seconds - backlog) / interval + 1e-9))
+    return RateLimitDecision(
+        allowed=allowed,
+        limit=limit,
+        remaining=remaining,
+        reset_after=max(0.0, backlog),
+        retry_after=retry_after,
+        window_seconds=window_seconds,
+    )
 
 
 class RateLimiter:
     """
-    简单的内存速率限制器
+    GCRA 速率限制器
     
-    注意：这是单进程内存实现，不适合多进程/分布式部署
-    生产环境建议使用 Redis 实现
+    时间窗口 window_seconds 内最多 max_requests 次，请求在窗口内匀速恢复
+    （每 window_seconds / max_requests 秒恢复一次配额），允许一次性突发 max_requests 次
     """
     
-    def __init__(self):
-        # 存储格式: {key: [(timestamp1, count1), (timestamp2, count2), ...]}
-        self._requests = defaultdict(list)
-        self._cleanup_interval = 60  # 每60秒清理一次过期数据
-        self._last_cleanup = time.time()
+    def __init__(self, maxsize: int = 100_000):
+        # 进程内回退：key -> TAT（单调时钟），TTL 到期即配额已完全恢复
+        self._requests = TTLCache(maxsize=maxsize, default_ttl=60)
     
-    def _cleanup(self):
-        """清理过期的请求记录"""
-        now = time.time()
-        if now - self._last_cleanup < self._cleanup_interval:
-            return
-        
-        self._last_cleanup = now
-        expired_keys = []
-        
-        for key, requests in self._requests.items():
-            # 保留最近5分钟的记录
-            self._requests[key] = [r for r in requests if now - r < 300]
-            if not self._requests[key]:
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del self._requests[key]
+    def _hit_local(self, key: str, max_requests: int, window_seconds: int, cost: int) -> RateLimitDecision:
+        interval = window_seconds / max_requests
+        now = time.monotonic()
+        tat = max(self._requests.get(key) or now, now)
+        new_tat = tat + interval * cost
+        allow_at = new_tat - window_seconds
+        if now < allow_at:
+            return _decide(False, max_requests, window_seconds, interval, allow_at - now, tat - now)
+        self._requests.set(key, new_tat, new_tat - now)
+        return _decide(True, max_requests, window_seconds, interval, 0.0, new_tat - now)
     
-    def is_rate_limited(
-        self, 
-        key: str, 
-        max_requests: int, 
-        window_seconds: int
-    ) -> Tuple[bool, int]:
+    async def hit(
+        self, key: str, max_requests: int, window_seconds: int, cost: int = 1
+    ) -> RateLimitDecision:
         """
-        检查是否超过速率限制
+        消耗配额并返回判定结果
         
         Args:
-            key: 限制的键（如用户IP或用户名）
-            max_requests: 时间窗口内最大请求数
+            key: 限制的键（如 "login:1.2.3.4"）
+            max_requests: 时间窗口内最大请求数（或最大成本）
             window_seconds: 时间窗口（秒）
-        
-        Returns:
-            (是否被限制, 剩余可用请求数)
+            cost: 本次消耗的配额（开销较大的请求可以按成本计）
         """
-        self._cleanup()
-        
-        now = time.time()
-        window_start = now - window_seconds
-        
-        # 获取时间窗口内的请求
-        recent_requests = [r for r in self._requests[key] if r > window_start]
-        self._requests[key] = recent_requests
-        
-        if len(recent_requests) >= max_requests:
-            return True, 0
-        
-        # 记录本次请求
-        self._requests[key].append(now)
-        return False, max_requests - len(recent_requests)
-    
-    def get_retry_after(self, key: str, window_seconds: int) -> int:
-        """获取需要等待的秒数"""
-        if key not in self._requests or not self._requests[key]:
-            return 0
-        
-        oldest_request = min(self._requests[key])
-        wait_time = window_seconds - (time.time() - oldest_request)
-        return max(0, int(wait_time))
+        redis = await get_redis_client()
+        if redis:
+            interval = window_seconds / max_requests
+            try:
+                allowed, retry_after, backlog = await redis.eval(
+                    _GCRA_SCRIPT, 1, f"ratelimit:{key}", interval, window_seconds, cost
+                )
+                return _decide(
+                    bool(int(allowed)), max_requests, window_seconds, interval,
+                    float(retry_after), float(backlog)
+                )
+            except Exception as e:
+                logger.warning(f"Redis 限流失败，回退到进程内限流: {e}")
+        return self._hit_local(key, max_requests, window_seconds, cost)
 
 
 # 全局速率限制器实例
-rate_limiter = RateLimiter()
+rate_limiter = RateLimiter(maxsize=settings.RATE_LIMIT_MEMORY_MAXSIZE)
 
 
 def get_client_ip(request: Request) -> str:
@@ -103,90 +152,73 @@ def get_client_ip(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
-def rate_limit(max_requests: int = 5, window_seconds: int = 60):
+async def enforce_rate_limit(
+    request: Request,
+    key: str,
+    max_requests: int,
+    window_seconds: int,
+    cost: int = 1
+) -> RateLimitDecision:
     """
-    速率限制装饰器
+    消耗配额；超限时抛出 429，否则把 RateLimit-* 头留给响应中间件写出
     
-    Args:
-        max_requests: 时间窗口内最大请求数
-        window_seconds: 时间窗口（秒）
+    Raises:
+        HTTPException: 超过限制时抛出 429 错误
+    """
+    decision = await rate_limiter.hit(key, max_requests, window_seconds, cost)
+    if not decision.allowed:
+        retry_after = decision.headers()["Retry-After"]
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"请求过于频繁，请在 {retry_after} 秒后重试",
+            headers=decision.headers()
+        )
+    # 同一请求挂了多个限流依赖时，保留剩余配额最少的那个
+    current = getattr(request.state, "rate_limit", None)
+    if current is None or decision.remaining < current.remaining:
+        request.state.rate_limit = decision
+    return decision
+
+
+class RateLimit:
+    """
+    速率限制依赖，可挂到任意路由或路由器上
     
     Usage:
-        @router.post("/login")
-        @rate_limit(max_requests=5, window_seconds=60)
-        def login(request: Request, ...):
-            ...
-    """
-    def decorator(func):
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # 从 kwargs 中获取 request
-            request = kwargs.get('request')
-            if not request:
-                # 尝试从 args 中查找 Request 对象
-                for arg in args:
-                    if isinstance(arg, Request):
-                        request = arg
-                        break
-            
-            if request:
-                client_ip = get_client_ip(request)
-                key = f"{func.__name__}:{client_ip}"
-                
-                is_limited, remaining = rate_limiter.is_rate_limited(
-                    key, max_requests, window_seconds
-                )
-                
-                if is_limited:
-                    retry_after = rate_limiter.get_retry_after(key, window_seconds)
-                    raise HTTPException(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        detail=f"请求过于频繁，请在 {retry_after} 秒后重试",
-                        headers={"Retry-After": str(retry_after)}
-                    )
-            
-            return await func(*args, **kwargs)
-        
-        @wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            request = kwargs.get('request')
-            if not request:
-                for arg in args:
-                    if isinstance(arg, Request):
-                        request = arg
-                        break
-            
-            if request:
-                client_ip = get_client_ip(request)
-                key = f"{func.__name__}:{client_ip}"
-                
-                is_limited, remaining = rate_limiter.is_rate_limited(
-                    key, max_requests, window_seconds
-                )
-                
-                if is_limited:
-                    retry_after = rate_limiter.get_retry_after(key, window_seconds)
-                    raise HTTPException(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        detail=f"请求过于频繁，请在 {retry_after} 秒后重试",
-                        headers={"Retry-After": str(retry_after)}
-                    )
-            
-            return func(*args, **kwargs)
+        @router.post("/login", dependencies=[Depends(RateLimit(10, 60, "login"))])
         
-        # 根据原函数类型返回对应的包装器
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        return sync_wrapper
+        # 整个路由器
+        router = APIRouter(dependencies=[Depends(RateLimit(120, 60, "bills"))])
     
-    return decorator
+    默认按客户端 IP 限制；按用户限制见 routers.auth.user_rate_limit
+    """
+    
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        name: str,
+        key: Callable[[Request], str] = get_client_ip
+    ):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.name = name
+        self.key = key
+    
+    async def hit(self, request: Request, identity: str) -> RateLimitDecision:
+        """按指定身份消耗一次配额"""
+        return await enforce_rate_limit(
+            request, f"{self.name}:{identity}", self.max_requests, self.window_seconds
+        )
+    
+    async def __call__(self, request: Request):
+        await self.hit(request, self.key(request))
 
 
-def check_rate_limit(
-    request: Request, 
-    action: str, 
-    max_requests: int = 5, 
+async def check_rate_limit(
+    request: Request,
+    action: str,
+    max_requests: int = 5,
     window_seconds: int = 60
 ) -> None:
     """
@@ -201,17 +233,4 @@ def check_rate_limit(
     Raises:
         HTTPException: 超过限制时抛出 429 错误
     """
-    client_ip = get_client_ip(request)
-    key = f"{action}:{client_ip}"
-    
-    is_limited, remaining = rate_limiter.is_rate_limited(
-        key, max_requests, window_seconds
-    )
-    
-    if is_limited:
-        retry_after = rate_limiter.get_retry_after(key, window_seconds)
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"请求过于频繁，请在 {retry_after} 秒后重试",
-            headers={"Retry-After": str(retry_after)}
-        )
+    await enforce_rate_limit(request, f"{action}:{get_client_ip(request)}", max_requests, window_seconds)
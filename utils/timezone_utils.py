@@ -9,8 +9,8 @@
 注意：此模块使用 Python 标准库的 timezone
 如需更复杂的时区处理，可安装 pytz 或 zoneinfo
 """
-from datetime import datetime, timezone, timedelta
-from typing import Optional
+from datetime import datetime, date, timezone, timedelta
+from typing import Optional, Tuple
 import os
 
 # 默认本地时区偏移（东八区，北京时间）
@@ -18,11 +18,28 @@ import os
 DEFAULT_TZ_OFFSET_HOURS = int(os.getenv("TZ_OFFSET_HOURS", "8"))
 
 
+# 合法的 UTC 偏移范围（分钟）：UTC-12:00 ~ UTC+14:00
+MIN_TZ_OFFSET_MINUTES = -12 * 60
+MAX_TZ_OFFSET_MINUTES = 14 * 60
+
+
 def get_local_timezone() -> timezone:
     """获取本地时区对象"""
     return timezone(timedelta(hours=DEFAULT_TZ_OFFSET_HOURS))
 
 
+def get_user_timezone(offset_minutes: Optional[int] = None) -> timezone:
+    """
+    获取用户时区对象
+    
+    Args:
+        offset_minutes: 用户设置的 UTC 偏移（分钟），为空时使用全局默认时区
+    """
+    if offset_minutes is None:
+        return get_local_timezone()
+    return timezone(timedelta(minutes=offset_minutes))
+
+
 def to_utc(dt: Optional[datetime]) -> Optional[datetime]:
     """
     将任意时区的 datetime 转换为 UTC
@@ -49,7 +66,7 @@ def to_utc(dt: Optional[datetime]) -> Optional[datetime]:
     return dt.astimezone(timezone.utc)
 
 
-def from_utc_to_local(dt: Optional[datetime]) -> Optional[datetime]:
+def from_utc_to_local(dt: Optional[datetime], tz: Optional[timezone] = None) -> Optional[datetime]:
     """
     将 UTC 时间转换为本地时间
     
@@ -58,6 +75,7 @@ def from_utc_to_local(dt: Optional[datetime]) -> Optional[datetime]:
     
     Args:
         dt: UTC 时区的 datetime 对象
+        tz: 目标时区，默认使用全局本地时区
     
     Returns:
         本地时区的 datetime 对象
@@ -70,7 +88,7 @@ def from_utc_to_local(dt: Optional[datetime]) -> Optional[datetime]:
         dt = dt.replace(tzinfo=timezone.utc)
     
     # 转换为本地时间
-    local_tz = get_local_timezone()
+    local_tz = tz or get_local_timezone()
     return dt.astimezone(local_tz)
 
 
@@ -132,4 +150,92 @@ def parse_datetime(dt_str: str, fmt: str = "%Y-%m-%d %H:%M:%S") -> Optional[date
     try:
         return datetime.strptime(dt_str, fmt)
     except ValueError:
-        return None
\ No newline at end of file
+        return None
+
+
+# ==================== 查询时间范围 ====================
+
+# 查询参数允许的年份范围：区间右端要取次日/次月，转换 UTC 时还要按时区偏移前后移动，
+# 首尾两年会超出 date/datetime 的表示范围
+MIN_QUERY_YEAR = date.min.year + 1
+MAX_QUERY_YEAR = date.max.year - 1
+
+
+def _check_year(value: date) -> date:
+    """年份超出 [MIN_QUERY_YEAR, MAX_QUERY_YEAR] 时按参数错误拒绝"""
+    from utils.exceptions import AppException
+    if not MIN_QUERY_YEAR <= value.year <= MAX_QUERY_YEAR:
+        raise AppException(
+            message=f"年份必须在 {MIN_QUERY_YEAR:04d} ~ {MAX_QUERY_YEAR} 之间",
+            error_code="DATE_OUT_OF_RANGE"
+        )
+    return value
+
+
+def _parse_date(value: str) -> date:
+    """解析 YYYY-MM-DD 日期"""
+    from utils.exceptions import AppException
+    try:
+        parsed = datetime.strptime(value, "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        raise AppException(message="日期格式必须为 YYYY-MM-DD", error_code="INVALID_DATE_FORMAT")
+    return _check_year(parsed)
+
+
+def _parse_month(value: str) -> date:
+    """解析 YYYY-MM 月份，返回该月第一天"""
+    from utils.exceptions import AppException
+    try:
+        parsed = datetime.strptime(value, "%Y-%m").date()
+    except (ValueError, TypeError):
+        raise AppException(message="月份格式必须为 YYYY-MM", error_code="INVALID_MONTH_FORMAT")
+    return _check_year(parsed)
+
+
+def _next_month(first_day: date) -> date:
+    """返回下个月第一天"""
+    if first_day.month == 12:
+        return date(first_day.year + 1, 1, 1)
+    return date(first_day.year, first_day.month + 1, 1)
+
+
+def resolve_local_period(
+    month: Optional[str] = None,
+    day: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+) -> Optional[Tuple[date, date]]:
+    """
+    将查询参数解析为本地日期的半开区间 [start, end)
+    
+    优先级与统计接口一致：日期范围 > 月份范围 > 单日 > 单月
+    
+    Returns:
+        (起始日期, 结束日期（不含）)；未指定任何范围时返回 None
+    """
+    if start_date and end_date:
+        return _parse_date(start_date), _parse_date(end_date) + timedelta(days=1)
+    if start_month and end_month:
+        return _parse_month(start_month), _next_month(_parse_month(end_month))
+    if day:
+        query_date = _parse_date(day)
+        return query_date, query_date + timedelta(days=1)
+    if month:
+        first_day = _parse_month(month)
+        return first_day, _next_month(first_day)
+    return None
+
+
+def local_dates_to_utc_range(start: date, end: date, tz: Optional[timezone] = None) -> Tuple[datetime, datetime]:
+    """
+    将本地日期半开区间转换为 UTC 时间半开区间
+    
+    用于构建 `date >= start AND date < end` 形式的查询条件，
+    不对列做函数运算，可直接走 (user_id, date) 复合索引的范围扫描。
+    """
+    local_tz = tz or get_local_timezone()
+    start_dt = datetime(start.year, start.month, start.day, tzinfo=local_tz)
+    end_dt = datetime(end.year, end.month, end.day, tzinfo=local_tz)
+    return start_dt.astimezone(timezone.utc), end_dt.astimezone(timezone.utc)